@@ -0,0 +1,117 @@
+"""
+Event loop lag and launch throughput of bot_runner.py's /start_bot, against
+the way it used to work: blocking Daily API calls made one after the other
+in the handler, and a shell started with Popen for the bot. Both run
+against the fake Daily API, with stub bots, through benchmarks.loadgen.
+
+    python -m benchmarks.bench_bot_runner --requests 100 --concurrency 20 --daily-latency 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import urllib.request
+
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+
+from benchmarks import loadgen
+from utils.loop_monitor import LoopLagMonitor
+from utils.metrics import render_metrics
+
+
+def daily_request(path: str, data: dict) -> dict:
+    request = urllib.request.Request(
+        f"{os.environ['DAILY_API_URL']}{path}",
+        data=json.dumps(data).encode(),
+        headers={
+            "Authorization": f"Bearer {os.environ['DAILY_API_KEY']}",
+            "Content-Type": "application/json",
+        },
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)
+
+
+blocking_loop_monitor = LoopLagMonitor("bot_runner")
+
+
+@asynccontextmanager
+async def blocking_lifespan(app: FastAPI):
+    blocking_loop_monitor.start()
+    yield
+    await blocking_loop_monitor.stop()
+
+
+blocking_app = FastAPI(lifespan=blocking_lifespan)
+
+
+@blocking_app.post("/start_bot")
+async def blocking_start_bot():
+    room = daily_request("/rooms", {"properties": {}})
+    token = daily_request("/meeting-tokens", {"properties": {"room_name": room["name"]}})["token"]
+    subprocess.Popen(
+        [f"{sys.executable} -m {os.environ['BOT_MODULE']} -u {room['url']} -t {token}"],
+        shell=True,
+        bufsize=1,
+        cwd=loadgen.ROOT,
+    )
+    user_token = daily_request("/meeting-tokens", {"properties": {"room_name": room["name"]}})["token"]
+    return JSONResponse({"room_url": room["url"], "token": user_token})
+
+
+@blocking_app.get("/metrics")
+def blocking_metrics():
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bot_runner.py /start_bot benchmark")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--daily-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    common = [
+        "--target",
+        "bot_runner",
+        "--requests",
+        str(args.requests),
+        "--concurrency",
+        str(args.concurrency),
+        "--daily-latency",
+        str(args.daily_latency),
+        "--bot-secs",
+        "2",
+        "--warmup",
+        "0.5",
+        "--spawn",
+        "0",
+    ]
+    for name, app in [
+        ("blocking", "benchmarks.bench_bot_runner:blocking_app"),
+        ("async", "bot_runner:app"),
+    ]:
+        results = asyncio.run(loadgen.main(loadgen.parse_args(common + ["--app", app])))
+        print(
+            json.dumps(
+                {
+                    "runner": name,
+                    "launches_per_sec": results["launches_per_sec"],
+                    "start_bot": results["latency"].get("/start_bot 200"),
+                    "errors": results["errors"],
+                    "loop_lag": results["server_loop_lag"],
+                }
+            ),
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
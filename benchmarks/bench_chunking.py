@@ -0,0 +1,163 @@
+"""
+Time from the LLM request to the first TTS audio, with the TTS service
+aggregating whole sentences (what it does on its own) and with
+TTSTextChunker in front of it, for answers that start with a long
+sentence like GPT-4o's often do. Optionally with the TTS cache in front
+too (`--tts-cache`), which holds the first sentence until it's complete or
+too long to be a cached phrase.
+
+The LLM is FakeLLMService streaming `--words-per-sec`, the TTS is
+FakeTTSService (`--tts-ttfb` per request). Also reports how many TTS
+requests each answer took, how long the first chunk was, and for how long
+the audio would have stopped between chunks (played in real time from the
+first audio frame on).
+
+    python -m benchmarks.bench_chunking --turns 12 --words-per-sec 40
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    TTSAudioRawFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+from loguru import logger
+
+from benchmarks.fake_services import FakeLLMService, FakeTTSService
+from utils.text_chunker import TTSTextChunker
+from utils.tts_cache import PhraseAudioStore, TTSCache
+
+RESPONSES = [
+    "Well, as someone who has been running this bakery for over twelve years now and who has heard "
+    "a lot of promises from people calling about websites, I have to say I'm a little skeptical. "
+    "What makes your company any different from the others?",
+    "I understand that a modern website could help us reach more customers who want to order cakes "
+    "and pastries online, but I really need to know what this is going to cost me. Can you give me "
+    "a ballpark figure?",
+    "That sounds interesting. Most of my customers are locals who walk by every morning, so I'm "
+    "not sure online orders would make a big difference for a shop like mine. Do you have any "
+    "bakeries among your clients?",
+    "Hmm, okay, I suppose a site that works properly on phones would be nice, since my daughter "
+    "keeps telling me that nobody uses a computer to look for a bakery anymore. How long would "
+    "the whole thing take?",
+]
+
+
+class AudioCollector(FrameProcessor):
+    """When the first audio of each answer arrives, and the gaps after it."""
+
+    def __init__(self, secs_per_byte: float):
+        super().__init__()
+        self._secs_per_byte = secs_per_byte
+        self.started = 0.0
+        self.first_audio = None
+        self.playout_end = 0.0
+        self.gap_secs = 0.0
+        self.done = asyncio.Event()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.first_audio = None
+        self.gap_secs = 0.0
+        self.done.clear()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, TTSAudioRawFrame):
+            now = time.perf_counter()
+            if self.first_audio is None:
+                self.first_audio = now - self.started
+                self.playout_end = now
+            self.gap_secs += max(now - self.playout_end, 0.0)
+            self.playout_end = max(now, self.playout_end) + len(frame.audio) * self._secs_per_byte
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            self.done.set()
+
+        await self.push_frame(frame, direction)
+
+
+async def run(chunked: bool, args) -> dict:
+    llm = FakeLLMService(ttft=args.ttft, tokens_per_sec=args.words_per_sec, responses=RESPONSES)
+    tts = FakeTTSService(ttfb=args.tts_ttfb, aggregate_sentences=not chunked)
+    collector = AudioCollector(1 / (tts.sample_rate * 2))
+
+    chunker = None
+    tts_processors = [tts]
+    if chunked:
+        chunker = TTSTextChunker(
+            first_max_words=args.first_max_words,
+            first_max_secs=args.first_max_secs,
+        )
+        tts_processors = [chunker, tts]
+    if args.tts_cache:
+        store = PhraseAudioStore(os.path.join(tempfile.mkdtemp(), "tts.cache"))
+        tts_cache = TTSCache(store, tts)
+        tts_processors = [tts_cache.input(), *tts_processors, tts_cache.output()]
+
+    task = PipelineTask(Pipeline([llm, *tts_processors, collector]))
+    runner_task = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+
+    first_audio = []
+    gaps = []
+    for turn in range(args.turns):
+        context = OpenAILLMContext([{"role": "user", "content": "Hi"}])
+        collector.start()
+        await task.queue_frame(OpenAILLMContextFrame(context))
+        await collector.done.wait()
+        first_audio.append(collector.first_audio)
+        gaps.append(collector.gap_secs)
+
+    await task.queue_frame(EndFrame())
+    await runner_task
+
+    first_audio = np.array(first_audio) * 1000
+    return {
+        "mode": "chunked" if chunked else "sentences",
+        "tts_cache": args.tts_cache,
+        "first_audio_p50_ms": round(float(np.percentile(first_audio, 50))),
+        "first_audio_p90_ms": round(float(np.percentile(first_audio, 90))),
+        "llm_ttft_p50_ms": round(1000 * float(np.percentile(llm.ttfts, 50))),
+        "tts_requests_per_answer": round(tts.requests / args.turns, 1),
+        "audio_gap_ms_per_answer": round(1000 * float(np.mean(gaps))),
+        "chunker": chunker.stats() if chunker else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM to TTS chunking benchmark")
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--ttft", type=float, default=0.3, help="LLM time to first token")
+    parser.add_argument("--words-per-sec", type=float, default=40.0, help="LLM output speed")
+    parser.add_argument("--tts-ttfb", type=float, default=0.2, help="TTS time to first byte")
+    parser.add_argument("--first-max-words", type=int, default=12)
+    parser.add_argument("--first-max-secs", type=float, default=0.4)
+    parser.add_argument("--tts-cache", action="store_true", help="Put the TTS cache in front")
+    args = parser.parse_args()
+
+    logger.remove()
+
+    for chunked in (False, True):
+        print(json.dumps(asyncio.run(run(chunked, args))), flush=True)
+
+
+if __name__ == "__main__":
+    main()
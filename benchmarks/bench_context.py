@@ -0,0 +1,126 @@
+"""
+Measures time to first token against conversation length, with the context
+growing without limit and with ContextBudget. The LLM is FakeLLMService,
+whose time to first token grows with the prompt size like a real model's,
+and the summarizer is a fake one taking `--summary-latency` seconds.
+
+    python -m benchmarks.bench_context --turns 100 --max-tokens 2000
+"""
+
+import argparse
+import asyncio
+import json
+
+import numpy as np
+
+from pipecat.frames.frames import EndFrame, Frame, LLMFullResponseEndFrame, TextFrame
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+from loguru import logger
+
+from benchmarks.fake_services import FakeLLMService
+from utils.context_budget import ContextBudget
+
+PERSONA = (
+    "You are a lady who runs a small bakery in her local town. Your business is doing well "
+    "with local foot traffic, but your online orders have been stagnant. Your website is "
+    "outdated and doesn't work well on mobile. A sales agent calls to sell you a website "
+    "redesign. You are a skeptical and curious prospect. Remember you are the prospect."
+)
+
+USER_TURNS = [
+    "We build fast mobile friendly websites for small businesses like yours, with online ordering built in.",
+    "Most of our bakery clients see online orders double within three months of launching the new site.",
+    "Our packages start at a few hundred dollars and include hosting, updates and support for the first year.",
+    "We can have a first version ready in two weeks, and you can review every page before it goes live.",
+]
+
+
+class ResponseCollector(FrameProcessor):
+    def __init__(self, context: OpenAILLMContext):
+        super().__init__()
+        self._context = context
+        self._text = ""
+        self.done = asyncio.Event()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, TextFrame):
+            self._text += frame.text
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            self._context.add_message({"role": "assistant", "content": self._text})
+            self._text = ""
+            self.done.set()
+
+        await self.push_frame(frame, direction)
+
+
+async def run(turns: int, max_tokens: int | None, summary_latency: float) -> dict:
+    async def summarize(previous_summary, messages):
+        await asyncio.sleep(summary_latency)
+        return (
+            "The agent pitched a website redesign with online ordering, quoted prices "
+            f"and timelines, and the prospect asked skeptical questions. {len(messages)} "
+            "messages were summarized."
+        )
+
+    context = OpenAILLMContext([{"role": "system", "content": PERSONA}])
+    llm = FakeLLMService()
+    collector = ResponseCollector(context)
+
+    processors = [llm, collector]
+    budget = None
+    if max_tokens:
+        budget = ContextBudget(summarize, max_tokens=max_tokens)
+        processors.insert(0, budget)
+
+    task = PipelineTask(Pipeline(processors))
+    runner_task = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+
+    for turn in range(turns):
+        collector.done.clear()
+        context.add_message({"role": "user", "content": USER_TURNS[turn % len(USER_TURNS)]})
+        await task.queue_frame(OpenAILLMContextFrame(context))
+        await collector.done.wait()
+        # The user doesn't answer instantly, that's when summaries get done
+        await asyncio.sleep(0.2)
+
+    await task.queue_frame(EndFrame())
+    await runner_task
+
+    ttfts = np.array(llm.ttfts) * 1000
+    checkpoints = [t for t in (1, 10, 25, 50, 100, 200) if t <= turns]
+    return {
+        "max_tokens": max_tokens,
+        "turns": turns,
+        "ttft_ms_at_turn": {t: round(float(ttfts[t - 1]), 1) for t in checkpoints},
+        "prompt_tokens_at_turn": {t: llm.prompt_tokens[t - 1] for t in checkpoints},
+        "ttft_p50_ms": float(np.percentile(ttfts, 50)),
+        "ttft_p99_ms": float(np.percentile(ttfts, 99)),
+        "budget": budget.stats() if budget else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Context budget TTFT benchmark")
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--summary-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    logger.remove()
+
+    for max_tokens in (None, args.max_tokens):
+        print(json.dumps(asyncio.run(run(args.turns, max_tokens, args.summary_latency))), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Cost of mapping a chunk of TTS audio to sprites with LipSync, per chunk
+size, against doing the same RMS and envelope per sample in plain Python.
+Also counts the sprite changes pushed per second of speech, against the 30
+frames a second of the "loop" animation.
+
+The speech is noise shaped into syllables (about 4 a second) with short
+pauses, which is enough to exercise the envelope.
+
+    python -m benchmarks.bench_lip_sync --sample-rate 24000
+"""
+
+import argparse
+import json
+import math
+import timeit
+
+import numpy as np
+
+from utils.lip_sync import LipSync, order_by_motion
+from utils.sprite_atlas import load_sprites
+
+
+def speech(secs: float, sample_rate: int) -> bytes:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(secs * sample_rate)) / sample_rate
+    syllables = np.abs(np.sin(2 * np.pi * 2 * t)) ** 2
+    pauses = (np.sin(2 * np.pi * 0.3 * t) > -0.7).astype(np.float32)
+    return (rng.normal(0, 6000, len(t)) * syllables * pauses).astype(np.int16).tobytes()
+
+
+def python_frames(lip_sync: LipSync, audio: bytes, sample_rate: int) -> list:
+    """What LipSync.frames() does, one sample at a time."""
+    samples = list(lip_sync._pending) + list(memoryview(audio).cast("h"))
+    window = max(int(sample_rate * lip_sync._window_secs), 1)
+    first_start = -len(lip_sync._pending) / sample_rate
+    count = len(samples) // window
+    lip_sync._pending = np.array(samples[count * window :], dtype=np.float32)
+    frames = []
+    for i in range(count):
+        total = 0.0
+        for sample in samples[i * window : (i + 1) * window]:
+            total += sample * sample
+        level = 20 * math.log10(max(math.sqrt(total / window), 1.0) / 32768)
+        lip_sync._envelope_db = max(level, lip_sync._envelope_db - lip_sync._release_db)
+        scaled = (lip_sync._envelope_db - lip_sync._floor_db) / (lip_sync._ceiling_db - lip_sync._floor_db)
+        index = round(min(max(scaled, 0.0), 1.0) * (len(lip_sync.sprites) - 1))
+        if index != lip_sync._index:
+            frames.append((first_start + i * window / sample_rate, index))
+            lip_sync._index = index
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lip sync microbenchmark")
+    parser.add_argument("--sample-rate", type=int, default=24000)
+    parser.add_argument("--chunk-ms", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--fps", type=float, default=15.0)
+    parser.add_argument("--secs", type=float, default=10.0, help="Seconds of speech")
+    args = parser.parse_args()
+
+    sprites = order_by_motion(load_sprites())
+    audio = speech(args.secs, args.sample_rate)
+
+    for chunk_ms in args.chunk_ms:
+        chunk_size = args.sample_rate * chunk_ms // 1000 * 2
+        chunks = [audio[i : i + chunk_size] for i in range(0, len(audio), chunk_size)]
+
+        lip_sync = LipSync(sprites, fps=args.fps)
+        changes = sum(len(lip_sync.frames(chunk, args.sample_rate)) for chunk in chunks)
+
+        lip_sync.reset()
+        runs = max(1, 2000 // len(chunks))
+        numpy_secs = timeit.timeit(
+            lambda: [lip_sync.frames(chunk, args.sample_rate) for chunk in chunks], number=runs
+        ) / (runs * len(chunks))
+        python_secs = timeit.timeit(
+            lambda: [python_frames(lip_sync, chunk, args.sample_rate) for chunk in chunks], number=1
+        ) / len(chunks)
+
+        print(
+            json.dumps(
+                {
+                    "chunk_ms": chunk_ms,
+                    "numpy_us_per_chunk": round(1e6 * numpy_secs, 1),
+                    "python_us_per_chunk": round(1e6 * python_secs, 1),
+                    "cpu_percent_of_playout": round(100 * numpy_secs / (chunk_ms / 1000), 3),
+                    "sprite_changes_per_sec": round(changes / args.secs, 1),
+                    "loop_frames_per_sec": 30,
+                }
+            ),
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
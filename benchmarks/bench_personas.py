@@ -0,0 +1,106 @@
+"""
+Time to first token and prompt token cost of the persona prompts, with the
+messages laid out the way Persona.messages() does it (the persona's prompt
+first, the same bytes in every session, then what changes per session) and
+with the per-session details written at the top of the system prompt.
+
+Sessions run one after the other against FakeLLMService with a
+PromptPrefixCache, shared by all of them like a provider's cache, which
+only skips the prefill of whole blocks of the prompt that match a previous
+one from the start. Each session happens at a different time of day, and
+personas without a session prompt get `--session-prompt`. Cached tokens
+are billed at `--cached-price` of the normal price.
+
+    python -m benchmarks.bench_personas --sessions 10 --turns 8 --min-tokens 1024
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from loguru import logger
+
+from benchmarks.bench_context import USER_TURNS
+from benchmarks.fake_services import FakeLLMService, PromptPrefixCache
+from utils.personas import Persona, PersonaRegistry, session_variables
+
+MODES = ("stable", "inline")
+
+
+def session_messages(persona: Persona, mode: str, now: datetime) -> list:
+    if mode == "stable":
+        return persona.messages(now)
+    # What a single templated prompt does: the first bytes change every session
+    session = persona.session_prompt.format(**session_variables(now))
+    return [{"role": "system", "content": f"{session}\n\n{persona.prompt}"}]
+
+
+async def run(persona: Persona, mode: str, args) -> dict:
+    llm = FakeLLMService(
+        prefill_secs_per_token=args.prefill_secs_per_token,
+        tokens_per_sec=1000.0,
+        prefix_cache=PromptPrefixCache(block_tokens=args.block_tokens, min_tokens=args.min_tokens),
+    )
+    first_ttfts = []
+    start = datetime(2024, 11, 4, 9, 0)
+    for session in range(args.sessions):
+        messages = session_messages(persona, mode, start + timedelta(minutes=7 * session))
+        for turn in range(args.turns):
+            messages.append({"role": "user", "content": USER_TURNS[turn % len(USER_TURNS)]})
+            text = ""
+            async for chunk in await llm.get_chat_completions(None, messages):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    text += chunk.choices[0].delta.content
+            messages.append({"role": "assistant", "content": text})
+            if turn == 0:
+                first_ttfts.append(llm.ttfts[-1])
+
+    prompt_tokens = sum(llm.prompt_tokens)
+    cached_tokens = sum(llm.cached_tokens)
+    billed = prompt_tokens - cached_tokens + args.cached_price * cached_tokens
+    return {
+        "persona": persona.name,
+        "mode": mode,
+        "first_turn_ttft_ms": round(1000 * float(np.median(first_ttfts))),
+        "ttft_p50_ms": round(1000 * float(np.percentile(llm.ttfts, 50))),
+        "ttft_mean_ms": round(1000 * float(np.mean(llm.ttfts))),
+        "prompt_tokens_per_request": round(prompt_tokens / llm.requests),
+        "cached_percent": round(100 * cached_tokens / prompt_tokens, 1),
+        "billed_prompt_tokens_per_request": round(billed / llm.requests),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persona prompt prefix caching benchmark")
+    parser.add_argument("--personas", nargs="+", help="Personas to run (default: all)")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=8, help="LLM requests per session")
+    parser.add_argument("--block-tokens", type=int, default=128, help="Prefix cache granularity")
+    parser.add_argument("--min-tokens", type=int, default=1024, help="Shortest prompt that is cached")
+    parser.add_argument("--prefill-secs-per-token", type=float, default=0.0002)
+    parser.add_argument("--cached-price", type=float, default=0.5, help="Price of a cached token")
+    parser.add_argument(
+        "--session-prompt",
+        default="Today is {weekday}, {date}, and it is {time}.",
+        help="For personas that don't have one",
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+
+    registry = PersonaRegistry()
+    for name in args.personas or registry.names():
+        persona = registry.get(name)
+        if not persona.session_prompt:
+            persona = dataclasses.replace(persona, session_prompt=args.session_prompt)
+        for mode in MODES:
+            print(json.dumps(asyncio.run(run(persona, mode, args))), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+End-to-end benchmark of the bot pipeline, without Daily, OpenAI or Cartesia.
+
+Runs N concurrent sessions of the bot module's real `run_bot()` pipeline in
+one process (like a worker agent in host mode), with FakeTransport playing a
+scripted user, FakeLLMService streaming tokens and FakeTTSService
+synthesizing audio. Reports turn latency percentiles (user stops speaking
+to first bot audio), CPU and RSS per session.
+
+    python -m benchmarks.bench_pipeline --sessions 1 8 --turns 5 --output before.json
+    python -m benchmarks.bench_pipeline --sessions 1 8 --turns 5 --compare before.json
+
+With `--services servers` the real OpenAI and Cartesia services are used
+instead, talking to the local servers of benchmarks/fake_ai_servers.py, so
+connection costs (`--handshake` per new connection) are part of the run.
+
+With --compare, every metric is compared with the same run in the given
+results file and the exit status is 1 if any got worse by more than
+--threshold.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from aiohttp import web
+
+# The bot modules read their settings at import time. No opener or summary
+# requests to the real services, and no writing to the real caches.
+# SPECULATIVE_LLM=1 and the like are passed through.
+os.environ["OPENER_CACHE"] = "0"
+os.environ["CONTEXT_MAX_TOKENS"] = "0"
+os.environ.setdefault("TTS_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "tts_phrases.cache"))
+os.environ.setdefault("SESSION_LOG_DIR", tempfile.mkdtemp())
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp())
+
+from loguru import logger  # noqa: E402
+
+from benchmarks.fake_ai_servers import FakeAIServers  # noqa: E402
+from benchmarks.fake_services import FakeLLMService, FakeTTSService  # noqa: E402
+from benchmarks.fake_transport import FakeTransport, UserTurn, load_wav  # noqa: E402
+
+SCRIPT = [
+    "Hi, I'm calling about your website. Do you have a minute?",
+    "We build fast mobile friendly websites for small businesses like yours.",
+    "Most of our bakery clients see online orders double within three months.",
+    "Our packages start at a few hundred dollars, hosting included.",
+    "We can have a first version ready in two weeks.",
+    "Great, shall I send you a proposal by email?",
+]
+
+# Lower is better for all of them
+COMPARED_METRICS = [
+    "turn_p50_ms",
+    "turn_p90_ms",
+    "turn_p99_ms",
+    "opener_p50_ms",
+    "llm_prompt_tokens_per_turn",
+    "cpu_percent_per_session",
+    "rss_mb_per_session",
+]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentile_ms(values: list, q: float) -> float | None:
+    return round(1000 * float(np.percentile(values, q)), 1) if values else None
+
+
+async def run(bot_module, args, sessions: int) -> dict:
+    from utils.session_host import SessionHost
+
+    audio = load_wav(args.audio) if args.audio else None
+    script = [UserTurn(text=SCRIPT[i % len(SCRIPT)], audio=audio) for i in range(args.turns)]
+
+    transports = []
+
+    def transport_class(*transport_args, **kwargs):
+        transport = FakeTransport(
+            *transport_args,
+            script=script,
+            transcription_delay=args.transcription_delay,
+            think_secs=args.think_secs,
+            join_delay=args.join_delay,
+            **kwargs,
+        )
+        transports.append(transport)
+        return transport
+
+    host = SessionHost(bot_module.run_bot, max_sessions=sessions, batch_vad=args.vad == "batched")
+
+    rss_baseline = rss_mb()
+    rss_peak = rss_baseline
+
+    async def sample_rss():
+        nonlocal rss_peak
+        while True:
+            rss_peak = max(rss_peak, rss_mb())
+            await asyncio.sleep(0.25)
+
+    servers = None
+    if args.services == "servers":
+        from pipecat.services.cartesia import CartesiaTTSService
+
+        from utils.warmup import PooledOpenAILLMService
+
+        servers = FakeAIServers(
+            handshake=args.handshake,
+            ttft=args.llm_ttft,
+            tokens_per_sec=args.llm_tokens_per_sec,
+            tts_ttfb=args.tts_ttfb,
+        )
+        servers_runner = web.AppRunner(servers.app())
+        await servers_runner.setup()
+        site = web.TCPSite(servers_runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+    sampler = asyncio.create_task(sample_rss())
+    cpu_start = cpu_time()
+    wall_start = time.monotonic()
+
+    hosted = []
+    llms = []
+    for i in range(sessions):
+        if servers:
+            llm = PooledOpenAILLMService(
+                api_key="fake", model="gpt-4o", base_url=f"http://127.0.0.1:{port}/v1"
+            )
+            tts = CartesiaTTSService(
+                api_key="fake", voice_id="fake", url=f"ws://127.0.0.1:{port}/tts/websocket"
+            )
+        else:
+            llm = FakeLLMService(ttft=args.llm_ttft, tokens_per_sec=args.llm_tokens_per_sec)
+            tts = FakeTTSService(ttfb=args.tts_ttfb)
+            llms.append(llm)
+        hosted.append(
+            host.start(
+                f"fake://room-{i}",
+                "",
+                transport_class=transport_class,
+                llm=llm,
+                tts=tts,
+            )
+        )
+        await asyncio.sleep(args.stagger)
+
+    await asyncio.gather(*[t.done.wait() for t in transports])
+    await host.stop_all()
+    if getattr(bot_module, "session_log", None):
+        await bot_module.session_log.stop()
+
+    wall = time.monotonic() - wall_start
+    cpu = cpu_time() - cpu_start
+    sampler.cancel()
+    if servers:
+        await servers_runner.cleanup()
+        llm_requests = servers.llm_requests
+        prompt_tokens = None
+    else:
+        llm_requests = sum(llm.requests for llm in llms)
+        prompt_tokens = sum(sum(llm.prompt_tokens) for llm in llms)
+
+    turns = [latency for t in transports for latency in t.turn_latencies]
+    openers = [t.opener_latency for t in transports if t.opener_latency is not None]
+    return {
+        "sessions": sessions,
+        "turns": len(turns),
+        "unanswered": sum(t.unanswered for t in transports),
+        "errors": sum(1 for s in hosted if s.error),
+        "turn_p50_ms": percentile_ms(turns, 50),
+        "turn_p90_ms": percentile_ms(turns, 90),
+        "turn_p99_ms": percentile_ms(turns, 99),
+        "opener_p50_ms": percentile_ms(openers, 50),
+        "llm_requests_per_turn": round(llm_requests / max(len(turns), 1), 2),
+        "llm_prompt_tokens_per_turn": round(prompt_tokens / max(len(turns), 1)) if prompt_tokens is not None else None,
+        "cpu_percent_per_session": round(100 * cpu / wall / sessions, 2),
+        "rss_mb_baseline": round(rss_baseline, 1),
+        "rss_mb_per_session": round((rss_peak - rss_baseline) / sessions, 1),
+        "camera_fps_per_session": round(sum(t.camera_frames for t in transports) / wall / sessions, 1),
+        "camera_mpixels_per_sec_per_session": round(
+            sum(t.camera_pixels for t in transports) / wall / sessions / 1e6, 2
+        ),
+    }
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    try:
+        from importlib.metadata import version
+
+        pipecat_version = version("pipecat-ai")
+    except Exception:
+        pipecat_version = None
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "pipecat": pipecat_version,
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    regressed = False
+    before = {run["sessions"]: run for run in baseline["runs"]}
+    for run in results["runs"]:
+        old = before.get(run["sessions"])
+        if not old:
+            continue
+        for metric in COMPARED_METRICS:
+            if not old.get(metric) or run.get(metric) is None:
+                continue
+            change = run[metric] / old[metric] - 1
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print(
+                f"sessions={run['sessions']:<3} {metric:<24} {old[metric]:>9} -> {run[metric]:>9} "
+                f"({change:+.1%}){flag}"
+            )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end bot pipeline benchmark")
+    parser.add_argument("--bot", default="bot", help="Bot module (bot or new_bot)")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--turns", type=int, default=5, help="User turns per session")
+    parser.add_argument("--audio", help="16 kHz mono WAV of the user speaking (default: synthetic)")
+    parser.add_argument("--services", choices=["fake", "servers"], default="fake")
+    parser.add_argument("--handshake", type=float, default=0.3, help="Connection setup time with --services servers")
+    parser.add_argument("--join-delay", type=float, default=1.0, help="Seconds before the user joins")
+    parser.add_argument("--vad", choices=["shared", "batched"], default="shared")
+    parser.add_argument("--llm-ttft", type=float, default=0.3)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--tts-ttfb", type=float, default=0.2)
+    parser.add_argument("--transcription-delay", type=float, default=0.3)
+    parser.add_argument("--think-secs", type=float, default=1.0)
+    parser.add_argument("--stagger", type=float, default=0.2, help="Seconds between session starts")
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with a previous results file")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    # The bot modules set up their own logging when imported
+    bot_module = importlib.import_module(args.bot)
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    results = {"meta": metadata(args), "runs": []}
+    for sessions in args.sessions:
+        result = asyncio.run(run(bot_module, args, sessions))
+        results["runs"].append(result)
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+What the session log costs the bots. Three measurements:
+
+- observe: SessionRecorder.observe() alone, per frame, for the frames of a
+  typical turn (mostly audio, which is only a dictionary lookup).
+- pipeline: time per frame through a pipeline with the turn metrics'
+  three probes, like the bots have, without the log ("none"), with the
+  recorder observing through those probes like the bots do ("observers"),
+  and with three recorder probes of their own ("probes"). The difference
+  to "none" is what the log adds to every frame. `--max-overhead-us` fails
+  the benchmark (exit status 1) when the bots' way is above that.
+- writer: events per second a SessionLog writes, the compressed bytes per
+  event, and how late the event loop gets while it writes, with
+  `--sessions` sessions recording at the same time.
+
+    python -m benchmarks.bench_session_log --turns 20 --max-overhead-us 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp())
+
+from pipecat.frames.frames import (  # noqa: E402
+    EndFrame,
+    Frame,
+    InputAudioRawFrame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    TextFrame,
+    TranscriptionFrame,
+    TTSAudioRawFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline  # noqa: E402
+from pipecat.pipeline.runner import PipelineRunner  # noqa: E402
+from pipecat.pipeline.task import PipelineTask  # noqa: E402
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor  # noqa: E402
+
+from loguru import logger  # noqa: E402
+
+from utils.loop_monitor import LoopLagMonitor  # noqa: E402
+from utils.session_log import SessionLog, SessionRecorder, read_events  # noqa: E402
+from utils.turn_metrics import TurnLatencyTracker  # noqa: E402
+
+MODES = ("none", "observers", "probes")
+
+ANSWER = (
+    "Well, as someone who has been running this bakery for over twelve years now, I have to say "
+    "I'm a little skeptical. What makes your company any different from the others?"
+)
+
+
+def turn_frames() -> list:
+    """The frames of one turn: 2 s of user audio, the answer, 3 s of bot audio."""
+    frames = [UserStartedSpeakingFrame()]
+    frames += [InputAudioRawFrame(audio=bytes(640), sample_rate=16000, num_channels=1) for _ in range(100)]
+    frames += [
+        UserStoppedSpeakingFrame(),
+        TranscriptionFrame("Hi, I'm calling about a new website for your bakery.", "user", "now"),
+        LLMFullResponseStartFrame(),
+    ]
+    words = ANSWER.split(" ")
+    frames += [TextFrame(word if i == 0 else f" {word}") for i, word in enumerate(words)]
+    frames += [LLMFullResponseEndFrame(), TTSStartedFrame()]
+    frames += [TTSAudioRawFrame(audio=bytes(960), sample_rate=24000, num_channels=1) for _ in range(150)]
+    frames += [TTSStoppedFrame()]
+    return frames
+
+
+async def bench_observe(args) -> dict:
+    # Nothing is written, the events stay in the ring
+    recorder = SessionRecorder(SessionLog(tempfile.mkdtemp()), "bench", ring_size=1_000_000)
+    probe = recorder.probe()
+    frames = [frame for _ in range(args.turns) for frame in turn_frames()]
+
+    def observe():
+        recorder._seen.clear()
+        recorder._ring.clear()
+        for frame in frames:
+            recorder.observe(frame, probe)
+
+    secs = min(timeit.repeat(observe, number=1, repeat=5))
+    return {
+        "mode": "observe",
+        "frames": len(frames),
+        "events_per_turn": len(recorder._ring) // args.turns,
+        "us_per_frame": round(1e6 * secs / len(frames), 3),
+    }
+
+
+class Source(FrameProcessor):
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        await self.push_frame(frame, direction)
+
+
+class Sink(FrameProcessor):
+    def __init__(self, expected: int):
+        super().__init__()
+        self._expected = expected
+        self.count = 0
+        self.done = asyncio.Event()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        self.count += 1
+        if self.count == self._expected:
+            self.done.set()
+        await self.push_frame(frame, direction)
+
+
+async def bench_pipeline(mode: str, args) -> float:
+    frames = [frame for _ in range(args.turns) for frame in turn_frames()]
+    sink = Sink(len(frames))
+    turn_metrics = TurnLatencyTracker()
+    log = SessionLog(tempfile.mkdtemp())
+    recorder = log.recorder() if mode != "none" else None
+    observers = [recorder.observe] if mode == "observers" else []
+
+    # Probes where the bots have them: after the input, the LLM and the TTS
+    processors = [Source()]
+    for _ in range(3):
+        processors.append(turn_metrics.probe(*observers))
+        if mode == "probes":
+            processors.append(recorder.probe())
+        processors.append(Source())
+    processors.append(sink)
+    task = PipelineTask(Pipeline(processors))
+    runner_task = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+    await asyncio.sleep(0.1)
+
+    start = time.perf_counter()
+    await task.queue_frames(frames)
+    await sink.done.wait()
+    secs = time.perf_counter() - start
+
+    await task.queue_frame(EndFrame())
+    await runner_task
+    await log.stop()
+    return 1e6 * secs / len(frames)
+
+
+async def bench_writer(args) -> dict:
+    directory = tempfile.mkdtemp()
+    log = SessionLog(directory, max_segment_bytes=args.segment_kb * 1024, flush_secs=0.1)
+    monitor = LoopLagMonitor("bench", interval=0.005)
+    monitor.start()
+
+    recorders = [log.recorder(room_url=f"fake://room-{i}") for i in range(args.sessions)]
+    events = 0
+    start = time.perf_counter()
+    for turn in range(args.turns):
+        for recorder in recorders:
+            recorder.record("user_started_speaking")
+            recorder.record("user_stopped_speaking")
+            recorder.record("transcript", text="Hi, I'm calling about a new website for your bakery.")
+            recorder.record("llm_response_started")
+            recorder.record("llm_response", text=ANSWER)
+            recorder.record("tts_started")
+            recorder.record("bot_started_speaking")
+            recorder.record("tts_stopped")
+            recorder.record("bot_stopped_speaking")
+            events += 9
+        # Turns take seconds, give the writer a flush in between
+        await asyncio.sleep(0.1)
+    for recorder in recorders:
+        await recorder.close()
+    await log.stop()
+    secs = time.perf_counter() - start
+    await monitor.stop()
+
+    total_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    read = sum(1 for _ in read_events([directory]))
+    stats = log.stats()
+    return {
+        "mode": "writer",
+        "sessions": args.sessions,
+        "events": events + 2 * args.sessions,
+        "read_back": read,
+        "segments": stats["segments"],
+        "bytes_per_event": round(total_bytes / read, 1),
+        "write_us_per_event": round(1000 * stats["avg_batch_write_ms"] * stats["batches"] / read, 2),
+        "max_loop_lag_ms": round(monitor.stats()["max_lag_ms"], 2),
+        "wall_secs": round(secs, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session log overhead benchmark")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=50, help="Recording at once, for the writer")
+    parser.add_argument("--segment-kb", type=int, default=256, help="Segment size, for the writer")
+    parser.add_argument("--repeat", type=int, default=3, help="Pipeline runs per mode, the best is kept")
+    parser.add_argument("--max-overhead-us", type=float, help="Fail above this per frame overhead")
+    args = parser.parse_args()
+
+    logger.remove()
+
+    print(json.dumps(asyncio.run(bench_observe(args))), flush=True)
+
+    us_per_frame = {}
+    for mode in MODES:
+        us_per_frame[mode] = min(asyncio.run(bench_pipeline(mode, args)) for _ in range(args.repeat))
+        print(
+            json.dumps(
+                {
+                    "mode": f"pipeline/{mode}",
+                    "frames": len(turn_frames()) * args.turns,
+                    "us_per_frame": round(us_per_frame[mode], 2),
+                    "overhead_us_per_frame": round(us_per_frame[mode] - us_per_frame["none"], 2),
+                }
+            ),
+            flush=True,
+        )
+    overhead = us_per_frame["observers"] - us_per_frame["none"]
+
+    print(json.dumps(asyncio.run(bench_writer(args))), flush=True)
+
+    if args.max_overhead_us is not None and overhead > args.max_overhead_us:
+        print(f"Per frame overhead {overhead:.2f} us is above {args.max_overhead_us} us", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+How long the server takes to stop its bots, and whether a new server can
+take them over. The bots are `benchmarks.stub_bot` workers from a real
+BotWorkerPool. SIGTERM ends them `--drain-secs` later, standing in for
+the real bots finishing the current turn before they send their EndFrame.
+
+- serial: what the server did before. It sends SIGTERM to one bot, waits
+  for it to exit, then moves on to the next, so the time grows with the
+  number of bots.
+- drain: BotRegistry.drain(), SIGTERM to all of them, waited for together.
+- adopt: the registry detaches from the bots, like a server restarting
+  with BOT_SHUTDOWN=detach. A new registry adopts them from the state
+  directory, and they are drained from there, waited for through their
+  PIDs since they are no longer children of the new registry.
+
+    python -m benchmarks.bench_shutdown --bots 5 20 --drain-secs 1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from utils.bot_pool import BotWorkerPool
+from utils.bot_registry import BotRegistry
+
+MODES = ("serial", "drain", "adopt")
+
+
+async def start_bots(count: int, state_dir: str) -> BotRegistry:
+    pool = BotWorkerPool(
+        module="benchmarks.stub_bot",
+        size=count,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    await pool.start()
+    while pool.stats()["idle"] < count:
+        await asyncio.sleep(0.05)
+
+    registry = BotRegistry(state_dir=state_dir)
+    for i in range(count):
+        proc = await pool.launch(f"fake://room-{i}", "token")
+        registry.add(proc, f"fake://room-{i}")
+    # Before the pool gets to warm up replacements
+    await pool.stop()
+    # Give them time to read their job and handle SIGTERM
+    await asyncio.sleep(0.5)
+    return registry
+
+
+async def serial(registry: BotRegistry):
+    for record in registry.running():
+        os.kill(record.pid, signal.SIGTERM)
+        await record.exited.wait()
+
+
+async def measure(mode: str, count: int, args) -> dict:
+    state_dir = tempfile.mkdtemp()
+    registry = await start_bots(count, state_dir)
+
+    adopted = None
+    start = time.perf_counter()
+    if mode == "serial":
+        await serial(registry)
+    elif mode == "drain":
+        await registry.drain(args.drain_timeout)
+    else:
+        registry.detach()
+        registry = BotRegistry(state_dir=state_dir)
+        adopted = len(registry.adopt())
+        await registry.drain(args.drain_timeout)
+    secs = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "bots": count,
+        "adopted": adopted,
+        "killed": registry.stats()["killed"],
+        "left_running": len(registry),
+        "secs": round(secs, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot shutdown benchmark")
+    parser.add_argument("--bots", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--drain-secs", type=float, default=1.0, help="Stub bots' time to finish a turn")
+    parser.add_argument("--drain-timeout", type=float, default=45.0, help="Bots still running are killed")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    # The stub bots stay in their call until they are asked to leave
+    os.environ["STUB_BOT_SECS"] = "600"
+    os.environ["STUB_BOT_DRAIN_SECS"] = str(args.drain_secs)
+    os.environ.setdefault("PYTHONPATH", os.getcwd())
+
+    for count in args.bots:
+        for mode in args.modes:
+            result = asyncio.run(measure(mode, count, args))
+            print(json.dumps(result), flush=True)
+            if result["left_running"]:
+                print(f"{result['left_running']} bots still running after {mode}", file=sys.stderr)
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares loading the bot sprites by decoding the PNGs (what bot.py used to do)
+with mapping the prebuilt sprite atlas.
+
+Starts N processes per mode, each loading the sprites and touching every
+pixel once, and reports load time and memory. PSS splits shared pages between
+the processes that map them, so it shows what each extra bot really costs.
+
+    python -m benchmarks.bench_sprites --processes 8
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_memory(pid: int) -> dict:
+    memory = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                memory[key] = int(value.split()[0])
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key == "Pss":
+                memory[key] = int(value.split()[0])
+    return memory
+
+
+def child(mode: str):
+    start_time = time.perf_counter()
+    if mode == "png":
+        from PIL import Image
+
+        from utils.sprite_atlas import sprite_paths
+
+        sprites = []
+        for path in sprite_paths():
+            with Image.open(path) as img:
+                sprites.append(img.tobytes())
+    else:
+        from utils.sprite_atlas import load_sprites
+
+        sprites = [s.image for s in load_sprites()]
+
+    # Touch every page, like the camera output eventually does.
+    checksum = sum(memoryview(s)[::4096].tobytes().count(0) for s in sprites)
+    load_time = time.perf_counter() - start_time
+
+    print(json.dumps({"load_ms": 1000 * load_time, "checksum": checksum}), flush=True)
+    # Stay alive until the parent has measured us.
+    sys.stdin.readline()
+
+
+def run_mode(mode: str, processes: int) -> dict:
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_sprites", "--child", mode],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=root_dir,
+            text=True,
+        )
+        for _ in range(processes)
+    ]
+
+    results = []
+    for proc in procs:
+        result = json.loads(proc.stdout.readline())
+        result.update(read_memory(proc.pid))
+        results.append(result)
+
+    for proc in procs:
+        proc.stdin.close()
+        proc.wait()
+
+    def avg(key):
+        return sum(r[key] for r in results) / len(results)
+
+    return {
+        "mode": mode,
+        "processes": processes,
+        "load_ms": avg("load_ms"),
+        "rss_kb": avg("VmRSS"),
+        "rss_anon_kb": avg("RssAnon"),
+        "rss_file_kb": avg("RssFile"),
+        "pss_kb": avg("Pss"),
+        "total_pss_kb": sum(r["Pss"] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sprite loading benchmark")
+    parser.add_argument("--processes", type=int, default=4, help="Processes per mode")
+    parser.add_argument("--child", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    from utils.sprite_atlas import build_atlas, sprite_paths
+
+    build_atlas(sprite_paths())
+
+    for mode in ("png", "atlas"):
+        print(json.dumps(run_mode(mode, args.processes)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Cost of sampling the bots' CPU, memory, threads, file descriptors and
+queue depth reports (utils/bot_telemetry.py), per tick and per bot, as the
+number of bots grows. The bots are `sleep` processes with a report each.
+
+Compared with opening and reading /proc/<pid>/stat and /proc/<pid>/status
+for every sample, what a sampler built on open() (or psutil) does. With
+`--max-per-tick` below the number of bots, the cost of a tick stops
+growing and each bot is sampled less often instead. The event loop lag is
+measured while BotTelemetry runs on its own, every `--interval` seconds.
+
+    python -m benchmarks.bench_telemetry --bots 10 100 500 --max-per-tick 256
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+from dataclasses import dataclass
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp())
+
+from utils.bot_telemetry import BotTelemetry, write_report  # noqa: E402
+from utils.loop_monitor import LoopLagMonitor  # noqa: E402
+
+
+@dataclass
+class FakeRecord:
+    pid: int
+    room_url: str
+    started_at: float
+
+
+class FakeRegistry:
+    def __init__(self, records: list):
+        self._records = records
+
+    def running(self) -> list:
+        return list(self._records)
+
+
+def open_and_read(pid: int) -> dict:
+    """A sample the straightforward way, files opened every time."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    with open(f"/proc/{pid}/status") as f:
+        status = dict(line.split(":", 1) for line in f if ":" in line)
+    return {
+        "cpu_ticks": int(fields[11]) + int(fields[12]),
+        "rss_kb": int(status["VmRSS"].split()[0]),
+        "threads": int(status["Threads"]),
+        "fds": len(os.listdir(f"/proc/{pid}/fd")),
+    }
+
+
+async def measure(records: list, directory: str, args) -> dict:
+    telemetry = BotTelemetry(FakeRegistry(records), max_per_tick=args.max_per_tick, directory=directory)
+    # Opens the stat files, as the first tick does
+    telemetry._tick(records)
+
+    start = time.perf_counter()
+    for _ in range(args.ticks):
+        telemetry._tick(records)
+    tick_secs = (time.perf_counter() - start) / args.ticks
+    sampled = min(len(records), args.max_per_tick)
+
+    start = time.perf_counter()
+    for _ in range(args.ticks):
+        for record in records:
+            open_and_read(record.pid)
+    naive_secs = (time.perf_counter() - start) / args.ticks
+
+    # Running on its own, on its thread
+    telemetry._interval = args.interval
+    monitor = LoopLagMonitor("bench", interval=0.005)
+    monitor.start()
+    telemetry.start()
+    await asyncio.sleep(args.secs)
+    await telemetry.stop()
+    await monitor.stop()
+
+    snapshot = json.loads(telemetry.snapshot_json)
+    return {
+        "bots": len(records),
+        "sampled_per_tick": sampled,
+        "tick_ms": round(1000 * tick_secs, 2),
+        "us_per_sampled_bot": round(1e6 * tick_secs / sampled, 1),
+        "open_and_read_tick_ms": round(1000 * naive_secs, 2),
+        "open_and_read_us_per_bot": round(1e6 * naive_secs / len(records), 1),
+        "snapshot_kb": round(len(telemetry.snapshot_json) / 1024, 1),
+        "max_loop_lag_ms": round(monitor.stats()["max_lag_ms"], 2),
+        "reported_queue_depth": snapshot["totals"]["queue_depth"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot telemetry sampling benchmark")
+    parser.add_argument("--bots", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--max-per-tick", type=int, default=256)
+    parser.add_argument("--interval", type=float, default=0.1, help="Between ticks, for the loop lag")
+    parser.add_argument("--secs", type=float, default=2.0, help="How long to measure the loop lag")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    procs = []
+    try:
+        for count in args.bots:
+            while len(procs) < count:
+                proc = subprocess.Popen(["sleep", "600"])
+                write_report(
+                    proc.pid,
+                    {"t": time.time(), "sessions": {f"fake://room-{proc.pid}": {"queue_depth": 1}}},
+                    directory,
+                )
+                procs.append(proc)
+            records = [FakeRecord(p.pid, f"fake://room-{p.pid}", time.time()) for p in procs[:count]]
+            print(json.dumps(asyncio.run(measure(records, directory, args))), flush=True)
+    finally:
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Measures the phrase TTS cache against a fake TTS service (200 ms to first
+byte by default). LLM responses are replayed as text frames: most of them
+start with one of a few common short phrases (acknowledgements, fillers,
+clarifying questions, picked with a Zipf distribution), some are followed by
+a sentence that is never repeated.
+
+Reports the cache hit rate, TTS requests made, and the time from the end of
+the LLM response to the first audio frame, with and without the cache.
+
+    python -m benchmarks.bench_tts_cache --responses 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    TextFrame,
+    TTSAudioRawFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+from loguru import logger
+
+from benchmarks.fake_services import FakeTTSService
+from utils.tts_cache import PhraseAudioStore, TTSCache
+
+PHRASES = [
+    "Okay.",
+    "Sure.",
+    "I see.",
+    "Hmm, let me think.",
+    "Could you say that again?",
+    "That makes sense.",
+    "Really?",
+    "How much would that cost?",
+    "What do you mean by that?",
+    "Go on.",
+    "Right.",
+    "Interesting.",
+    "And how long would it take?",
+    "I'm not sure about that.",
+    "Can you give me an example?",
+    "Why would I need that?",
+]
+
+
+def make_responses(count: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, len(PHRASES) + 1)
+    weights /= weights.sum()
+
+    responses = []
+    for i in range(count):
+        r = rng.random()
+        phrase = PHRASES[rng.choice(len(PHRASES), p=weights)]
+        if r < 0.6:
+            responses.append(phrase)
+        elif r < 0.85:
+            responses.append(f"{phrase} Tell me more about option number {i} for my bakery.")
+        else:
+            responses.append(f"My bakery has been open for {i} years and business is steady.")
+    return responses
+
+
+class ResponseTimer(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.first_audio = None
+        self.done = asyncio.Event()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, TTSAudioRawFrame) and self.first_audio is None:
+            self.first_audio = time.perf_counter()
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            self.done.set()
+
+        await self.push_frame(frame, direction)
+
+
+async def run(responses: list, cache_path: str | None, ttfb: float) -> dict:
+    tts = FakeTTSService(ttfb=ttfb)
+    timer = ResponseTimer()
+
+    if cache_path:
+        store = PhraseAudioStore(cache_path)
+        cache = TTSCache(store, tts)
+        pipeline = Pipeline([cache.input(), tts, cache.output(), timer])
+    else:
+        store = None
+        pipeline = Pipeline([tts, timer])
+
+    task = PipelineTask(pipeline)
+    runner_task = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+
+    latencies = []
+    for text in responses:
+        timer.first_audio = None
+        timer.done.clear()
+        tokens = [word + " " for word in text.split(" ")]
+        await task.queue_frames(
+            [LLMFullResponseStartFrame(), *[TextFrame(t) for t in tokens], LLMFullResponseEndFrame()]
+        )
+        sent = time.perf_counter()
+        await timer.done.wait()
+        latencies.append(timer.first_audio - sent)
+
+    await task.queue_frame(EndFrame())
+    await runner_task
+
+    latencies = np.array(latencies)
+    result = {
+        "cache": bool(cache_path),
+        "responses": len(responses),
+        "tts_requests": tts.requests,
+        "tts_characters": tts.characters,
+        "first_audio_p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "first_audio_p90_ms": 1000 * float(np.percentile(latencies, 90)),
+    }
+    if store:
+        result["store"] = store.stats()
+        store.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phrase TTS cache benchmark")
+    parser.add_argument("--responses", type=int, default=300)
+    parser.add_argument("--ttfb", type=float, default=0.2, help="Fake TTS time to first byte")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logger.remove()
+
+    responses = make_responses(args.responses, args.seed)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_path = os.path.join(cache_dir, "tts.cache")
+        print(json.dumps(asyncio.run(run(responses, None, args.ttfb))), flush=True)
+        # Cold cache, then a second session reusing the same file
+        print(json.dumps(asyncio.run(run(responses, cache_path, args.ttfb))), flush=True)
+        print(json.dumps(asyncio.run(run(responses, cache_path, args.ttfb))), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures VAD CPU cost per concurrent session.
+
+Each session is a thread feeding 512 sample (32 ms at 16 kHz) chunks in real
+time to its analyzer, like a transport does. Modes:
+
+  - separate: one SileroVADAnalyzer per session (what the bots do today)
+  - shared: one ONNX session, one inference per chunk
+  - batched: one ONNX session, chunks from all sessions batched together
+
+    python -m benchmarks.bench_vad --sessions 1 8 32 --duration 10
+"""
+
+import argparse
+import json
+import resource
+import threading
+import time
+
+import numpy as np
+
+from loguru import logger
+
+CHUNK_SAMPLES = 512
+CHUNK_DURATION = CHUNK_SAMPLES / 16000
+
+
+def make_chunks(count: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    # Noise with a slow envelope, so the model sees both speech-like and
+    # quiet parts.
+    envelope = np.abs(np.sin(np.linspace(0, 8, count)))[:, None]
+    audio = rng.standard_normal((count, CHUNK_SAMPLES)) * 4000 * envelope
+    return [chunk.astype(np.int16).tobytes() for chunk in audio]
+
+
+def cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(mode: str, sessions: int, duration: float) -> dict:
+    from pipecat.audio.vad.silero import SileroVADAnalyzer
+
+    from utils.shared_vad import SharedSileroVAD
+
+    if mode == "separate":
+        analyzers = [SileroVADAnalyzer() for _ in range(sessions)]
+    else:
+        shared = SharedSileroVAD(batched=(mode == "batched"))
+        analyzers = [shared.create_analyzer() for _ in range(sessions)]
+
+    chunks = make_chunks(int(duration / CHUNK_DURATION), seed=1)
+    latencies = [[] for _ in range(sessions)]
+    start_event = threading.Event()
+
+    def session(index: int):
+        analyzer = analyzers[index]
+        start_event.wait()
+        # Spread sessions over the chunk period, like real calls would be.
+        start_time = time.monotonic() + index * CHUNK_DURATION / sessions
+        for i, chunk in enumerate(chunks):
+            delay = start_time + i * CHUNK_DURATION - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            t = time.perf_counter()
+            analyzer.voice_confidence(chunk)
+            latencies[index].append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+
+    cpu_start = cpu_time()
+    wall_start = time.monotonic()
+    start_event.set()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - wall_start
+    cpu = cpu_time() - cpu_start
+
+    all_latencies = np.array([l for session in latencies for l in session])
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "cpu_percent_per_session": 100 * cpu / wall / sessions,
+        "latency_p50_ms": 1000 * float(np.percentile(all_latencies, 50)),
+        "latency_p99_ms": 1000 * float(np.percentile(all_latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VAD CPU per session benchmark")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of audio per run")
+    parser.add_argument("--modes", nargs="+", default=["separate", "shared", "batched"])
+    args = parser.parse_args()
+
+    logger.remove()
+
+    for sessions in args.sessions:
+        for mode in args.modes:
+            print(json.dumps(run(mode, sessions, args.duration)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
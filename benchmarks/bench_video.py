@@ -0,0 +1,134 @@
+"""
+Camera output cost per bot, for each video mode: every frame at full rate
+(what bot.py used to do), only the frames that change (VIDEO_ADAPTIVE), and
+the same with sprites pre-scaled to a smaller size (VIDEO_SIZE).
+
+An output transport with bot.py's camera settings shows the cat listening
+and talking in turns, like in a call, and every frame it sends is copied
+out of the atlas (like BotOutputTransport does) and encoded. Daily's VP8
+encoder isn't available outside a call, so frames are encoded as lossy WebP
+instead, which is a VP8 key frame: encode CPU is comparable, bandwidth is an
+upper bound (a real encoder sends much less for a frame that didn't
+change).
+
+    python -m benchmarks.bench_video --secs 20 --talk-ratio 0.4
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from pipecat.frames.frames import EndFrame, OutputImageRawFrame, SpriteFrame
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineParams, PipelineTask
+from pipecat.transports.base_output import BaseOutputTransport
+
+from utils.sprite_atlas import load_sprites, parse_size
+from utils.transport import AdaptiveCameraMixin, BotParams
+
+MODES = {
+    "constant": {"adaptive": False, "size": None},
+    "adaptive": {"adaptive": True, "size": None},
+    "adaptive-scaled": {"adaptive": True, "size": (512, 288)},
+}
+
+
+class EncodingOutputTransport(AdaptiveCameraMixin, BaseOutputTransport):
+    def __init__(self, params: BotParams, encode: bool, **kwargs):
+        super().__init__(params, **kwargs)
+        self._encode = encode
+        # The Daily client encodes on its own thread, the camera loop doesn't wait
+        self.encoder = ThreadPoolExecutor(max_workers=1)
+        self.frames = 0
+        self.pixels = 0
+        self.encoded_bytes = 0
+        self.encode_secs = 0.0
+
+    async def write_frame_to_camera(self, frame: OutputImageRawFrame):
+        self.frames += 1
+        self.pixels += frame.size[0] * frame.size[1]
+        self.encoder.submit(self._encode_frame, bytes(frame.image), frame.size, frame.format)
+
+    def _encode_frame(self, image: bytes, size, format: str):
+        start = time.thread_time()
+        if self._encode:
+            out = io.BytesIO()
+            Image.frombytes(format, size, image).save(out, "WEBP", quality=70, method=0)
+            self.encoded_bytes += out.tell()
+        self.encode_secs += time.thread_time() - start
+
+
+async def run_mode(name: str, args) -> dict:
+    mode = MODES[name]
+    size = mode["size"] or args.size
+    sprites = load_sprites(size=size)
+    sprites.extend(sprites[::-1])
+    quiet_frame = sprites[0]
+    talking_frame = SpriteFrame(images=sprites)
+
+    transport = EncodingOutputTransport(
+        BotParams(
+            camera_out_enabled=True,
+            camera_out_width=size[0],
+            camera_out_height=size[1],
+            camera_out_adaptive=mode["adaptive"],
+            camera_out_idle_framerate=args.idle_fps,
+        ),
+        encode=not args.no_encode,
+    )
+    task = PipelineTask(Pipeline([transport]), PipelineParams())
+
+    async def play():
+        await task.queue_frame(quiet_frame)
+        cycle = args.turn_secs
+        elapsed = 0.0
+        while elapsed < args.secs:
+            await asyncio.sleep(cycle * (1 - args.talk_ratio))
+            await task.queue_frame(talking_frame)
+            await asyncio.sleep(cycle * args.talk_ratio)
+            await task.queue_frame(quiet_frame)
+            elapsed += cycle
+        await task.queue_frame(EndFrame())
+
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    await asyncio.gather(PipelineRunner(handle_sigint=False).run(task), play())
+    transport.encoder.shutdown(wait=True)
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    return {
+        "mode": name,
+        "size": f"{size[0]}x{size[1]}",
+        "fps": round(transport.frames / wall, 1),
+        "mpixels_per_sec": round(transport.pixels / wall / 1e6, 2),
+        "encode_cpu_percent": round(100 * transport.encode_secs / wall, 1),
+        "cpu_percent": round(100 * cpu / wall, 1),
+        "kbit_per_sec": round(8 * transport.encoded_bytes / wall / 1000) if not args.no_encode else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Camera output benchmark")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--size", type=parse_size, default=(1024, 576), help="Full video size")
+    parser.add_argument("--secs", type=float, default=20.0, help="Seconds per mode")
+    parser.add_argument("--turn-secs", type=float, default=5.0, help="Length of a listen and talk cycle")
+    parser.add_argument("--talk-ratio", type=float, default=0.4, help="Share of the time the bot talks")
+    parser.add_argument("--idle-fps", type=float, default=1.0)
+    parser.add_argument("--no-encode", action="store_true", help="Only copy the frames out")
+    args = parser.parse_args()
+
+    for name in args.modes:
+        print(json.dumps(asyncio.run(run_mode(name, args))), flush=True)
+
+
+if __name__ == "__main__":
+    main()
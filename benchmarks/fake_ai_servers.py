@@ -0,0 +1,185 @@
+"""
+Local stand-ins for the OpenAI chat completions API and the Cartesia TTS
+websocket, so the real OpenAILLMService and CartesiaTTSService can be run
+against them:
+
+    python -m benchmarks.fake_ai_servers --port 9100 --handshake 0.3
+
+    OpenAILLMService(api_key="fake", model="gpt-4o", base_url="http://localhost:9100/v1")
+    CartesiaTTSService(api_key="fake", voice_id="fake", url="ws://localhost:9100/tts/websocket")
+
+Plain HTTP has no TLS handshake to speak of, so the first request on every
+new connection (and every websocket upgrade) is delayed by `handshake`
+seconds instead. Idle HTTP connections are closed after `idle_timeout`
+seconds, like the real load balancers do.
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import time
+import weakref
+
+import numpy as np
+
+from aiohttp import web
+
+from benchmarks.fake_services import RESPONSES
+
+
+class FakeAIServers:
+    def __init__(
+        self,
+        *,
+        handshake: float = 0.3,
+        ttft: float = 0.3,
+        tokens_per_sec: float = 50.0,
+        tts_ttfb: float = 0.2,
+        secs_per_char: float = 0.06,
+        idle_timeout: float = 60.0,
+    ):
+        self.handshake = handshake
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.tts_ttfb = tts_ttfb
+        self.secs_per_char = secs_per_char
+        self.idle_timeout = idle_timeout
+        self._responses = itertools.cycle(RESPONSES)
+        self._connections = weakref.WeakSet()
+
+        self.connections = 0
+        self.llm_requests = 0
+        self.websockets = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1/models/{model}", self.get_model)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_get("/tts/websocket", self.tts_websocket)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    async def _handshake(self, request: web.Request):
+        transport = request.transport
+        if transport not in self._connections:
+            self._connections.add(transport)
+            self.connections += 1
+            await asyncio.sleep(self.handshake)
+
+    async def get_model(self, request: web.Request) -> web.Response:
+        await self._handshake(request)
+        return web.json_response(
+            {"id": request.match_info["model"], "object": "model", "created": 0, "owned_by": "fake"}
+        )
+
+    def _chunk(self, model: str, delta: dict, usage: dict | None = None) -> bytes:
+        chunk = {
+            "id": "fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}] if delta else [],
+        }
+        if usage:
+            chunk["usage"] = usage
+        return f"data: {json.dumps(chunk)}\n\n".encode()
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        await self._handshake(request)
+        self.llm_requests += 1
+        body = await request.json()
+        model = body.get("model", "fake")
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(self.ttft)
+
+        words = next(self._responses).split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_sec)
+            await response.write(self._chunk(model, {"content": word if i == 0 else f" {word}"}))
+        usage = {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)}
+        await response.write(self._chunk(model, {}, usage))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def tts_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        await asyncio.sleep(self.handshake)
+        self.websockets += 1
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        # Per context: when its next audio can be sent, and its playout time
+        contexts = {}
+        async for message in ws:
+            msg = json.loads(message.data)
+            context_id = msg.get("context_id")
+            if msg.get("cancel"):
+                contexts.pop(context_id, None)
+                continue
+
+            if context_id not in contexts:
+                await asyncio.sleep(self.tts_ttfb)
+                contexts[context_id] = 0.0
+            text = msg.get("transcript", "").strip()
+            if text:
+                sample_rate = msg["output_format"]["sample_rate"]
+                samples = int(len(text) * self.secs_per_char * sample_rate)
+                t = np.arange(samples) / sample_rate
+                audio = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16).tobytes()
+                words = text.split()
+                start = contexts[context_id]
+                duration = samples / sample_rate
+                await ws.send_json(
+                    {
+                        "type": "timestamps",
+                        "context_id": context_id,
+                        "word_timestamps": {
+                            "words": words,
+                            "start": [start + i * duration / len(words) for i in range(len(words))],
+                            "end": [start + (i + 1) * duration / len(words) for i in range(len(words))],
+                        },
+                    }
+                )
+                await ws.send_json(
+                    {
+                        "type": "chunk",
+                        "context_id": context_id,
+                        "data": base64.b64encode(audio).decode(),
+                        "done": False,
+                    }
+                )
+                contexts[context_id] = start + duration
+            if not msg.get("continue", True):
+                await ws.send_json({"type": "done", "context_id": context_id, "done": True})
+                contexts.pop(context_id, None)
+        return ws
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"connections": self.connections, "llm_requests": self.llm_requests, "websockets": self.websockets}
+        )
+
+
+async def start_fake_ai_servers(host: str, port: int, **kwargs) -> web.AppRunner:
+    servers = FakeAIServers(**kwargs)
+    runner = web.AppRunner(servers.app(), keepalive_timeout=servers.idle_timeout)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI and Cartesia APIs")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host address")
+    parser.add_argument("--port", type=int, default=9100, help="Port number")
+    parser.add_argument("--handshake", type=float, default=0.3, help="Seconds added to every new connection")
+    parser.add_argument("--idle-timeout", type=float, default=60.0, help="Seconds before idle connections are closed")
+    config = parser.parse_args()
+
+    servers = FakeAIServers(handshake=config.handshake, idle_timeout=config.idle_timeout)
+    web.run_app(servers.app(), host=config.host, port=config.port, keepalive_timeout=config.idle_timeout)
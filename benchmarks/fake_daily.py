@@ -0,0 +1,101 @@
+"""
+A local stand-in for the parts of the Daily REST API used by DailyRESTHelper:
+creating, fetching and deleting rooms, and minting meeting tokens.
+
+    python -m benchmarks.fake_daily --port 9000 --latency 0.15
+
+Then point the server at it with DAILY_API_URL=http://localhost:9000/v1.
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+
+class FakeDaily:
+    def __init__(self, latency: float = 0.0, domain: str = "fake.daily.co"):
+        self.latency = latency
+        self.domain = domain
+        self.rooms = {}
+        self.tokens = 0
+        self.requests = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/rooms", self.create_room)
+        app.router.add_get("/v1/rooms/{name}", self.get_room)
+        app.router.add_delete("/v1/rooms/{name}", self.delete_room)
+        app.router.add_post("/v1/meeting-tokens", self.create_token)
+        app.router.add_get("/v1/stats", self.stats)
+        return app
+
+    async def _delay(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def create_room(self, request: web.Request) -> web.Response:
+        await self._delay()
+        data = await request.json()
+        name = data.get("name") or uuid.uuid4().hex[:12]
+        properties = data.get("properties", {})
+        room = {
+            "id": str(uuid.uuid4()),
+            "name": name,
+            "api_created": True,
+            "privacy": data.get("privacy", "public"),
+            "url": f"https://{self.domain}/{name}",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "config": {"exp": properties.get("exp", time.time() + 5 * 60), **properties},
+        }
+        self.rooms[name] = room
+        return web.json_response(room)
+
+    async def get_room(self, request: web.Request) -> web.Response:
+        await self._delay()
+        room = self.rooms.get(request.match_info["name"])
+        if not room:
+            return web.json_response({"error": "not-found"}, status=404)
+        return web.json_response(room)
+
+    async def delete_room(self, request: web.Request) -> web.Response:
+        await self._delay()
+        name = request.match_info["name"]
+        if self.rooms.pop(name, None) is None:
+            return web.json_response({"error": "not-found"}, status=404)
+        return web.json_response({"deleted": True, "name": name})
+
+    async def create_token(self, request: web.Request) -> web.Response:
+        await self._delay()
+        data = await request.json()
+        if data.get("properties", {}).get("room_name") not in self.rooms:
+            return web.json_response({"error": "invalid-request-error"}, status=400)
+        self.tokens += 1
+        return web.json_response({"token": uuid.uuid4().hex})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"rooms": len(self.rooms), "tokens": self.tokens, "requests": self.requests}
+        )
+
+
+async def start_fake_daily(host: str, port: int, latency: float = 0.0) -> web.AppRunner:
+    runner = web.AppRunner(FakeDaily(latency).app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Daily REST API")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host address")
+    parser.add_argument("--port", type=int, default=9000, help="Port number")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    config = parser.parse_args()
+
+    web.run_app(FakeDaily(config.latency).app(), host=config.host, port=config.port)
@@ -0,0 +1,226 @@
+"""
+Local stand-ins for the AI services the bots use, so pipelines can be run and
+measured without network access or API keys.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import time
+
+from collections import OrderedDict
+from typing import AsyncGenerator, List, Optional, Tuple
+
+import numpy as np
+
+from openai.types.chat import ChatCompletionChunk
+from openai.types.chat.chat_completion_chunk import Choice, ChoiceDelta
+from openai.types.completion_usage import CompletionUsage
+
+from pipecat.frames.frames import Frame, TTSAudioRawFrame, TTSStartedFrame, TTSStoppedFrame
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
+from pipecat.services.ai_services import TTSService
+from pipecat.services.openai import OpenAILLMService
+
+from utils.context_budget import count_tokens, message_tokens
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+RESPONSES = [
+    "Sure. Tell me more about what you have in mind for my website.",
+    "Hmm, I'm not convinced yet. How is that better than what I have now?",
+    "That sounds expensive. What would it cost for a small bakery like mine?",
+    "Okay. And how long would it take before customers could order online?",
+]
+
+
+class PromptPrefixCache:
+    """
+    What the LLM providers do with prompt caching: the request body is
+    tokenized and cut into `block_tokens` blocks, and every block whose
+    prefix (itself and all the blocks before it, byte for byte) was seen
+    recently is served from the cache instead of being prefilled. Nothing is
+    cached for prompts under `min_tokens`. With the defaults it behaves like
+    OpenAI's (1024 tokens, then 128 token increments). One cache is shared
+    by every session, like the provider's.
+    """
+
+    def __init__(self, *, block_tokens: int = 128, min_tokens: int = 1024, max_blocks: int = 100_000):
+        self._block_tokens = block_tokens
+        self._min_tokens = min_tokens
+        self._max_blocks = max_blocks
+        self._blocks: OrderedDict[bytes, None] = OrderedDict()
+
+    def lookup(self, messages: List[dict]) -> Tuple[int, int]:
+        """The prompt and cached tokens of a request, and caches its prefixes."""
+        body = json.dumps(messages, ensure_ascii=False)
+        if _encoding:
+            tokens = _encoding.encode(body)
+        else:
+            tokens = [body[i : i + 4] for i in range(0, len(body), 4)]
+        if len(tokens) < self._min_tokens:
+            return len(tokens), 0
+
+        cached = 0
+        prefix = hashlib.sha256()
+        for end in range(self._block_tokens, len(tokens) + 1, self._block_tokens):
+            prefix.update(repr(tokens[end - self._block_tokens : end]).encode())
+            key = prefix.digest()
+            if key in self._blocks:
+                self._blocks.move_to_end(key)
+                if cached == end - self._block_tokens:
+                    cached = end
+            else:
+                self._blocks[key] = None
+                if len(self._blocks) > self._max_blocks:
+                    self._blocks.popitem(last=False)
+        return len(tokens), cached if cached >= self._min_tokens else 0
+
+
+class FakeLLMService(OpenAILLMService):
+    """
+    An OpenAILLMService whose completions are generated locally, so the rest
+    of the service (context handling, metrics, frames) is the real one.
+
+    Time to first token grows with the prompt like a real model's prefill:
+    `ttft + prefill_secs_per_token * prompt tokens`. Response tokens then
+    stream at `tokens_per_sec`. Responses cycle through `responses`. With a
+    `prefix_cache` the cached tokens of the prompt are not prefilled.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttft: float = 0.15,
+        prefill_secs_per_token: float = 0.0001,
+        tokens_per_sec: float = 100.0,
+        responses: List[str] = RESPONSES,
+        prefix_cache: Optional[PromptPrefixCache] = None,
+        **kwargs,
+    ):
+        super().__init__(api_key="fake", model="fake-llm", **kwargs)
+        self._ttft = ttft
+        self._prefill_secs_per_token = prefill_secs_per_token
+        self._tokens_per_sec = tokens_per_sec
+        self._responses = itertools.cycle(responses)
+        self._prefix_cache = prefix_cache
+
+        self.requests = 0
+        self.prompt_tokens: List[int] = []
+        self.cached_tokens: List[int] = []
+        self.ttfts: List[float] = []
+
+    def create_client(self, api_key=None, base_url=None, **kwargs):
+        return None
+
+    async def get_chat_completions(self, context: OpenAILLMContext, messages):
+        self.requests += 1
+        if self._prefix_cache:
+            prompt_tokens, cached_tokens = self._prefix_cache.lookup(messages)
+        else:
+            prompt_tokens, cached_tokens = sum(message_tokens(m) for m in messages), 0
+        self.prompt_tokens.append(prompt_tokens)
+        self.cached_tokens.append(cached_tokens)
+        return self._stream(prompt_tokens, cached_tokens, next(self._responses), time.perf_counter())
+
+    async def _stream(self, prompt_tokens: int, cached_tokens: int, text: str, started: float):
+        prefill_tokens = prompt_tokens - cached_tokens
+        await asyncio.sleep(self._ttft + self._prefill_secs_per_token * prefill_tokens)
+        self.ttfts.append(time.perf_counter() - started)
+
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(1 / self._tokens_per_sec)
+            yield self._chunk(ChoiceDelta(content=word if i == 0 else f" {word}"))
+
+        completion_tokens = count_tokens(text)
+        yield ChatCompletionChunk(
+            id="fake",
+            choices=[],
+            created=0,
+            model=self.model_name,
+            object="chat.completion.chunk",
+            usage=CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+
+    def _chunk(self, delta: ChoiceDelta) -> ChatCompletionChunk:
+        return ChatCompletionChunk(
+            id="fake",
+            choices=[Choice(index=0, delta=delta, finish_reason=None)],
+            created=0,
+            model=self.model_name,
+            object="chat.completion.chunk",
+        )
+
+
+class FakeTTSService(TTSService):
+    """
+    Synthesizes a tone instead of speech: `ttfb` seconds after the request,
+    `secs_per_char` seconds of audio per character of text, in `chunk_secs`
+    chunks. Counts the requests and characters it was asked for.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttfb: float = 0.2,
+        secs_per_char: float = 0.06,
+        chunk_secs: float = 0.1,
+        voice_id: str = "fake",
+        sample_rate: int = 24000,
+        **kwargs,
+    ):
+        super().__init__(sample_rate=sample_rate, **kwargs)
+        self._ttfb = ttfb
+        self._secs_per_char = secs_per_char
+        self._chunk_secs = chunk_secs
+        self.set_voice(voice_id)
+        self.set_model_name("fake-tts")
+
+        self.requests = 0
+        self.characters = 0
+
+    def can_generate_metrics(self) -> bool:
+        return True
+
+    async def set_model(self, model: str):
+        await super().set_model(model)
+
+    def set_voice(self, voice: str):
+        super().set_voice(voice)
+
+    async def flush_audio(self):
+        pass
+
+    def synthesize(self, text: str) -> bytes:
+        samples = int(len(text) * self._secs_per_char * self.sample_rate)
+        t = np.arange(samples) / self.sample_rate
+        return (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16).tobytes()
+
+    async def run_tts(self, text: str) -> AsyncGenerator[Frame, None]:
+        self.requests += 1
+        self.characters += len(text)
+
+        await self.start_ttfb_metrics()
+        await asyncio.sleep(self._ttfb)
+        await self.stop_ttfb_metrics()
+
+        yield TTSStartedFrame()
+        audio = self.synthesize(text)
+        chunk_size = int(self._chunk_secs * self.sample_rate) * 2
+        for i in range(0, len(audio), chunk_size):
+            yield TTSAudioRawFrame(
+                audio=audio[i : i + chunk_size], sample_rate=self.sample_rate, num_channels=1
+            )
+        yield TTSStoppedFrame()
@@ -0,0 +1,285 @@
+"""
+A transport that plays a scripted user instead of joining a Daily room. It
+has the same constructor as DailyTransport, so the bots can build it with
+their own params (VAD, camera, audio) through `run_bot(transport_class=...)`.
+
+For every turn of the script the user speaks (audio is pushed in real time
+through the VAD like a microphone would) while interim transcriptions
+arrive word by word, then a final transcription arrives,
+and then the user waits for the bot to answer and finish speaking. Audio
+written by the bot is played out in real time too, so interruptions, bot
+speaking frames and sprite animations behave like they do in a call.
+
+Turn latency is measured from the user stopping speaking (the VAD's
+UserStoppedSpeakingFrame) to the first audio the bot writes.
+"""
+
+import asyncio
+import time
+import wave
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from pipecat.frames.frames import (
+    InputAudioRawFrame,
+    InterimTranscriptionFrame,
+    OutputImageRawFrame,
+    StartFrame,
+    TranscriptionFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.frame_processor import FrameProcessor
+from pipecat.transports.base_input import BaseInputTransport
+from pipecat.transports.base_output import BaseOutputTransport
+from pipecat.transports.base_transport import BaseTransport, TransportParams
+
+from utils.transport import AdaptiveCameraMixin
+
+from loguru import logger
+
+PARTICIPANT_ID = "fake-user"
+
+
+@dataclass
+class UserTurn:
+    text: str
+    # 16-bit mono PCM at the transport's input sample rate. When None, low
+    # level noise of `speech_secs` is played and the speaking frames are
+    # generated here instead of by the VAD.
+    audio: Optional[bytes] = None
+    speech_secs: float = 2.0
+    # How long the user waits after the bot stops speaking, the transport's
+    # `think_secs` when None
+    think_secs: Optional[float] = None
+
+
+def load_wav(path: str, sample_rate: int = 16000) -> bytes:
+    with wave.open(path, "rb") as f:
+        if f.getnchannels() != 1 or f.getsampwidth() != 2 or f.getframerate() != sample_rate:
+            raise ValueError(f"{path} must be 16-bit mono at {sample_rate} Hz")
+        return f.readframes(f.getnframes())
+
+
+class FakeInputTransport(BaseInputTransport):
+    def __init__(self, transport: "FakeTransport", params: TransportParams, **kwargs):
+        super().__init__(params, **kwargs)
+        self._transport = transport
+        self._play_task = None
+
+    async def start(self, frame: StartFrame):
+        await super().start(frame)
+        self._play_task = self.get_event_loop().create_task(self._transport._play(self))
+
+    async def cleanup(self):
+        await super().cleanup()
+        if self._play_task:
+            self._play_task.cancel()
+
+    async def _handle_interruptions(self, frame):
+        if isinstance(frame, UserStoppedSpeakingFrame):
+            self._transport._user_stopped_speaking()
+        await super()._handle_interruptions(frame)
+
+
+class FakeOutputTransport(AdaptiveCameraMixin, BaseOutputTransport):
+    def __init__(self, transport: "FakeTransport", params: TransportParams, **kwargs):
+        super().__init__(params, **kwargs)
+        self._transport = transport
+        self._playout_time = 0.0
+
+    async def write_raw_audio_frames(self, frames: bytes):
+        self._transport._bot_audio()
+        # Play out in real time, like the Daily client does
+        now = time.monotonic()
+        self._playout_time = max(self._playout_time, now) + len(frames) / (
+            self._params.audio_out_sample_rate * self._params.audio_out_channels * 2
+        )
+        await asyncio.sleep(self._playout_time - now)
+
+    async def write_frame_to_camera(self, frame: OutputImageRawFrame):
+        self._transport.camera_frames += 1
+        self._transport.camera_pixels += frame.size[0] * frame.size[1]
+
+    @property
+    def bot_speaking(self) -> bool:
+        return self._bot_speaking
+
+
+class FakeTransport(BaseTransport):
+    def __init__(
+        self,
+        room_url: str,
+        token: str | None,
+        bot_name: str,
+        params: TransportParams = TransportParams(),
+        *,
+        script: List[UserTurn],
+        transcription_delay: float = 0.3,
+        interim_results: bool = True,
+        join_delay: float = 0.0,
+        think_secs: float = 1.0,
+        answer_timeout: float = 20.0,
+        input_name: str | None = None,
+        output_name: str | None = None,
+        loop: asyncio.AbstractEventLoop | None = None,
+    ):
+        super().__init__(input_name=input_name, output_name=output_name, loop=loop)
+        self._params = params
+        self._script = script
+        self._transcription_delay = transcription_delay
+        self._interim_results = interim_results
+        self._join_delay = join_delay
+        self._think_secs = think_secs
+        self._answer_timeout = answer_timeout
+
+        self._input: FakeInputTransport | None = None
+        self._output: FakeOutputTransport | None = None
+
+        self._turn_started_at: Optional[float] = None
+        self._answered = asyncio.Event()
+
+        # Results
+        self.opener_latency: Optional[float] = None
+        self.turn_latencies: List[float] = []
+        self.unanswered = 0
+        self.camera_frames = 0
+        self.camera_pixels = 0
+        self.done = asyncio.Event()
+
+        # The events the bots register handlers for
+        self._register_event_handler("on_first_participant_joined")
+        self._register_event_handler("on_participant_left")
+        self._register_event_handler("on_call_state_updated")
+
+    def input(self) -> FrameProcessor:
+        if not self._input:
+            self._input = FakeInputTransport(self, self._params, name=self._input_name)
+        return self._input
+
+    def output(self) -> FrameProcessor:
+        if not self._output:
+            self._output = FakeOutputTransport(self, self._params, name=self._output_name)
+        return self._output
+
+    def capture_participant_transcription(self, participant_id: str, *args, **kwargs):
+        pass
+
+    def _user_stopped_speaking(self):
+        self._turn_started_at = time.monotonic()
+        self._answered.clear()
+
+    def _bot_audio(self):
+        if self._turn_started_at is not None:
+            latency = time.monotonic() - self._turn_started_at
+            if self.opener_latency is None:
+                self.opener_latency = latency
+            else:
+                self.turn_latencies.append(latency)
+            self._turn_started_at = None
+            self._answered.set()
+
+    async def _wait_for_bot(self):
+        # Until the bot has answered and finished speaking
+        try:
+            await asyncio.wait_for(self._answered.wait(), self._answer_timeout)
+        except asyncio.TimeoutError:
+            self.unanswered += 1
+            self._turn_started_at = None
+        while self._output and self._output.bot_speaking:
+            await asyncio.sleep(0.05)
+
+    async def _play(self, input: FakeInputTransport):
+        try:
+            participant = {"id": PARTICIPANT_ID}
+            # The user usually gets to the room a little after the bot
+            await asyncio.sleep(self._join_delay)
+            # The bot greets first, timed from the participant joining
+            self._answered.clear()
+            self._turn_started_at = time.monotonic()
+            await self._call_event_handler("on_first_participant_joined", participant)
+            await self._wait_for_bot()
+
+            for turn in self._script:
+                await asyncio.sleep(self._think_secs if turn.think_secs is None else turn.think_secs)
+                await self._speak(input, turn)
+                await self._wait_for_bot()
+
+            await self._call_event_handler("on_participant_left", participant, "leaving")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.exception(f"Fake user failed: {e}")
+        finally:
+            self.done.set()
+
+    async def _push_audio(self, input: FakeInputTransport, audio: bytes):
+        sample_rate = self._params.audio_in_sample_rate
+        chunk_samples = sample_rate // 50
+        chunk_size = chunk_samples * 2
+        start = time.monotonic()
+        for i, offset in enumerate(range(0, len(audio), chunk_size)):
+            await input.push_audio_frame(
+                InputAudioRawFrame(
+                    audio=audio[offset : offset + chunk_size],
+                    sample_rate=sample_rate,
+                    num_channels=1,
+                )
+            )
+            delay = start + (i + 1) * chunk_samples / sample_rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def _speak(self, input: FakeInputTransport, turn: UserTurn):
+        sample_rate = self._params.audio_in_sample_rate
+        vad_analyzer = self._params.vad_analyzer
+        stop_secs = vad_analyzer.params.stop_secs if vad_analyzer else 0.8
+
+        synthetic = turn.audio is None
+        speech_secs = turn.speech_secs if synthetic else len(turn.audio) / 2 / sample_rate
+
+        async def interim_transcriptions():
+            words = turn.text.split()
+            for i in range(1, len(words) + 1):
+                await asyncio.sleep(speech_secs / len(words))
+                await input.push_frame(
+                    InterimTranscriptionFrame(
+                        " ".join(words[:i]), PARTICIPANT_ID, time.strftime("%Y-%m-%dT%H:%M:%S")
+                    )
+                )
+
+        interims = None
+        if self._interim_results:
+            interims = self._loop.create_task(interim_transcriptions())
+
+        if synthetic:
+            # Quiet enough for the VAD to stay quiet, but it still runs on it
+            samples = int(turn.speech_secs * sample_rate)
+            noise = np.random.default_rng().standard_normal(samples) * 30
+            await input._handle_interruptions(UserStartedSpeakingFrame())
+            await self._push_audio(input, noise.astype(np.int16).tobytes())
+        else:
+            await self._push_audio(input, turn.audio)
+
+        async def transcribe():
+            await asyncio.sleep(self._transcription_delay)
+            await input.push_frame(
+                TranscriptionFrame(turn.text, PARTICIPANT_ID, time.strftime("%Y-%m-%dT%H:%M:%S"))
+            )
+
+        if interims:
+            await interims
+        transcription = self._loop.create_task(transcribe())
+
+        # The silence after the user stops, long enough for the VAD to notice
+        silence = bytes(int(stop_secs * sample_rate) * 2)
+        await self._push_audio(input, silence)
+        if synthetic:
+            await input._handle_interruptions(UserStoppedSpeakingFrame())
+        else:
+            await self._push_audio(input, bytes(int(0.3 * sample_rate) * 2))
+
+        await transcription
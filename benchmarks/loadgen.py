@@ -0,0 +1,369 @@
+"""
+Load generator for the control plane: server.py (`/` and `/status/{bot_id}`)
+or bot_runner.py (`/start_bot`).
+
+By default it starts everything it needs locally: the fake Daily REST API
+(benchmarks/fake_daily.py), and the server under test with
+BOT_MODULE=benchmarks.stub_bot, so launches spawn real processes that
+don't join real rooms. `--url` targets a server that is already running
+instead.
+
+    python -m benchmarks.loadgen --requests 200 --concurrency 50
+    python -m benchmarks.loadgen --target bot_runner --requests 200 --concurrency 50
+
+Reports request latency percentiles by endpoint and status, launch
+throughput, the event loop lag of the server while under load (from its
+/metrics), the cost of spawning bot processes, and the generator's own loop
+lag (if that is high the generator, not the server, is the bottleneck).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import defaultdict
+
+import aiohttp
+import numpy as np
+
+from prometheus_client.parser import text_string_to_metric_families
+
+from utils.loop_monitor import LoopLagMonitor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def summarize(latencies: list) -> dict:
+    if not latencies:
+        return {"count": 0}
+    ms = 1000 * np.array(latencies)
+    return {
+        "count": len(latencies),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p90_ms": round(float(np.percentile(ms, 90)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "max_ms": round(float(ms.max()), 1),
+    }
+
+
+async def wait_until_up(session: aiohttp.ClientSession, url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc and proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {proc.returncode}")
+        try:
+            async with session.get(url):
+                return
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} didn't come up in {timeout} seconds")
+
+
+async def scrape_loop_lag(session: aiohttp.ClientSession, base_url: str, process: str) -> dict | None:
+    """Cumulative event loop lag histogram of `process`, or None without /metrics."""
+    try:
+        async with session.get(f"{base_url}/metrics") as response:
+            if response.status != 200:
+                return None
+            text = await response.text()
+    except aiohttp.ClientError:
+        return None
+
+    histogram = {"buckets": {}, "sum": 0.0, "count": 0.0}
+    for family in text_string_to_metric_families(text):
+        if family.name != "event_loop_lag_seconds":
+            continue
+        for sample in family.samples:
+            if sample.labels.get("process") != process:
+                continue
+            if sample.name.endswith("_bucket"):
+                histogram["buckets"][float(sample.labels["le"])] = sample.value
+            elif sample.name.endswith("_sum"):
+                histogram["sum"] = sample.value
+            elif sample.name.endswith("_count"):
+                histogram["count"] = sample.value
+    return histogram
+
+
+def loop_lag_delta(before: dict | None, after: dict | None) -> dict | None:
+    if not before or not after:
+        return None
+    count = after["count"] - before["count"]
+    if count <= 0:
+        return None
+
+    def quantile(q: float) -> float:
+        # Upper bound of the bucket the quantile falls in
+        for le in sorted(after["buckets"]):
+            if after["buckets"][le] - before["buckets"].get(le, 0) >= q * count:
+                return le
+        return float("inf")
+
+    return {
+        "samples": int(count),
+        "avg_ms": round(1000 * (after["sum"] - before["sum"]) / count, 2),
+        "p50_ms_le": 1000 * quantile(0.5),
+        "p99_ms_le": 1000 * quantile(0.99),
+    }
+
+
+class LoadGenerator:
+    def __init__(self, session: aiohttp.ClientSession, base_url: str, target: str):
+        self._session = session
+        self._base_url = base_url
+        self._target = target
+        self.latencies = defaultdict(list)
+        self.bot_ids = []
+        self.errors = defaultdict(int)
+
+    async def _request(self, endpoint: str, method: str, path: str, **kwargs):
+        start = time.monotonic()
+        try:
+            async with self._session.request(method, f"{self._base_url}{path}", allow_redirects=False, **kwargs) as response:
+                await response.read()
+                status = response.status
+                headers = response.headers
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.errors[f"{endpoint} {type(e).__name__}"] += 1
+            return None, None
+        self.latencies[f"{endpoint} {status}"].append(time.monotonic() - start)
+        return status, headers
+
+    async def start_bot(self) -> bool:
+        if self._target == "bot_runner":
+            status, _ = await self._request("/start_bot", "POST", "/start_bot", json={})
+            return status == 200
+        status, headers = await self._request("/", "GET", "/")
+        if status in (302, 307) and "X-Bot-Id" in headers:
+            self.bot_ids.append(headers["X-Bot-Id"])
+        return status in (302, 307)
+
+    async def status(self, bot_id: str):
+        await self._request("/status", "GET", f"/status/{bot_id}")
+
+    async def run(self, count: int, concurrency: int, make_request) -> tuple[int, float]:
+        """Sends `count` requests, `concurrency` at a time. Returns successes and duration."""
+        remaining = iter(range(count))
+        successes = 0
+
+        async def client():
+            nonlocal successes
+            for i in remaining:
+                if await make_request(i):
+                    successes += 1
+
+        start = time.monotonic()
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        return successes, time.monotonic() - start
+
+
+async def spawn_cost(module: str, count: int, concurrency: int) -> dict:
+    """Spawns bot workers until they are ready, the way the worker pool does."""
+    semaphore = asyncio.Semaphore(concurrency)
+    ready_times = []
+    rss = []
+
+    async def spawn():
+        async with semaphore:
+            start = time.monotonic()
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-m",
+                module,
+                "--worker",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                cwd=ROOT,
+            )
+            line = await proc.stdout.readline()
+            if line == b"READY\n":
+                ready_times.append(time.monotonic() - start)
+                with open(f"/proc/{proc.pid}/status") as f:
+                    for status_line in f:
+                        if status_line.startswith("VmRSS:"):
+                            rss.append(int(status_line.split()[1]) / 1024)
+            # No job, the worker exits
+            proc.stdin.close()
+            await proc.wait()
+
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.monotonic()
+    await asyncio.gather(*[spawn() for _ in range(count)])
+    wall = time.monotonic() - start
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (usage_after.ru_utime + usage_after.ru_stime) - (usage_before.ru_utime + usage_before.ru_stime)
+
+    return {
+        "module": module,
+        "spawned": count,
+        "ready": len(ready_times),
+        "concurrency": concurrency,
+        "time_to_ready": summarize(ready_times),
+        "cpu_ms_per_spawn": round(1000 * cpu / count, 1),
+        "rss_mb_per_worker": round(float(np.mean(rss)), 1) if rss else None,
+        "spawns_per_sec": round(count / wall, 1),
+    }
+
+
+async def main(args):
+    processes = []
+    metrics_dir = tempfile.mkdtemp()
+    client_loop = LoopLagMonitor("loadgen")
+    client_loop.start()
+
+    try:
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=args.concurrency),
+            timeout=aiohttp.ClientTimeout(total=args.timeout),
+        ) as session:
+            base_url = args.url
+            if not base_url:
+                daily_port = free_port()
+                processes.append(
+                    subprocess.Popen(
+                        [
+                            sys.executable,
+                            "-m",
+                            "benchmarks.fake_daily",
+                            "--port",
+                            str(daily_port),
+                            "--latency",
+                            str(args.daily_latency),
+                        ],
+                        cwd=ROOT,
+                        stdout=subprocess.DEVNULL,
+                    )
+                )
+                await wait_until_up(session, f"http://127.0.0.1:{daily_port}/v1/stats", processes[-1])
+
+                port = free_port()
+                env = {
+                    **os.environ,
+                    "DAILY_API_KEY": "fake",
+                    "DAILY_API_URL": f"http://127.0.0.1:{daily_port}/v1",
+                    "BOT_MODULE": args.bot_module,
+                    "BOT_POOL_SIZE": str(args.pool_size),
+                    "MAX_BOTS": str(args.max_bots),
+                    "BOT_QUEUE_SIZE": str(args.concurrency),
+                    # Only the bot count limits launches, not the load we cause
+                    "MIN_MEM_AVAILABLE_MB": "0",
+                    "MAX_LOAD_PER_CPU": "1000",
+                    "STUB_BOT_SECS": str(args.bot_secs),
+                    "PROMETHEUS_MULTIPROC_DIR": metrics_dir,
+                }
+                processes.append(
+                    subprocess.Popen(
+                        [
+                            sys.executable,
+                            "-m",
+                            "uvicorn",
+                            args.app or f"{args.target}:app",
+                            "--host",
+                            "127.0.0.1",
+                            "--port",
+                            str(port),
+                            "--log-level",
+                            "warning",
+                        ],
+                        cwd=ROOT,
+                        env=env,
+                    )
+                )
+                base_url = f"http://127.0.0.1:{port}"
+                await wait_until_up(session, f"{base_url}/metrics", processes[-1])
+                # Let the room and worker pools fill up
+                await asyncio.sleep(args.warmup)
+
+            generator = LoadGenerator(session, base_url, args.target)
+            lag_before = await scrape_loop_lag(session, base_url, args.target)
+            launched, launch_secs = await generator.run(
+                args.requests, args.concurrency, lambda i: generator.start_bot()
+            )
+            lag_after = await scrape_loop_lag(session, base_url, args.target)
+
+            status_secs = 0.0
+            if args.target == "server" and args.status_requests:
+                bot_ids = generator.bot_ids or ["0"]
+
+                async def status(i):
+                    await generator.status(bot_ids[i % len(bot_ids)])
+
+                _, status_secs = await generator.run(args.status_requests, args.concurrency, status)
+
+            server_stats = None
+            try:
+                async with session.get(f"{base_url}/stats") as response:
+                    if response.status == 200:
+                        server_stats = await response.json()
+            except aiohttp.ClientError:
+                pass
+
+        results = {
+            "target": args.target,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "launched": launched,
+            "launches_per_sec": round(launched / launch_secs, 1) if launch_secs else None,
+            "status_requests_per_sec": round(args.status_requests / status_secs, 1) if status_secs else None,
+            "latency": {key: summarize(values) for key, values in sorted(generator.latencies.items())},
+            "errors": dict(generator.errors),
+            "server_loop_lag": loop_lag_delta(lag_before, lag_after),
+            "server_stats": server_stats,
+        }
+        if args.spawn:
+            results["spawn"] = await spawn_cost(args.bot_module, args.spawn, args.spawn_concurrency)
+        results["loadgen_loop_lag"] = client_loop.stats()
+        return results
+
+    finally:
+        await client_loop.stop()
+        for proc in reversed(processes):
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def parse_args(argv: list | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Control plane load generator")
+    parser.add_argument("--target", choices=["server", "bot_runner"], default="server")
+    parser.add_argument("--app", help="ASGI app to start instead of <target>:app")
+    parser.add_argument("--url", help="Use a server that is already running instead of starting one")
+    parser.add_argument("--requests", type=int, default=200, help="Bot launch requests")
+    parser.add_argument("--status-requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per request timeout")
+    parser.add_argument("--daily-latency", type=float, default=0.1, help="Fake Daily API latency")
+    parser.add_argument("--bot-module", default="benchmarks.stub_bot")
+    parser.add_argument("--bot-secs", type=float, default=5.0, help="How long stub bots stay up")
+    parser.add_argument("--pool-size", type=int, default=2, help="BOT_POOL_SIZE of the server")
+    parser.add_argument("--max-bots", type=int, default=1000, help="MAX_BOTS of the server")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds to let the pools fill")
+    parser.add_argument("--spawn", type=int, default=20, help="Bot workers to spawn to measure spawn cost (0 to skip)")
+    parser.add_argument("--spawn-concurrency", type=int, default=4)
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    results = asyncio.run(main(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
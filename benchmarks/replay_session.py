@@ -0,0 +1,216 @@
+"""
+Replays sessions recorded by the bots' session log (utils/session_log.py)
+through the real `run_bot()` pipeline, offline: FakeTransport plays the
+user's recorded turns (what they said, for how long, and how long they
+waited after the bot stopped talking) and FakeLLMService gives the
+recorded answers, opener first. The TTS is FakeTTSService.
+
+Each replay is recorded by the bot's own session log (in a temporary
+directory), so recorded and replayed turn latency are measured the same
+way: from the user stopping speaking (VAD) to the bot starting to speak.
+Useful to check a change against real conversations instead of the
+benchmarks' script, or to reproduce a session that went wrong.
+
+    python -m benchmarks.replay_session logs/sessions --list
+    python -m benchmarks.replay_session logs/sessions --session 3f2a9c1d0b7e --secs-per-char 0.02
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# The bot modules read their settings at import time, see bench_pipeline.py.
+# The replays are recorded in a directory of their own.
+os.environ["OPENER_CACHE"] = "0"
+os.environ["CONTEXT_MAX_TOKENS"] = "0"
+os.environ.setdefault("TTS_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "tts_phrases.cache"))
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp())
+REPLAY_LOG_DIR = tempfile.mkdtemp()
+os.environ["SESSION_LOG"] = "1"
+os.environ["SESSION_LOG_DIR"] = REPLAY_LOG_DIR
+
+from loguru import logger  # noqa: E402
+
+from benchmarks.fake_services import FakeLLMService, FakeTTSService  # noqa: E402
+from benchmarks.fake_transport import FakeTransport, UserTurn  # noqa: E402
+from utils.session_log import read_sessions  # noqa: E402
+
+# Said instead of an answer that was interrupted before its first token
+EMPTY_RESPONSE = "Okay."
+
+
+def session_script(events: list, vad_stop_secs: float = 0.8) -> tuple:
+    """
+    The user's turns and the bot's answers (the opener first) of a recorded
+    session. Transcripts without an answer in between are one turn.
+    """
+    turns = []
+    responses = []
+    text = []
+    speech_secs = 2.0
+    think_secs = None
+    user_started = None
+    bot_stopped = None
+
+    for event in events:
+        name = event["event"]
+        if name == "user_started_speaking":
+            user_started = event["t"]
+            # From the bot going quiet to the start of the turn
+            if not text and think_secs is None and bot_stopped is not None:
+                think_secs = max(event["t"] - bot_stopped, 0.0)
+        elif name == "user_stopped_speaking" and user_started is not None:
+            # The VAD stops `vad_stop_secs` into the silence, FakeTransport adds it back
+            speech_secs = max(event["t"] - user_started - vad_stop_secs, 0.2)
+        elif name == "bot_stopped_speaking":
+            bot_stopped = event["t"]
+        elif name == "transcript":
+            text.append(event["text"])
+        elif name in ("opener", "llm_response"):
+            if not turns and not text and not responses:
+                responses.append(event["text"] or EMPTY_RESPONSE)
+            elif text:
+                turns.append(UserTurn(" ".join(text), speech_secs=speech_secs, think_secs=think_secs))
+                responses.append(event["text"] or EMPTY_RESPONSE)
+                text = []
+                think_secs = None
+            elif not event.get("interrupted") and len(responses) > len(turns):
+                # A second answer to the same turn (one was interrupted), keep the last one
+                responses[-1] = event["text"] or responses[-1]
+    return turns, responses
+
+
+def turn_latencies(events: list) -> list:
+    """Seconds from the user stopping speaking to the bot starting to speak, per turn."""
+    latencies = []
+    stopped = None
+    for event in events:
+        if event["event"] == "user_stopped_speaking":
+            stopped = event["t"]
+        elif event["event"] == "bot_started_speaking" and stopped is not None:
+            latencies.append(event["t"] - stopped)
+            stopped = None
+    return latencies
+
+
+def percentile_ms(values: list, q: float) -> float | None:
+    return round(1000 * float(np.percentile(values, q)), 1) if values else None
+
+
+async def replay(bot_module, session_id: str, events: list, args) -> dict:
+    turns, responses = session_script(events, args.vad_stop_secs)
+    started = events[0] if events[0]["event"] == "session_started" else {}
+    room_url = f"replay://{session_id}"
+
+    def transport_class(*transport_args, **kwargs):
+        return FakeTransport(
+            *transport_args,
+            script=turns,
+            transcription_delay=args.transcription_delay,
+            **kwargs,
+        )
+
+    llm = FakeLLMService(
+        ttft=args.llm_ttft, tokens_per_sec=args.llm_tokens_per_sec, responses=responses
+    )
+    tts = FakeTTSService(ttfb=args.tts_ttfb, secs_per_char=args.secs_per_char)
+    persona = args.persona or started.get("persona")
+    await bot_module.run_bot(
+        room_url, "", transport_class=transport_class, llm=llm, tts=tts, persona=persona
+    )
+
+    replayed = next(
+        (
+            session
+            for session in read_sessions([REPLAY_LOG_DIR]).values()
+            if session[0].get("room_url") == room_url
+        ),
+        [],
+    )
+    recorded_latencies = turn_latencies(events)
+    replayed_latencies = turn_latencies(replayed)
+    return {
+        "session": session_id,
+        "persona": persona,
+        "turns": len(turns),
+        "llm_requests": llm.requests,
+        "recorded_turn_p50_ms": percentile_ms(recorded_latencies, 50),
+        "replayed_turn_p50_ms": percentile_ms(replayed_latencies, 50),
+        "recorded_turn_p90_ms": percentile_ms(recorded_latencies, 90),
+        "replayed_turn_p90_ms": percentile_ms(replayed_latencies, 90),
+        "recorded_interruptions": sum(1 for e in events if e["event"] == "interruption"),
+        "replayed_interruptions": sum(1 for e in replayed if e["event"] == "interruption"),
+    }
+
+
+async def replay_all(bot_module, sessions: dict, args) -> list:
+    results = []
+    for session_id, events in sessions.items():
+        result = await replay(bot_module, session_id, events, args)
+        results.append(result)
+        print(json.dumps(result), flush=True)
+    await bot_module.session_log.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions offline")
+    parser.add_argument("paths", nargs="+", help="Session log segments, or directories of them")
+    parser.add_argument("--session", nargs="+", help="Sessions to replay (default: all)")
+    parser.add_argument("--list", action="store_true", help="List the recorded sessions and exit")
+    parser.add_argument("--bot", help="Bot module (default: the one that recorded the session)")
+    parser.add_argument("--persona", help="Persona (default: the recorded one)")
+    parser.add_argument("--llm-ttft", type=float, default=0.3)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--tts-ttfb", type=float, default=0.2)
+    parser.add_argument("--secs-per-char", type=float, default=0.06, help="Bot speech per character")
+    parser.add_argument("--transcription-delay", type=float, default=0.3)
+    parser.add_argument("--vad-stop-secs", type=float, default=0.8, help="The recording VAD's stop_secs")
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    args = parser.parse_args()
+
+    sessions = read_sessions(args.paths)
+    if args.session:
+        sessions = {s: sessions[s] for s in args.session if s in sessions}
+    if not sessions:
+        print("No sessions found", file=sys.stderr)
+        sys.exit(1)
+
+    if args.list:
+        for session_id, events in sessions.items():
+            turns, _ = session_script(events)
+            started = events[0] if events[0]["event"] == "session_started" else {}
+            summary = {
+                "session": session_id,
+                "bot": started.get("bot"),
+                "persona": started.get("persona"),
+                "room_url": started.get("room_url"),
+                "turns": len(turns),
+                "secs": round(events[-1]["t"] - events[0]["t"], 1),
+                "ended": next((e.get("reason") for e in events if e["event"] == "session_ended"), None),
+            }
+            print(json.dumps(summary))
+        return
+
+    # Sessions are replayed with the bot that recorded them, unless told otherwise
+    names = {events[0].get("bot") for events in sessions.values()} - {None}
+    bot_name = args.bot or (names.pop() if len(names) == 1 else "bot")
+    bot_module = importlib.import_module(bot_name)
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    results = asyncio.run(replay_all(bot_module, sessions, args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+A bot that doesn't join anything, for load testing the control plane. It
+speaks the same protocols as the real bots: `python -m benchmarks.stub_bot
+--worker` for the server's worker pool, `-u <room url> -t <token>` for a
+direct launch, and `run_bot()` for a worker agent in host mode. It stays
+"in the call" for STUB_BOT_SECS seconds and exits. In a process of its own,
+SIGTERM ends it STUB_BOT_DRAIN_SECS later, standing in for the real bots
+finishing their turn (see benchmarks/bench_shutdown.py).
+
+STUB_BOT_IMPORT_SECS adds a busy wait at startup, to stand in for the
+time the real bots spend importing pipecat and loading models.
+
+    BOT_MODULE=benchmarks.stub_bot STUB_BOT_SECS=5 python server.py
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+
+STUB_BOT_SECS = float(os.getenv("STUB_BOT_SECS", "5"))
+STUB_BOT_IMPORT_SECS = float(os.getenv("STUB_BOT_IMPORT_SECS", "0"))
+STUB_BOT_DRAIN_SECS = float(os.getenv("STUB_BOT_DRAIN_SECS", "0"))
+
+_deadline = time.process_time() + STUB_BOT_IMPORT_SECS
+while time.process_time() < _deadline:
+    pass
+
+
+async def run_bot(room_url: str, token: str, *args, **kwargs):
+    await asyncio.sleep(STUB_BOT_SECS)
+
+
+async def run_own_process(room_url: str, token: str):
+    session = asyncio.create_task(run_bot(room_url, token))
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, loop.call_later, STUB_BOT_DRAIN_SECS, session.cancel)
+    try:
+        await session
+    except asyncio.CancelledError:
+        pass
+
+
+async def worker():
+    from utils.bot_pool import wait_for_job
+
+    job = await wait_for_job()
+    if not job:
+        return
+
+    await run_own_process(job["room_url"], job["token"])
+
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv:
+        asyncio.run(worker())
+    else:
+        parser = argparse.ArgumentParser(description="Stub bot")
+        parser.add_argument("-u", "--url", type=str, required=True, help="Room URL")
+        parser.add_argument("-t", "--token", type=str, required=True, help="Token")
+        config, _ = parser.parse_known_args()
+        asyncio.run(run_own_process(config.url, config.token))
@@ -4,22 +4,30 @@
 # SPDX-License-Identifier: BSD 2-Clause License
 #
 
+import argparse
 import asyncio
 import aiohttp
 import os
+import tempfile
 import sys
+import time
 
+# All the processes on the host write their metrics to files in this
+# directory, see utils/metrics.py. prometheus_client reads it when it is
+# first imported, so it is set before anything else is.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "pipecat_chatbot_metrics")
+)
 
-from PIL import Image
 
 from pipecat.audio.vad.silero import SileroVADAnalyzer
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineParams, PipelineTask
 from pipecat.frames.frames import (
-    OutputImageRawFrame,
     SpriteFrame,
     Frame,
+    StartInterruptionFrame,
     LLMMessagesFrame,
     TTSAudioRawFrame,
     TTSStoppedFrame,
@@ -28,10 +36,25 @@ from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
 from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
 # from pipecat.services.elevenlabs import ElevenLabsTTSService
 from pipecat.services.cartesia import CartesiaTTSService
+from pipecat.services.ai_services import TTSService
 from pipecat.services.openai import OpenAILLMService
-from pipecat.transports.services.daily import DailyParams, DailyTransport
 
 from runner import configure
+from utils.bot_pool import wait_for_job
+from utils.context_budget import ContextBudget, OpenAISummarizer
+from utils.lip_sync import LipSync, order_by_motion
+from utils.opener_cache import OpenerCache, generate_cartesia_opener
+from utils.personas import PersonaRegistry
+from utils.queue_depth import QueueDepthReporter
+from utils.session_lifetime import SessionLifetime, record_exit, token_expiry
+from utils.session_log import SessionLog
+from utils.speculative_llm import SpeculativeLLM
+from utils.sprite_atlas import load_sprites, parse_size
+from utils.transport import BotDailyTransport, BotParams
+from utils.text_chunker import TTSTextChunker, stream_text_to
+from utils.tts_cache import PhraseAudioStore, TTSCache
+from utils.turn_metrics import TurnLatencyTracker
+from utils.warmup import PooledOpenAILLMService, ServiceWarmer
 
 from loguru import logger
 
@@ -42,40 +65,121 @@ load_dotenv(override=True)
 logger.remove(0)
 logger.add(sys.stderr, level="DEBUG")
 
-sprites = []
+# Who the bot is, unless the server asks for another persona (see personas/)
+personas = PersonaRegistry(default=os.getenv("BOT_PERSONA", "bakery"))
+
+# Camera output. With VIDEO_ADAPTIVE video is only sent when the image
+# changes, and VIDEO_IDLE_FPS times a second while it doesn't.
+VIDEO_SIZE = parse_size(os.getenv("VIDEO_SIZE", "1024x576"))
+VIDEO_ADAPTIVE = os.getenv("VIDEO_ADAPTIVE", "0") == "1"
+VIDEO_IDLE_FPS = float(os.getenv("VIDEO_IDLE_FPS", "1"))
 
-script_dir = os.path.dirname(__file__)
+# "amplitude" moves the sprite with the loudness of the speech, LIP_SYNC_FPS
+# times a second at most, "loop" plays the whole animation while talking
+SPRITE_ANIMATION = os.getenv("SPRITE_ANIMATION", "loop")
+LIP_SYNC_FPS = float(os.getenv("LIP_SYNC_FPS", "15"))
 
-for i in range(1, 26):
-    # Build the full path to the image file
-    full_path = os.path.join(script_dir, f"assets/robot0{i}.png")
-    # Get the filename without the extension to use as the dictionary key
-    # Open the image and convert it to bytes
-    with Image.open(full_path) as img:
-        sprites.append(OutputImageRawFrame(image=img.tobytes(), size=img.size, format=img.format))
+# Sprites are read from a raw atlas that every bot process maps and shares,
+# instead of decoding the PNGs in each process. They are scaled to the video
+# size when the atlas is built, not for every frame sent.
+sprites = load_sprites(size=VIDEO_SIZE)
 
 flipped = sprites[::-1]
 sprites.extend(flipped)
 
+# Pre-generated opening lines (text and audio), shared by all bot processes
+opener_cache = OpenerCache(
+    os.getenv("OPENER_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache", "openers")),
+    variants=int(os.getenv("OPENER_VARIANTS", "3")),
+)
+OPENER_CACHE_ENABLED = os.getenv("OPENER_CACHE", "0") == "1"
+
+# Token budget of the LLM context, older turns get summarized (0 disables it)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "0"))
+
+# Start the LLM request on stable interim transcriptions, trading tokens
+# for time to first token
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0") == "1"
+SPECULATIVE_STABLE_SECS = float(os.getenv("SPECULATIVE_STABLE_SECS", "0.3"))
+
+# Send the LLM's text to the TTS in chunks: the first one at the first
+# clause, after TTS_FIRST_CHUNK_WORDS words or TTS_FIRST_CHUNK_SECS after the
+# first token, so a long first sentence doesn't hold back the first audio
+TTS_CHUNKING = os.getenv("TTS_CHUNKING", "0") == "1"
+TTS_FIRST_CHUNK_WORDS = int(os.getenv("TTS_FIRST_CHUNK_WORDS", "12"))
+TTS_FIRST_CHUNK_SECS = float(os.getenv("TTS_FIRST_CHUNK_SECS", "0.4"))
+
+# Open the LLM connection while joining the room and keep it from idling out
+SERVICE_WARMUP = os.getenv("SERVICE_WARMUP", "1") == "1"
+SERVICE_KEEPALIVE_SECS = float(os.getenv("SERVICE_KEEPALIVE_SECS", "30"))
+
+# End the session when nobody has spoken for SESSION_IDLE_SECS, or after
+# SESSION_MAX_SECS, instead of holding on to the room until the token
+# expires (0 disables either)
+SESSION_IDLE_SECS = float(os.getenv("SESSION_IDLE_SECS", "0"))
+SESSION_MAX_SECS = float(os.getenv("SESSION_MAX_SECS", "0"))
+SESSION_END_TIMEOUT = float(os.getenv("SESSION_END_TIMEOUT", "10"))
+# On SIGTERM (the server draining its bots) or Ctrl-C, how long to wait for
+# the current turn to be over before ending the session anyway
+SESSION_DRAIN_SECS = float(os.getenv("SESSION_DRAIN_SECS", "20"))
+
+# Transcripts (what the user said, as text), turn boundaries and
+# interruptions of every session, written in the background to gzipped JSONL
+# segments (see benchmarks/replay_session.py). Off unless asked for, nothing
+# deletes the segments.
+session_log = None
+if os.getenv("SESSION_LOG", "0") == "1":
+    session_log = SessionLog(
+        os.getenv("SESSION_LOG_DIR", os.path.join(os.path.dirname(__file__), "logs", "sessions")),
+        max_segment_bytes=int(os.getenv("SESSION_LOG_SEGMENT_MB", "16")) * 1024 * 1024,
+        max_segment_secs=float(os.getenv("SESSION_LOG_SEGMENT_SECS", "600")),
+    )
+
+# How many frames wait in the pipeline's queues, for the server's telemetry
+queue_reporter = QueueDepthReporter() if os.getenv("BOT_TELEMETRY", "0") == "1" else None
+
+# Audio of short phrases the bot says often, shared by all bot processes
+tts_phrase_store = None
+if os.getenv("TTS_CACHE", "0") == "1":
+    tts_phrase_store = PhraseAudioStore(
+        os.getenv("TTS_CACHE_PATH", os.path.join(os.path.dirname(__file__), "cache", "tts_phrases.cache")),
+        max_bytes=int(os.getenv("TTS_CACHE_MB", "64")) * 1024 * 1024,
+    )
+
 # When the bot isn't talking, show a static image of the cat listening
 quiet_frame = sprites[0]
 talking_frame = SpriteFrame(images=sprites)
 
+# The sprites from the cat at rest to the most movement, for lip sync
+lip_sync_sprites = order_by_motion(sprites) if SPRITE_ANIMATION == "amplitude" else None
+
 
 class TalkingAnimation(FrameProcessor):
     """
     This class starts a talking animation when it receives an first AudioFrame,
     and then returns to a "quiet" sprite when it sees a TTSStoppedFrame.
+
+    With a LipSync the sprite follows the loudness of the speech instead:
+    every audio chunk is mapped to the sprites it should show, which are
+    pushed one by one, only when they change, at the time the chunk will
+    be played out.
     """
 
-    def __init__(self):
+    def __init__(self, lip_sync: LipSync | None = None):
         super().__init__()
         self._is_talking = False
+        self._lip_sync = lip_sync
+        # When the audio pushed so far will have been played out
+        self._playout_end = 0.0
+        self._schedule: asyncio.Queue = asyncio.Queue()
+        self._animation_task: asyncio.Task | None = None
 
     async def process_frame(self, frame: Frame, direction: FrameDirection):
         await super().process_frame(frame, direction)
 
-        if isinstance(frame, TTSAudioRawFrame):
+        if self._lip_sync:
+            await self._lip_sync_frame(frame)
+        elif isinstance(frame, TTSAudioRawFrame):
             if not self._is_talking:
                 await self.push_frame(talking_frame)
                 self._is_talking = True
@@ -83,107 +187,317 @@ class TalkingAnimation(FrameProcessor):
             await self.push_frame(quiet_frame)
             self._is_talking = False
 
-        await self.push_frame(frame)
+        await self.push_frame(frame, direction)
 
+        if self._lip_sync and isinstance(frame, StartInterruptionFrame):
+            # After the interruption, which drops the frames the output
+            # transport had queued
+            await self.push_frame(quiet_frame)
 
-async def main():
-    async with aiohttp.ClientSession() as session:
-        (room_url, token) = await configure(session)
+    async def cleanup(self):
+        await super().cleanup()
+        self._stop_animation()
 
-        transport = DailyTransport(
-            room_url,
-            token,
-            "Chatbot",
-            DailyParams(
-                audio_out_enabled=True,
-                camera_out_enabled=True,
-                camera_out_width=1024,
-                camera_out_height=576,
-                vad_enabled=True,
-                vad_analyzer=SileroVADAnalyzer(),
-                transcription_enabled=True,
-                #
-                # Spanish
-                #
-                # transcription_settings=DailyTranscriptionSettings(
-                #     language="es",
-                #     tier="nova",
-                #     model="2-general"
-                # )
-            ),
+    async def _lip_sync_frame(self, frame: Frame):
+        if isinstance(frame, TTSAudioRawFrame):
+            start = max(time.monotonic(), self._playout_end)
+            self._playout_end = start + len(frame.audio) / (frame.sample_rate * frame.num_channels * 2)
+            for offset, index in self._lip_sync.frames(frame.audio, frame.sample_rate, frame.num_channels):
+                self._schedule.put_nowait((start + offset, index))
+            if not self._animation_task:
+                self._animation_task = self.get_event_loop().create_task(self._animation_task_handler())
+        elif isinstance(frame, TTSStoppedFrame):
+            self._schedule.put_nowait((self._playout_end, 0))
+            self._lip_sync.reset()
+        elif isinstance(frame, StartInterruptionFrame):
+            # Whatever was scheduled won't be played
+            self._stop_animation()
+            self._playout_end = 0.0
+            self._lip_sync.reset()
+
+    def _stop_animation(self):
+        if self._animation_task:
+            self._animation_task.cancel()
+            self._animation_task = None
+        self._schedule = asyncio.Queue()
+
+    async def _animation_task_handler(self):
+        while True:
+            at, index = await self._schedule.get()
+            delay = at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.push_frame(self._lip_sync.sprites[index])
+
+
+async def run_bot(
+    room_url: str,
+    token: str,
+    vad_analyzer: SileroVADAnalyzer | None = None,
+    runner: PipelineRunner | None = None,
+    *,
+    transport_class=BotDailyTransport,
+    llm: OpenAILLMService | None = None,
+    tts: TTSService | None = None,
+    persona: str | None = None,
+):
+    persona = personas.get(persona)
+    logger.info(f"Persona: {persona.name} (prompt prefix {persona.prefix_hash})")
+
+    # The transport and the services can be swapped for local stand-ins, see
+    # benchmarks/bench_pipeline.py.
+    transport = transport_class(
+        room_url,
+        token,
+        "Chatbot",
+        BotParams(
+            audio_out_enabled=True,
+            camera_out_enabled=True,
+            camera_out_width=VIDEO_SIZE[0],
+            camera_out_height=VIDEO_SIZE[1],
+            camera_out_adaptive=VIDEO_ADAPTIVE,
+            camera_out_idle_framerate=VIDEO_IDLE_FPS,
+            vad_enabled=True,
+            vad_analyzer=vad_analyzer or SileroVADAnalyzer(),
+            transcription_enabled=True,
+            #
+            # Spanish
+            #
+            # transcription_settings=DailyTranscriptionSettings(
+            #     language="es",
+            #     tier="nova",
+            #     model="2-general"
+            # )
+        ),
+    )
+
+    # tts = ElevenLabsTTSService(
+    #     api_key=os.getenv("ELEVENLABS_API_KEY"),
+    #     #
+    #     # English
+    #     #
+    #     voice_id="pNInz6obpgDQGcFmaJgB",
+    #     #
+    #     # Spanish
+    #     #
+    #     # model="eleven_multilingual_v2",
+    #     # voice_id="gD1IexrzCvsXPHUuT0s3",
+    #)
+
+
+    params = CartesiaTTSService.InputParams(
+        speed="normal",
+        emotion=["positivity:high",
+                 "curiosity"]
+    )
+
+    voice_id = persona.voice_id or os.getenv("CARTESIA_VOICE_ID")
+    tts = tts or CartesiaTTSService(
+        api_key=os.getenv("CARTESIA_API_KEY"),
+        voice_id=voice_id,
+        params=params
+    )
+    llm_model = "gpt-4o"
+    llm = llm or PooledOpenAILLMService(api_key=os.getenv("OPENAI_API_KEY"), model=llm_model)
+
+    # The persona's prompt first, the same bytes in every session, so the
+    # LLM provider can reuse its cached prefix
+    messages = persona.messages()
+
+    context = OpenAILLMContext(messages)
+    context_aggregator = llm.create_context_aggregator(context)
+
+    lip_sync = LipSync(lip_sync_sprites, fps=LIP_SYNC_FPS) if lip_sync_sprites else None
+    ta = TalkingAnimation(lip_sync)
+
+    # Where each turn's time goes, exported to the server's /metrics
+    turn_metrics = TurnLatencyTracker()
+
+    # Keeps the prompt (and so the time to first token) from growing for
+    # the whole call
+    budget_processors = []
+    if CONTEXT_MAX_TOKENS:
+        context_budget = ContextBudget(
+            OpenAISummarizer(api_key=os.getenv("OPENAI_API_KEY")),
+            max_tokens=CONTEXT_MAX_TOKENS,
         )
+        budget_processors = [context_budget]
 
-        # tts = ElevenLabsTTSService(
-        #     api_key=os.getenv("ELEVENLABS_API_KEY"),
-        #     #
-        #     # English
-        #     #
-        #     voice_id="pNInz6obpgDQGcFmaJgB",
-        #     #
-        #     # Spanish
-        #     #
-        #     # model="eleven_multilingual_v2",
-        #     # voice_id="gD1IexrzCvsXPHUuT0s3",
-        #)
-
-
-        params = CartesiaTTSService.InputParams(
-            speed="normal",
-            emotion=["positivity:high",
-                     "curiosity"]
+    observer_processors = []
+    gate_processors = []
+    if SPECULATIVE_LLM:
+        speculative = SpeculativeLLM(
+            llm, context, persona=persona.name, stable_secs=SPECULATIVE_STABLE_SECS
         )
-
-        tts = CartesiaTTSService(
-            api_key=os.getenv("CARTESIA_API_KEY"),
-            voice_id=os.getenv("CARTESIA_VOICE_ID"),
-            params=params
+        observer_processors = [speculative.observer()]
+        gate_processors = [speculative.gate()]
+
+    tts_processors = [tts]
+    if TTS_CHUNKING:
+        stream_text_to(tts)
+        chunker = TTSTextChunker(
+            first_max_words=TTS_FIRST_CHUNK_WORDS, first_max_secs=TTS_FIRST_CHUNK_SECS
+        )
+        tts_processors = [chunker, tts]
+    if tts_phrase_store:
+        tts_cache = TTSCache(tts_phrase_store, tts)
+        tts_processors = [tts_cache.input(), *tts_processors, tts_cache.output()]
+
+    # Ends the session when the participant leaves, goes quiet or stays too long
+    lifetime = SessionLifetime(
+        idle_secs=SESSION_IDLE_SECS,
+        max_duration_secs=SESSION_MAX_SECS,
+        end_timeout=SESSION_END_TIMEOUT,
+        expires_at=token_expiry(token),
+    )
+
+    # Sees the frames through the turn metrics' probes
+    log_observers = []
+    if session_log:
+        recorder = session_log.recorder(
+            room_url=room_url, bot="bot", persona=persona.name, prefix_hash=persona.prefix_hash
         )
-        llm = OpenAILLMService(api_key=os.getenv("OPENAI_API_KEY"), model="gpt-4o")
-
-        messages = [
-            {
-                "role": "system",
-                #
-                # English
-                #
-                # "content": "You are Chatbot, a friendly, helpful robot. Your goal is to demonstrate your capabilities in a succinct way. Your output will be converted to audio so don't include special characters in your answers. Respond to what the user said in a creative and helpful way, but keep your responses brief. Start by introducing yourself.",
-                "content": """You are a lady who runs a small bakery in her local town. Your business is doing well with local foot traffic, but you have noticed that your online orders have been stagnant. Your current website, built years ago using a free platform, looks outdated and doesn’t function well on mobile devices. You know you need a better website to attract more customers, but you've been putting it off due to lack of time and not knowing where to start. You get a call from a sales agent, from a company that specializes in affordable website redesigns for small businesses. The agent will try to sell you his services so engage with him as a prospect. You are a skeptical and curious prospect who will question the agent about how his services are better for your business. Remember You are the prospect and not the sales person""",
-                #
-                # Spanish
-                #
-                # "content": "Eres Chatbot, un amigable y útil robot. Tu objetivo es demostrar tus capacidades de una manera breve. Tus respuestas se convertiran a audio así que nunca no debes incluir caracteres especiales. Contesta a lo que el usuario pregunte de una manera creativa, útil y breve. Empieza por presentarte a ti mismo.",
-            },
+        log_observers = [recorder.observe]
+
+    pipeline = Pipeline(
+        [
+            transport.input(),
+            lifetime.probe(),
+            turn_metrics.probe(*log_observers),
+            *observer_processors,
+            context_aggregator.user(),
+            *budget_processors,
+            *gate_processors,
+            llm,
+            turn_metrics.probe(*log_observers),
+            *tts_processors,
+            turn_metrics.probe(*log_observers),
+            ta,
+            transport.output(),
+            context_aggregator.assistant(),
         ]
-
-        context = OpenAILLMContext(messages)
-        context_aggregator = llm.create_context_aggregator(context)
-
-        ta = TalkingAnimation()
-
-        pipeline = Pipeline(
-            [
-                transport.input(),
-                context_aggregator.user(),
-                llm,
-                tts,
-                ta,
-                transport.output(),
-                context_aggregator.assistant(),
-            ]
+    )
+
+    task = PipelineTask(pipeline, PipelineParams(allow_interruptions=True))
+    await task.queue_frame(quiet_frame)
+
+    # Everything that changes what the opener says or sounds like. The
+    # messages are copied because the context keeps appending to them.
+    opener_messages = list(messages)
+    opener_key = OpenerCache.key(opener_messages, llm_model, voice_id, params.model_dump())
+
+    async def generate_opener():
+        return await generate_cartesia_opener(
+            opener_messages,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            llm_model=llm_model,
+            cartesia_api_key=os.getenv("CARTESIA_API_KEY"),
+            voice_id=voice_id,
+            speed=params.speed,
+            emotion=params.emotion,
         )
 
-        task = PipelineTask(pipeline, PipelineParams(allow_interruptions=True))
-        await task.queue_frame(quiet_frame)
-
-        @transport.event_handler("on_first_participant_joined")
-        async def on_first_participant_joined(transport, participant):
-            transport.capture_participant_transcription(participant["id"])
+    @transport.event_handler("on_first_participant_joined")
+    async def on_first_participant_joined(transport, participant):
+        transport.capture_participant_transcription(participant["id"])
+
+        opener = opener_cache.get(opener_key) if OPENER_CACHE_ENABLED else None
+        if opener:
+            # Play the cached opener right away and record it as if the LLM
+            # had said it.
+            logger.debug(f"Playing cached opener: [{opener.text}]")
+            context.add_message({"role": "assistant", "content": opener.text})
+            if session_log:
+                recorder.record("opener", text=opener.text, cached=True)
+            await task.queue_frames(opener.frames())
+        else:
             await task.queue_frames([LLMMessagesFrame(messages)])
 
-        runner = PipelineRunner()
-
+        if OPENER_CACHE_ENABLED:
+            opener_cache.fill_in_background(opener_key, generate_opener)
+
+    @transport.event_handler("on_participant_left")
+    async def on_participant_left(transport, participant, reason):
+        await lifetime.end("participant_left")
+
+    @transport.event_handler("on_call_state_updated")
+    async def on_call_state_updated(transport, state):
+        if state == "left":
+            await lifetime.end("call_left")
+
+    # In a process of our own, signals end the session after the current turn
+    # instead of cancelling it (see SessionLifetime.end_on_signals())
+    own_process = runner is None
+    runner = runner or PipelineRunner(handle_sigint=False)
+
+    # Warms up the LLM connection while the transport joins
+    warmer = ServiceWarmer(llm, warm_up=SERVICE_WARMUP, keepalive_secs=SERVICE_KEEPALIVE_SECS)
+    warmer.start()
+    lifetime.start(task)
+    if own_process:
+        lifetime.end_on_signals(SESSION_DRAIN_SECS)
+    if queue_reporter:
+        queue_reporter.watch(room_url, pipeline)
+    try:
         await runner.run(task)
+    finally:
+        await warmer.stop()
+        await lifetime.stop()
+        if queue_reporter:
+            queue_reporter.unwatch(room_url)
+        if session_log:
+            await recorder.close(**lifetime.stats())
+
+    if tts_phrase_store:
+        logger.info(f"TTS cache: {tts_phrase_store.stats()}")
+    if CONTEXT_MAX_TOKENS:
+        logger.info(f"Context budget: {context_budget.stats()}")
+    if SPECULATIVE_LLM:
+        logger.info(f"Speculative LLM: {speculative.stats()}")
+    if TTS_CHUNKING:
+        logger.info(f"TTS chunking: {chunker.stats()}")
+    logger.info(f"Connections: {warmer.stats()}")
+    logger.info(f"Turn latency: {turn_metrics.stats()}")
+    if session_log:
+        logger.info(f"Session log: {recorder.stats()}")
+    logger.info(f"Session: {lifetime.stats()}")
+    return lifetime.stats()
+
+
+async def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-p", "--persona", type=str, choices=personas.names())
+    args, _ = parser.parse_known_args()
+
+    async with aiohttp.ClientSession() as session:
+        (room_url, token) = await configure(session)
+
+    session = await run_bot(room_url, token, persona=args.persona)
+    if session_log:
+        await session_log.stop()
+    # The process exits with the session
+    record_exit(session["reason"])
+
+
+async def worker():
+    # Load the VAD model before telling the server we are ready, so the only
+    # thing left to do once we get a room is to join it.
+    vad_analyzer = SileroVADAnalyzer()
+
+    job = await wait_for_job()
+    if not job:
+        return
+
+    session = await run_bot(
+        job["room_url"], job["token"], vad_analyzer=vad_analyzer, persona=job.get("persona")
+    )
+    if session_log:
+        await session_log.stop()
+    record_exit(session["reason"])
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--worker" in sys.argv:
+        asyncio.run(worker())
+    else:
+        asyncio.run(main())
@@ -1,12 +1,28 @@
 import os
+import tempfile
+import sys
 import argparse
-import subprocess
+import asyncio
+import aiohttp
+from contextlib import asynccontextmanager
+
+# All the processes on the host write their metrics to files in this
+# directory, see utils/metrics.py. prometheus_client reads it when it is
+# first imported, so it is set before anything else is.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "pipecat_chatbot_metrics")
+)
 
 from pipecat.transports.services.helpers.daily_rest import DailyRESTHelper, DailyRoomObject, DailyRoomProperties, DailyRoomParams
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+
+from utils.bot_registry import BotRegistry
+from utils.loop_monitor import LoopLagMonitor
+from utils.metrics import remove_stale_metrics, render_metrics
+from utils.personas import PersonaRegistry
 
 # Load API keys from env
 from dotenv import load_dotenv
@@ -23,14 +39,45 @@ REQUIRED_ENV_VARS = [
     'ELEVENLABS_API_KEY',
     'ELEVENLABS_VOICE_ID']
 
-daily_rest_helper = DailyRESTHelper(
-    os.getenv("DAILY_API_KEY", ""),
-    os.getenv("DAILY_API_URL", 'https://api.daily.co/v1'))
+BOT_MODULE = os.getenv("BOT_MODULE", "bot")
+
+# Seconds to wait for each Daily API call
+DAILY_TIMEOUT = float(os.getenv("DAILY_TIMEOUT", "10"))
+# On shutdown the bots get a SIGTERM and are killed if still running after this
+BOT_DRAIN_TIMEOUT = float(os.getenv("BOT_DRAIN_TIMEOUT", "45"))
+# Connections to the Daily API kept open and shared by all requests
+DAILY_MAX_CONNECTIONS = int(os.getenv("DAILY_MAX_CONNECTIONS", "100"))
+
+daily_helpers = {}
+
+# Personas the bot can be started with, {"persona": "<name>"} in the body
+personas = PersonaRegistry()
+
+bot_registry = BotRegistry()
+
+loop_monitor = LoopLagMonitor("bot_runner")
 
 
 # ----------------- API ----------------- #
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    remove_stale_metrics()
+    loop_monitor.start()
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=DAILY_MAX_CONNECTIONS),
+        timeout=aiohttp.ClientTimeout(total=DAILY_TIMEOUT),
+    ) as aiohttp_session:
+        daily_helpers["rest"] = DailyRESTHelper(
+            daily_api_key=os.getenv("DAILY_API_KEY", ""),
+            daily_api_url=os.getenv("DAILY_API_URL", 'https://api.daily.co/v1'),
+            aiohttp_session=aiohttp_session,
+        )
+        yield
+    await loop_monitor.stop()
+    await bot_registry.drain(BOT_DRAIN_TIMEOUT)
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -43,47 +90,77 @@ app.add_middleware(
 # ----------------- Main ----------------- #
 
 
+async def launch_bot(room_url: str, token: str, bot_args: list):
+    # Start a new subprocess, passing the room and token to the bot file.
+    # No shell, the arguments go to the bot as they are.
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", BOT_MODULE, "-u", room_url, "-t", token, *bot_args,
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    bot_registry.add(proc, room_url)
+
+
 @app.post("/start_bot")
 async def start_bot(request: Request) -> JSONResponse:
     try:
         # Grab any data included in the post request
         data = await request.json()
     except Exception as e:
-        pass
+        data = {}
+
+    persona = data.get("persona") if isinstance(data, dict) else None
+    if persona and persona not in personas:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown persona: {persona}, expected one of {', '.join(personas.names())}")
+    bot_args = ["-p", persona] if persona else []
+
+    daily_rest_helper = daily_helpers["rest"]
 
     # Create a new Daily WebRTC room for the session to take place in
     try:
         params = DailyRoomParams(
             properties=DailyRoomProperties()
         )
-        room: DailyRoomObject = daily_rest_helper.create_room(params=params)
+        room: DailyRoomObject = await asyncio.wait_for(
+            daily_rest_helper.create_room(params=params), DAILY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail="Timed out provisioning room")
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Unable to provision room {e}")
 
-    # Give the agent a token to join the session
-    token = daily_rest_helper.get_token(room.url, MAX_SESSION_TIME)
+    # Tokens for the agent and for the user to join the session, minted at
+    # the same time
+    try:
+        token, user_token = await asyncio.wait_for(
+            asyncio.gather(
+                daily_rest_helper.get_token(room.url, MAX_SESSION_TIME),
+                daily_rest_helper.get_token(room.url, MAX_SESSION_TIME),
+            ),
+            DAILY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504, detail=f"Timed out getting tokens for room: {room.url}")
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to get token for room: {room.url}: {e}")
 
-    # Return an error if we were unable to create a room or a token
-    if not room or not token:
+    # Return an error if we were unable to create a token
+    if not token or not user_token:
         raise HTTPException(
-            status_code=500, detail=f"Failed to get token for room: {room_url}")
+            status_code=500, detail=f"Failed to get token for room: {room.url}")
 
     try:
-        # Start a new subprocess, passing the room and token to the bot file
-        subprocess.Popen(
-            [f"python3 -m bot -u {room.url} -t {token}"],
-            shell=True,
-            bufsize=1,
-            cwd=os.path.dirname(os.path.abspath(__file__)))
+        # Shielded, so a client going away mid-spawn can't leave a bot the
+        # registry doesn't know about
+        await asyncio.shield(launch_bot(room.url, token, bot_args))
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to start subprocess: {e}")
 
-    # Grab a token for the user to join with
-    user_token = daily_rest_helper.get_token(room.url, MAX_SESSION_TIME)
-
     # Return the room url and user token back to the user
     return JSONResponse({
         "room_url": room.url,
@@ -91,6 +168,12 @@ async def start_bot(request: Request) -> JSONResponse:
     })
 
 
+@app.get("/metrics")
+def get_metrics():
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
+
 if __name__ == "__main__":
     # Check for required environment variables
     for env_var in REQUIRED_ENV_VARS:
@@ -119,4 +202,3 @@ if __name__ == "__main__":
 
     except KeyboardInterrupt:
         print("Pipecat runner shutting down...")
-
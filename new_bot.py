@@ -1,19 +1,41 @@
 import asyncio
 import aiohttp
 import os
+import tempfile
 import sys
 import argparse
 
+# All the processes on the host write their metrics to files in this
+# directory, see utils/metrics.py. prometheus_client reads it when it is
+# first imported, so it is set before anything else is.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "pipecat_chatbot_metrics")
+)
+
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineParams, PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
 from pipecat.processors.aggregators.llm_response import LLMAssistantResponseAggregator, LLMUserResponseAggregator
-from pipecat.frames.frames import LLMMessagesFrame, EndFrame
+from pipecat.frames.frames import LLMMessagesFrame
+from pipecat.services.ai_services import TTSService
 from pipecat.services.openai import OpenAILLMService
 from pipecat.services.elevenlabs import ElevenLabsTTSService
 from pipecat.transports.services.daily import DailyParams, DailyTransport
 from pipecat.vad.silero import SileroVADAnalyzer
 
+from utils.bot_pool import wait_for_job
+from utils.context_budget import ContextBudget, OpenAISummarizer
+from utils.personas import PersonaRegistry
+from utils.queue_depth import QueueDepthReporter
+from utils.session_lifetime import SessionLifetime
+from utils.session_log import SessionLog
+from utils.speculative_llm import SpeculativeLLM
+from utils.text_chunker import TTSTextChunker, stream_text_to
+from utils.tts_cache import PhraseAudioStore, TTSCache
+from utils.turn_metrics import TurnLatencyTracker
+from utils.warmup import PooledOpenAILLMService, ServiceWarmer
+
 from loguru import logger
 
 from dotenv import load_dotenv
@@ -25,10 +47,74 @@ logger.add(sys.stderr, level="DEBUG")
 daily_api_key = os.getenv("DAILY_API_KEY", "")
 daily_api_url = os.getenv("DAILY_API_URL", "https://api.daily.co/v1")
 
+# Who the bot is, unless the server asks for another persona (see personas/)
+personas = PersonaRegistry(default=os.getenv("BOT_PERSONA", "chatbot"))
+
+# Token budget of the LLM context, older turns get summarized (0 disables it)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "0"))
+
+# Start the LLM request on stable interim transcriptions, trading tokens
+# for time to first token
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0") == "1"
+SPECULATIVE_STABLE_SECS = float(os.getenv("SPECULATIVE_STABLE_SECS", "0.3"))
+
+# Send the LLM's text to the TTS in chunks: the first one at the first
+# clause, after TTS_FIRST_CHUNK_WORDS words or TTS_FIRST_CHUNK_SECS after the
+# first token, so a long first sentence doesn't hold back the first audio
+TTS_CHUNKING = os.getenv("TTS_CHUNKING", "0") == "1"
+TTS_FIRST_CHUNK_WORDS = int(os.getenv("TTS_FIRST_CHUNK_WORDS", "12"))
+TTS_FIRST_CHUNK_SECS = float(os.getenv("TTS_FIRST_CHUNK_SECS", "0.4"))
+
+# Open the LLM connection while joining the room and keep it from idling out
+SERVICE_WARMUP = os.getenv("SERVICE_WARMUP", "1") == "1"
+SERVICE_KEEPALIVE_SECS = float(os.getenv("SERVICE_KEEPALIVE_SECS", "30"))
+
+# On SIGTERM (the server draining its bots) or Ctrl-C, how long to wait for
+# the current turn to be over before ending the session anyway
+SESSION_DRAIN_SECS = float(os.getenv("SESSION_DRAIN_SECS", "20"))
+
+# Transcripts (what the user said, as text), turn boundaries and
+# interruptions of every session, written in the background to gzipped JSONL
+# segments (see benchmarks/replay_session.py). Off unless asked for, nothing
+# deletes the segments.
+session_log = None
+if os.getenv("SESSION_LOG", "0") == "1":
+    session_log = SessionLog(
+        os.getenv("SESSION_LOG_DIR", os.path.join(os.path.dirname(__file__), "logs", "sessions")),
+        max_segment_bytes=int(os.getenv("SESSION_LOG_SEGMENT_MB", "16")) * 1024 * 1024,
+        max_segment_secs=float(os.getenv("SESSION_LOG_SEGMENT_SECS", "600")),
+    )
+
+# How many frames wait in the pipeline's queues, for the server's telemetry
+queue_reporter = QueueDepthReporter() if os.getenv("BOT_TELEMETRY", "0") == "1" else None
+
+# Audio of short phrases the bot says often, shared by all bot processes
+tts_phrase_store = None
+if os.getenv("TTS_CACHE", "0") == "1":
+    tts_phrase_store = PhraseAudioStore(
+        os.getenv("TTS_CACHE_PATH", os.path.join(os.path.dirname(__file__), "cache", "tts_phrases.cache")),
+        max_bytes=int(os.getenv("TTS_CACHE_MB", "64")) * 1024 * 1024,
+    )
+
+
+async def run_bot(
+    room_url: str,
+    token: str,
+    vad_analyzer: SileroVADAnalyzer | None = None,
+    runner: PipelineRunner | None = None,
+    *,
+    transport_class=DailyTransport,
+    llm: OpenAILLMService | None = None,
+    tts: TTSService | None = None,
+    persona: str | None = None,
+):
+    persona = personas.get(persona)
+    logger.info(f"Persona: {persona.name} (prompt prefix {persona.prefix_hash})")
 
-async def main(room_url: str, token: str):
     async with aiohttp.ClientSession() as session:
-        transport = DailyTransport(
+        # The transport and the services can be swapped for local stand-ins,
+        # see benchmarks/bench_pipeline.py.
+        transport = transport_class(
             room_url,
             token,
             "Chatbot",
@@ -39,36 +125,88 @@ async def main(room_url: str, token: str):
                 audio_out_enabled=True,
                 camera_out_enabled=False,
                 vad_enabled=True,
-                vad_analyzer=SileroVADAnalyzer(),
+                vad_analyzer=vad_analyzer or SileroVADAnalyzer(),
                 transcription_enabled=True,
             )
         )
 
-        tts = ElevenLabsTTSService(
+        tts = tts or ElevenLabsTTSService(
             aiohttp_session=session,
             api_key=os.getenv("ELEVENLABS_API_KEY", ""),
-            voice_id=os.getenv("ELEVENLABS_VOICE_ID", ""),
+            voice_id=persona.voice_id or os.getenv("ELEVENLABS_VOICE_ID", ""),
         )
 
-        llm = OpenAILLMService(
+        llm = llm or PooledOpenAILLMService(
             api_key=os.getenv("OPENAI_API_KEY"),
             model="gpt-4o")
 
-        messages = [
-            {
-                "role": "system",
-                "content": "You are Chatbot, a friendly, helpful robot. Your output will be converted to audio so don't include special characters other than '!' or '?' in your answers. Respond to what the user said in a creative and helpful way, but keep your responses brief. Start by saying hello.",
-            },
-        ]
+        # The persona's prompt first, the same bytes in every session, so the
+        # LLM provider can reuse its cached prefix
+        messages = persona.messages()
 
         tma_in = LLMUserResponseAggregator(messages)
         tma_out = LLMAssistantResponseAggregator(messages)
 
+        # Where each turn's time goes, exported to the server's /metrics
+        turn_metrics = TurnLatencyTracker()
+
+        # Keeps the prompt (and so the time to first token) from growing for
+        # the whole call
+        budget_processors = []
+        if CONTEXT_MAX_TOKENS:
+            context_budget = ContextBudget(
+                OpenAISummarizer(api_key=os.getenv("OPENAI_API_KEY")),
+                max_tokens=CONTEXT_MAX_TOKENS,
+            )
+            budget_processors = [context_budget]
+
+        observer_processors = []
+        gate_processors = []
+        if SPECULATIVE_LLM:
+            speculative = SpeculativeLLM(
+                llm,
+                OpenAILLMContext(messages),
+                persona=persona.name,
+                stable_secs=SPECULATIVE_STABLE_SECS,
+            )
+            observer_processors = [speculative.observer()]
+            gate_processors = [speculative.gate()]
+
+        tts_processors = [tts]
+        if TTS_CHUNKING:
+            stream_text_to(tts)
+            chunker = TTSTextChunker(
+                first_max_words=TTS_FIRST_CHUNK_WORDS, first_max_secs=TTS_FIRST_CHUNK_SECS
+            )
+            tts_processors = [chunker, tts]
+        if tts_phrase_store:
+            tts_cache = TTSCache(tts_phrase_store, tts)
+            tts_processors = [tts_cache.input(), *tts_processors, tts_cache.output()]
+
+        # Sees the frames through the turn metrics' probes
+        log_observers = []
+        if session_log:
+            recorder = session_log.recorder(
+                room_url=room_url, bot="new_bot", persona=persona.name, prefix_hash=persona.prefix_hash
+            )
+            log_observers = [recorder.observe]
+
+        # Ends the session when the participant leaves, or after the current
+        # turn when the process is asked to stop
+        lifetime = SessionLifetime(idle_secs=0, max_duration_secs=0)
+
         pipeline = Pipeline([
             transport.input(),
+            lifetime.probe(),
+            turn_metrics.probe(*log_observers),
+            *observer_processors,
             tma_in,
+            *budget_processors,
+            *gate_processors,
             llm,
-            tts,
+            turn_metrics.probe(*log_observers),
+            *tts_processors,
+            turn_metrics.probe(*log_observers),
             transport.output(),
             tma_out,
         ])
@@ -82,23 +220,77 @@ async def main(room_url: str, token: str):
 
         @transport.event_handler("on_participant_left")
         async def on_participant_left(transport, participant, reason):
-            await task.queue_frame(EndFrame())
+            await lifetime.end("participant_left")
 
         @transport.event_handler("on_call_state_updated")
         async def on_call_state_updated(transport, state):
             if state == "left":
-                await task.queue_frame(EndFrame())
+                await lifetime.end("call_left")
 
-        runner = PipelineRunner()
+        # In a process of our own, signals end the session after the current
+        # turn instead of cancelling it (see SessionLifetime.end_on_signals())
+        own_process = runner is None
+        runner = runner or PipelineRunner(handle_sigint=False)
 
-        await runner.run(task)
+        # Warms up the LLM connection while the transport joins
+        warmer = ServiceWarmer(llm, warm_up=SERVICE_WARMUP, keepalive_secs=SERVICE_KEEPALIVE_SECS)
+        warmer.start()
+        lifetime.start(task)
+        if own_process:
+            lifetime.end_on_signals(SESSION_DRAIN_SECS)
+        if queue_reporter:
+            queue_reporter.watch(room_url, pipeline)
+        try:
+            await runner.run(task)
+        finally:
+            await warmer.stop()
+            await lifetime.stop()
+            if queue_reporter:
+                queue_reporter.unwatch(room_url)
+            if session_log:
+                await recorder.close()
 
+        if tts_phrase_store:
+            logger.info(f"TTS cache: {tts_phrase_store.stats()}")
+        if CONTEXT_MAX_TOKENS:
+            logger.info(f"Context budget: {context_budget.stats()}")
+        if SPECULATIVE_LLM:
+            logger.info(f"Speculative LLM: {speculative.stats()}")
+        if TTS_CHUNKING:
+            logger.info(f"TTS chunking: {chunker.stats()}")
+        logger.info(f"Connections: {warmer.stats()}")
+        logger.info(f"Turn latency: {turn_metrics.stats()}")
+        if session_log:
+            logger.info(f"Session log: {recorder.stats()}")
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Pipecat Bot")
-    parser.add_argument("-u", type=str, help="Room URL")
-    parser.add_argument("-t", type=str, help="Token")
-    config = parser.parse_args()
 
-    asyncio.run(main(config.u, config.t))
+async def main(room_url: str, token: str, persona: str | None = None):
+    await run_bot(room_url, token, persona=persona)
+    if session_log:
+        await session_log.stop()
+
+
+async def worker():
+    # For the server's warm pool, see bot.py
+    vad_analyzer = SileroVADAnalyzer()
+
+    job = await wait_for_job()
+    if not job:
+        return
+
+    await run_bot(job["room_url"], job["token"], vad_analyzer=vad_analyzer, persona=job.get("persona"))
+    if session_log:
+        await session_log.stop()
+
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv:
+        asyncio.run(worker())
+    else:
+        parser = argparse.ArgumentParser(description="Pipecat Bot")
+        parser.add_argument("-u", type=str, help="Room URL")
+        parser.add_argument("-t", type=str, help="Token")
+        parser.add_argument("-p", "--persona", type=str, choices=personas.names(), help="Persona")
+        config = parser.parse_args()
 
+        asyncio.run(main(config.u, config.t, persona=config.persona))
@@ -1,16 +1,37 @@
 import aiohttp
 import os
+import tempfile
 import argparse
-import subprocess
 import logging
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
 
+# All the processes on the host write their metrics to files in this
+# directory, see utils/metrics.py. prometheus_client reads it when it is
+# first imported, so it is set before anything else is.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "pipecat_chatbot_metrics")
+)
+
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+
+from pipecat.transports.services.helpers.daily_rest import (
+    DailyRESTHelper,
+    DailyRoomParams,
+    DailyRoomProperties,
+)
 
-from pipecat.transports.services.helpers.daily_rest import DailyRESTHelper, DailyRoomParams
+from utils.admission import AdmissionController, AdmissionRejected, HostHeadroom
+from utils.bot_pool import BotWorkerPool
+from utils.bot_registry import BotRegistry, in_container
+from utils.bot_telemetry import BotTelemetry
+from utils.fleet import FleetUnavailable, LaunchOutcomeUnknown, WorkerFleet
+from utils.loop_monitor import LoopLagMonitor
+from utils.metrics import METRICS_DIR, remove_stale_metrics, render_metrics
+from utils.personas import PersonaRegistry
+from utils.room_pool import RoomPool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,32 +46,166 @@ if not DAILY_API_KEY:
     raise ValueError("DAILY_API_KEY environment variable is not set")
 
 # Configure Daily.co API URL
-DAILY_API_URL = "https://api.daily.co/v1"
+DAILY_API_URL = os.getenv("DAILY_API_URL", "https://api.daily.co/v1")
 
 MAX_BOTS_PER_ROOM = 1
 
-# Bot sub-process dict for status reporting and concurrency control
-bot_procs = {}
+# Number of bot processes kept warm, waiting for a room
+BOT_POOL_SIZE = int(os.getenv("BOT_POOL_SIZE", "2"))
+BOT_MODULE = os.getenv("BOT_MODULE", "bot")
+
+# Where bots run: "local" children of this server, or "fleet" to dispatch
+# them to the worker agents (worker_agent.py) that registered with us
+BOT_DISPATCH = os.getenv("BOT_DISPATCH", "local")
+# "least-loaded" or "hash" (consistent hashing of the room URL)
+FLEET_PLACEMENT = os.getenv("FLEET_PLACEMENT", "least-loaded")
+FLEET_HEARTBEAT_TIMEOUT = float(os.getenv("FLEET_HEARTBEAT_TIMEOUT", "15"))
+# Shared by the server and its workers. Without it anyone who can reach
+# them could register as a worker and get the rooms' bot tokens, or start
+# bots, so fleet dispatch needs it unless FLEET_INSECURE=1
+FLEET_SECRET = os.getenv("FLEET_SECRET")
+FLEET_INSECURE = os.getenv("FLEET_INSECURE", "0") == "1"
+
+# Rooms (with bot and user tokens) created ahead of time
+ROOM_POOL_LOW = int(os.getenv("ROOM_POOL_LOW", "2"))
+ROOM_POOL_HIGH = int(os.getenv("ROOM_POOL_HIGH", "5"))
+ROOM_POOL_CONCURRENCY = int(os.getenv("ROOM_POOL_CONCURRENCY", "2"))
+# How long rooms and tokens are valid for, and the minimum time left for a
+# pooled room to still be handed out
+ROOM_LIFETIME = float(os.getenv("ROOM_LIFETIME", str(60 * 60)))
+ROOM_MIN_REMAINING = float(os.getenv("ROOM_MIN_REMAINING", str(15 * 60)))
+
+# Admission control: maximum number of bots running at once, how many
+# requests may wait for a free slot and for how long, and the host headroom
+# required to launch another bot
+MAX_BOTS = int(os.getenv("MAX_BOTS", "20"))
+BOT_QUEUE_SIZE = int(os.getenv("BOT_QUEUE_SIZE", "10"))
+BOT_QUEUE_TIMEOUT = float(os.getenv("BOT_QUEUE_TIMEOUT", "10"))
+MIN_MEM_AVAILABLE_MB = int(os.getenv("MIN_MEM_AVAILABLE_MB", "1024"))
+MAX_LOAD_PER_CPU = float(os.getenv("MAX_LOAD_PER_CPU", "2.0"))
+
+# Personas a session can ask for with /?persona=<name>, checked here so an
+# unknown one is refused before using up a room. Without one, the bot
+# module uses its own default.
+personas = PersonaRegistry()
+
+# Finished bots remembered for status reporting
+BOT_HISTORY_SIZE = int(os.getenv("BOT_HISTORY_SIZE", "1000"))
+
+# On shutdown, "drain" the bots (they finish their turn and end their
+# session, all at once, killed after BOT_DRAIN_TIMEOUT seconds) or "detach"
+# from them, left running for the next server to adopt from BOT_STATE_DIR
+BOT_SHUTDOWN = os.getenv("BOT_SHUTDOWN", "drain")
+BOT_DRAIN_TIMEOUT = float(os.getenv("BOT_DRAIN_TIMEOUT", "45"))
+BOT_STATE_DIR = os.getenv("BOT_STATE_DIR", os.path.join(METRICS_DIR, "bots", "server"))
+# Detached bots write their logs here, they outlive the server's stderr
+BOT_LOG_FILE = os.getenv("BOT_LOG_FILE", os.path.join(os.path.dirname(__file__), "logs", "bots.log"))
+if BOT_SHUTDOWN == "detach" and in_container():
+    logger.warning("BOT_SHUTDOWN=detach doesn't work in a container, the bots stop with it. Draining them instead")
+    BOT_SHUTDOWN = "drain"
+
+# Whether the CPU, memory, threads, file descriptors and pipeline queue
+# depth of every bot are sampled (the bots inherit it and report their
+# queues), how often, and how many bots at most per sample
+BOT_TELEMETRY = os.getenv("BOT_TELEMETRY", "0") == "1"
+BOT_TELEMETRY_SECS = float(os.getenv("BOT_TELEMETRY_SECS", "1"))
+BOT_TELEMETRY_MAX_PER_TICK = int(os.getenv("BOT_TELEMETRY_MAX_PER_TICK", "256"))
+
+# Bot sub-process registry for status reporting and concurrency control
+admission = AdmissionController(
+    max_bots=MAX_BOTS,
+    max_queue=BOT_QUEUE_SIZE,
+    queue_timeout=BOT_QUEUE_TIMEOUT,
+    headroom=HostHeadroom(
+        min_mem_available_mb=MIN_MEM_AVAILABLE_MB,
+        max_load_per_cpu=MAX_LOAD_PER_CPU,
+    ),
+)
+
+bot_registry = BotRegistry(
+    history_size=BOT_HISTORY_SIZE,
+    on_exit=lambda record: admission.release(),
+    state_dir=BOT_STATE_DIR,
+)
 
 daily_helpers = {}
 
-def cleanup():
+room_pools = {}
+
+fleets = {}
+
+bot_pool = BotWorkerPool(
+    module=BOT_MODULE,
+    size=BOT_POOL_SIZE,
+    cwd=os.path.dirname(os.path.abspath(__file__)),
+    log_path=BOT_LOG_FILE if BOT_SHUTDOWN == "detach" else None,
+)
+
+bot_telemetry = BotTelemetry(
+    bot_registry,
+    interval=BOT_TELEMETRY_SECS,
+    max_per_tick=BOT_TELEMETRY_MAX_PER_TICK,
+)
+
+loop_monitor = LoopLagMonitor("server")
+
+def room_params(exp: float) -> DailyRoomParams:
+    return DailyRoomParams(
+        privacy="public",  # Make room public
+        max_participants=10,  # Set max participants
+        enable_chat=True,    # Enable chat
+        properties=DailyRoomProperties(exp=exp),
+    )
+
+async def cleanup():
     # Clean up function, just to be extra safe
-    for entry in bot_procs.values():
-        proc = entry[0]
-        proc.terminate()
-        proc.wait()
+    admission.close()
+    await loop_monitor.stop()
+    await bot_telemetry.stop()
+    await room_pools["rooms"].stop()
+    await bot_pool.stop()
+    if BOT_SHUTDOWN == "detach":
+        bot_registry.detach()
+    else:
+        await bot_registry.drain(BOT_DRAIN_TIMEOUT)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if BOT_DISPATCH == "fleet" and not FLEET_SECRET and not FLEET_INSECURE:
+        raise ValueError("FLEET_SECRET environment variable is not set, BOT_DISPATCH=fleet needs it")
+    remove_stale_metrics()
+    # Bots a previous server left running keep their slots
+    for _ in bot_registry.adopt():
+        admission.occupy()
+    loop_monitor.start()
+    if BOT_TELEMETRY:
+        bot_telemetry.start()
     async with aiohttp.ClientSession() as aiohttp_session:
         daily_helpers["rest"] = DailyRESTHelper(
             daily_api_key=DAILY_API_KEY,
             daily_api_url=DAILY_API_URL,
             aiohttp_session=aiohttp_session,
         )
+        room_pools["rooms"] = RoomPool(
+            daily_helpers["rest"],
+            room_params,
+            low_watermark=ROOM_POOL_LOW,
+            high_watermark=ROOM_POOL_HIGH,
+            lifetime=ROOM_LIFETIME,
+            min_remaining=ROOM_MIN_REMAINING,
+            max_concurrency=ROOM_POOL_CONCURRENCY,
+        )
+        await room_pools["rooms"].start()
+        fleets["workers"] = WorkerFleet(
+            aiohttp_session,
+            placement=FLEET_PLACEMENT,
+            heartbeat_timeout=FLEET_HEARTBEAT_TIMEOUT,
+            secret=FLEET_SECRET,
+        )
+        if BOT_DISPATCH == "local":
+            await bot_pool.start()
         yield
-        cleanup()
+        await cleanup()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -62,55 +217,109 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.get("/")
-async def start_agent(request: Request):
-    try:
-        logger.info("Creating new Daily.co room")
-        
-        # Configure room parameters
-        room_params = DailyRoomParams(
-            privacy="public",  # Make room public
-            max_participants=10,  # Set max participants
-            enable_chat=True,    # Enable chat
+def release_room(room, count_in_room):
+    # Rooms no bot of ours was started in go back to the pool, with their tokens
+    if room and not count_in_room(room.url):
+        room_pools["rooms"].release(room)
+
+async def start_fleet_agent(**extra):
+    fleet = fleets["workers"]
+    if not fleet.healthy():
+        return JSONResponse(
+            {"detail": "No bot workers available"},
+            status_code=503,
+            headers={"Retry-After": "5"},
         )
-        
-        # Create the room
-        room = await daily_helpers["rest"].create_room(room_params)
-        logger.info(f"Room created successfully: {room.url}")
 
-        if not room.url:
+    room = None
+    try:
+        room = await room_pools["rooms"].acquire()
+        logger.info(f"Got room: {room.url}")
+
+        # Check bot limits
+        if fleet.count_in_room(room.url) >= MAX_BOTS_PER_ROOM:
             raise HTTPException(
-                status_code=500,
-                detail="Failed to get room URL from Daily.co API",
+                status_code=409,
+                detail=f"Max bot limit reached for room: {room.url}"
             )
 
-        # Check bot limits
-        num_bots_in_room = sum(
-            1 for proc in bot_procs.values() if proc[1] == room.url and proc[0].poll() is None
+        worker_id, pid = await fleet.launch(room.url, room.bot_token, **extra)
+        logger.info(f"Bot started on worker {worker_id} with PID: {pid}")
+
+        return RedirectResponse(room.user_url, headers={"X-Bot-Id": f"{worker_id}:{pid}"})
+
+    except LaunchOutcomeUnknown as e:
+        # A bot may be in the room, so it isn't handed out again
+        logger.error(f"Error in start_agent: {str(e)}")
+        return JSONResponse(
+            {"detail": str(e)},
+            status_code=503,
+            headers={"Retry-After": "5"},
         )
-        if num_bots_in_room >= MAX_BOTS_PER_ROOM:
+    except FleetUnavailable as e:
+        logger.error(f"Error in start_agent: {str(e)}")
+        release_room(room, fleet.count_in_room)
+        return JSONResponse(
+            {"detail": str(e)},
+            status_code=503,
+            headers={"Retry-After": "5"},
+        )
+    except HTTPException:
+        release_room(room, fleet.count_in_room)
+        raise
+    except Exception as e:
+        logger.error(f"Error in start_agent: {str(e)}")
+        release_room(room, fleet.count_in_room)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to start bot: {str(e)}" if room else f"Failed to create room: {str(e)}"
+        )
+
+@app.get("/")
+async def start_agent(request: Request):
+    # Handed to the bot with the room
+    extra = {}
+    persona = request.query_params.get("persona")
+    if persona:
+        if persona not in personas:
             raise HTTPException(
-                status_code=500,
-                detail=f"Max bot limit reached for room: {room.url}"
+                status_code=400,
+                detail=f"Unknown persona: {persona}, expected one of {', '.join(personas.names())}"
             )
+        extra["persona"] = persona
+
+    if BOT_DISPATCH == "fleet":
+        return await start_fleet_agent(**extra)
+
+    # Reject early when we are over capacity, before using up a room
+    try:
+        await admission.acquire()
+    except AdmissionRejected as e:
+        logger.warning(f"Rejecting bot launch: {e}")
+        return JSONResponse(
+            {"detail": str(e)},
+            status_code=e.status_code,
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
-        # Get the token for the room
-        token = await daily_helpers["rest"].get_token(room.url)
-        if not token:
+    room = None
+    try:
+        # Take a room from the pool, it is only created now if the pool is empty
+        room = await room_pools["rooms"].acquire()
+        logger.info(f"Got room: {room.url}")
+
+        # Check bot limits
+        num_bots_in_room = bot_registry.count_in_room(room.url)
+        if num_bots_in_room >= MAX_BOTS_PER_ROOM:
             raise HTTPException(
-                status_code=500,
-                detail=f"Failed to get token for room: {room.url}"
+                status_code=409,
+                detail=f"Max bot limit reached for room: {room.url}"
             )
 
-        # Start the bot process
+        # Hand the room to a bot process, warm if we have one
         try:
-            proc = subprocess.Popen(
-                [f"python3 -m bot -u {room.url} -t {token}"],
-                shell=True,
-                bufsize=1,
-                cwd=os.path.dirname(os.path.abspath(__file__)),
-            )
-            bot_procs[proc.pid] = (proc, room.url)
+            proc = await bot_pool.launch(room.url, room.bot_token, **extra)
+            bot_registry.add(proc, room.url)
             logger.info(f"Bot process started with PID: {proc.pid}")
         except Exception as e:
             logger.error(f"Failed to start bot process: {e}")
@@ -119,26 +328,114 @@ async def start_agent(request: Request):
                 detail=f"Failed to start bot process: {str(e)}"
             )
 
-        return RedirectResponse(room.url)
+        # The id to ask /status/{bot_id} about
+        return RedirectResponse(room.user_url, headers={"X-Bot-Id": str(proc.pid)})
 
     except Exception as e:
+        # The bot never started, so its slot and its room are still ours to
+        # give back
+        admission.release()
+        release_room(room, bot_registry.count_in_room)
         logger.error(f"Error in start_agent: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(
             status_code=500,
             detail=f"Failed to create room: {str(e)}"
         )
 
-@app.get("/status/{pid}")
-def get_status(pid: int):
-    proc = bot_procs.get(pid)
-    if not proc:
+@app.get("/status/{bot_id}")
+async def get_status(bot_id: str):
+    # Bots running on a worker agent are identified as "<worker id>:<pid>"
+    worker_id, _, pid = bot_id.rpartition(":")
+    if not pid.isdigit():
+        raise HTTPException(status_code=404, detail=f"Bot with id: {bot_id} not found")
+
+    if worker_id:
+        try:
+            status = await fleets["workers"].status(worker_id, int(pid))
+        except Exception as e:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Unable to get status from worker {worker_id}: {str(e)}"
+            )
+        if not status:
+            raise HTTPException(status_code=404, detail=f"Bot with id: {bot_id} not found")
+        return JSONResponse({"bot_id": bot_id, "status": status["status"]})
+
+    record = bot_registry.get(int(pid))
+    if not record:
         raise HTTPException(
             status_code=404,
             detail=f"Bot with process id: {pid} not found"
         )
 
-    status = "running" if proc[0].poll() is None else "finished"
-    return JSONResponse({"bot_id": pid, "status": status})
+    return JSONResponse(
+        {"bot_id": int(pid), "status": record.status, "telemetry": bot_telemetry.get(int(pid))}
+    )
+
+@app.get("/bots/telemetry")
+def get_bots_telemetry():
+    # CPU, memory, threads, FDs and queue depth of every bot, as of the last sample
+    if not BOT_TELEMETRY:
+        raise HTTPException(status_code=404, detail="Bot telemetry is off, set BOT_TELEMETRY=1")
+    return Response(content=bot_telemetry.snapshot_json, media_type="application/json")
+
+@app.get("/bots/telemetry/stream")
+async def stream_bots_telemetry():
+    # The same, as Server-Sent Events, every time the bots are sampled
+    if not BOT_TELEMETRY:
+        raise HTTPException(status_code=404, detail="Bot telemetry is off, set BOT_TELEMETRY=1")
+    async def events():
+        async for data in bot_telemetry.updates():
+            yield b"data: " + data + b"\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/workers/heartbeat")
+async def worker_heartbeat(request: Request):
+    if BOT_DISPATCH != "fleet":
+        raise HTTPException(status_code=404, detail="This server doesn't dispatch bots to workers")
+    fleet = fleets["workers"]
+    if not fleet.check_secret(request.headers.get("Authorization")):
+        raise HTTPException(status_code=401, detail="Invalid fleet secret")
+
+    data = await request.json()
+    try:
+        worker_id, url = str(data["worker_id"]), data["url"]
+        capacity, running = int(data["capacity"]), int(data["running"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid heartbeat: {e!r}")
+    if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail=f"Invalid worker URL: {url!r}")
+
+    fleet.heartbeat(worker_id, url, capacity, running)
+    return JSONResponse({"status": "ok"})
+
+@app.get("/stats")
+def get_stats():
+    return JSONResponse(
+        {
+            "admission": admission.stats(),
+            "bots": bot_registry.stats(),
+            "fleet": fleets["workers"].stats(),
+            "loop": loop_monitor.stats(),
+            "personas": personas.stats(),
+            "pool": bot_pool.stats(),
+            "rooms": room_pools["rooms"].stats(),
+            "telemetry": bot_telemetry.stats(),
+        }
+    )
+
+@app.get("/metrics")
+def get_metrics():
+    # Turn latency histograms of every bot process started from this host
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
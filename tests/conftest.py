@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The modules are imported from the root of the repository, and write their
+# metrics to a directory of the test run
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp())
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from utils.admission import AdmissionController, AdmissionRejected
+
+
+class FakeHeadroom:
+    """HostHeadroom without /proc, out of headroom when `reason` is set."""
+
+    def __init__(self):
+        self.reason = None
+
+    def check(self):
+        return self.reason
+
+    def stats(self) -> dict:
+        return {}
+
+
+@pytest.mark.asyncio
+async def test_queued_request_is_admitted_on_release():
+    admission = AdmissionController(max_bots=1, max_queue=1, queue_timeout=5, headroom=FakeHeadroom())
+    await admission.acquire()
+
+    queued = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+    assert admission.stats()["queue_depth"] == 1
+
+    admission.release()
+    await queued
+    stats = admission.stats()
+    assert stats["active"] == 1
+    assert stats["admitted"] == 2
+    assert stats["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_timeout_are_rejected():
+    admission = AdmissionController(max_bots=1, max_queue=1, queue_timeout=0.05, headroom=FakeHeadroom())
+    await admission.acquire()
+
+    queued = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire()
+    assert rejected.value.status_code == 429
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await queued
+    assert rejected.value.status_code == 503
+    stats = admission.stats()
+    assert stats["rejected_queue_full"] == 1
+    assert stats["rejected_timeout"] == 1
+    assert stats["active"] == 1
+
+
+@pytest.mark.asyncio
+async def test_no_headroom_rejects_and_holds_the_queue():
+    headroom = FakeHeadroom()
+    admission = AdmissionController(max_bots=1, max_queue=1, queue_timeout=5, headroom=headroom)
+    headroom.reason = "low memory"
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire()
+    assert rejected.value.status_code == 503
+
+    headroom.reason = None
+    await admission.acquire()
+    queued = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+    # A slot frees up, but the host is still short, so the request stays queued
+    headroom.reason = "high load"
+    admission.release()
+    await asyncio.sleep(0)
+    assert not queued.done()
+    assert admission.stats()["active"] == 0
+
+    headroom.reason = None
+    admission.release()
+    await queued
+    assert admission.stats()["active"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_gives_its_slot_back():
+    admission = AdmissionController(max_bots=1, max_queue=1, queue_timeout=5, headroom=FakeHeadroom())
+    await admission.acquire()
+    queued = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    assert admission.stats()["queue_depth"] == 0
+
+    admission.release()
+    assert admission.stats()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_close_rejects_queued_and_new_requests():
+    admission = AdmissionController(max_bots=1, max_queue=1, queue_timeout=5, headroom=FakeHeadroom())
+    await admission.acquire()
+    queued = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+
+    admission.close()
+    with pytest.raises(AdmissionRejected):
+        await queued
+    with pytest.raises(AdmissionRejected):
+        await admission.acquire()
+    assert admission.stats()["rejected_closed"] == 2
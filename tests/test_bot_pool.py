@@ -0,0 +1,54 @@
+import asyncio
+import os
+
+import pytest
+
+from utils.bot_pool import BotWorkerPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def stub_bot_env(monkeypatch):
+    monkeypatch.setenv("STUB_BOT_SECS", "0.1")
+    monkeypatch.setenv("PYTHONPATH", ROOT)
+
+
+async def wait_idle(pool: BotWorkerPool, count: int):
+    for _ in range(200):
+        if pool.stats()["idle"] >= count:
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"pool never got {count} idle workers: {pool.stats()}")
+
+
+@pytest.mark.asyncio
+async def test_launch_keeps_no_pipes_to_the_bot():
+    pool = BotWorkerPool(module="benchmarks.stub_bot", size=1, cwd=ROOT)
+    await pool.start()
+    await wait_idle(pool, 1)
+
+    proc = await pool.launch("https://fake.daily.co/room", "token")
+    assert proc.stdin.closed
+    assert proc.stdout.closed
+    assert await asyncio.get_running_loop().run_in_executor(None, proc.wait) == 0
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_dead_idle_workers_are_reaped():
+    pool = BotWorkerPool(module="benchmarks.stub_bot", size=1, cwd=ROOT)
+    await pool.start()
+    await wait_idle(pool, 1)
+    dead = pool._idle[0]
+    dead.kill()
+    await asyncio.get_running_loop().run_in_executor(None, os.waitid, os.P_PID, dead.pid, os.WEXITED | os.WNOWAIT)
+
+    # Anything that wakes the refill loop up
+    pool._refill_event.set()
+    await asyncio.sleep(0.1)
+    assert dead not in pool._idle
+    assert dead.returncode is not None
+    assert dead.stdout.closed
+    await wait_idle(pool, 1)
+    await pool.stop()
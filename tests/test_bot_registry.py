@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils.bot_registry import BotRegistry, process_start_ticks
+
+
+def sleeper(secs: float = 60) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", f"import time; time.sleep({secs})"])
+
+
+@pytest.mark.asyncio
+async def test_detached_bots_are_adopted(tmp_path):
+    registry = BotRegistry(state_dir=str(tmp_path))
+    proc = sleeper()
+    registry.add(proc, "https://fake.daily.co/room")
+    registry.detach()
+
+    adopter = BotRegistry(state_dir=str(tmp_path))
+    adopted = adopter.adopt()
+
+    assert [record.pid for record in adopted] == [proc.pid]
+    assert adopter.count_in_room("https://fake.daily.co/room") == 1
+    result = await adopter.drain(5)
+    assert result["bots"] == 1
+    assert len(adopter) == 0
+    assert not os.listdir(tmp_path)
+    proc.wait()
+
+
+@pytest.mark.asyncio
+async def test_reused_pid_is_not_adopted(tmp_path):
+    # A state file whose PID now belongs to another process, started later
+    proc = sleeper()
+    state = {
+        "pid": proc.pid,
+        "room_url": "https://fake.daily.co/room",
+        "started_at": 0,
+        "start_ticks": process_start_ticks(proc.pid) - 1,
+    }
+    with open(tmp_path / f"{proc.pid}.json", "w") as f:
+        json.dump(state, f)
+
+    registry = BotRegistry(state_dir=str(tmp_path))
+
+    assert registry.adopt() == []
+    assert len(registry) == 0
+    assert not os.listdir(tmp_path)
+    # And it is left alone
+    assert proc.poll() is None
+    proc.kill()
+    proc.wait()
+
+
+@pytest.mark.asyncio
+async def test_drain_kills_bots_that_ignore_sigterm(tmp_path):
+    registry = BotRegistry()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print(flush=True); time.sleep(60)"],
+        stdout=subprocess.PIPE,
+    )
+    # Wait for the SIGTERM handler to be in place
+    proc.stdout.readline()
+    record = registry.add(proc, "https://fake.daily.co/room")
+
+    result = await registry.drain(0.5)
+
+    assert result == {"bots": 1, "killed": 1, "secs": result["secs"]}
+    assert not record.running
+    assert registry.stats()["killed"] == 1
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from pipecat.frames.frames import EndFrame
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+
+from utils.context_budget import SUMMARY_PREFIX, ContextBudget, message_tokens
+
+PERSONA = {"role": "system", "content": "You are a bakery owner."}
+
+
+def turn(i: int) -> list:
+    return [
+        {"role": "user", "content": f"Question number {i} about the website, " + "bread " * 40},
+        {"role": "assistant", "content": f"Answer number {i}, " + "cake " * 40},
+    ]
+
+
+class Summarizer:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, previous_summary, messages):
+        self.calls.append(messages)
+        if self.latency is None:
+            await self.release.wait()
+        else:
+            await asyncio.sleep(self.latency)
+        return f"{len(messages)} messages"
+
+
+async def run_turns(budget: ContextBudget, turns: int, pause: float = 0.05) -> OpenAILLMContext:
+    context = OpenAILLMContext([dict(PERSONA)])
+    task = PipelineTask(Pipeline([budget]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+    for i in range(turns):
+        for message in turn(i):
+            context.add_message(message)
+        await task.queue_frame(OpenAILLMContextFrame(context))
+        await asyncio.sleep(pause)
+    await task.queue_frame(EndFrame())
+    await runner
+    return context
+
+
+@pytest.mark.asyncio
+async def test_old_turns_are_replaced_by_a_summary():
+    summarize = Summarizer()
+    budget = ContextBudget(summarize, max_tokens=400)
+
+    context = await run_turns(budget, 10)
+
+    messages = context.messages
+    assert messages[0] == PERSONA
+    assert messages[1]["role"] == "system"
+    assert messages[1]["content"].startswith(SUMMARY_PREFIX)
+    # The latest turn is always sent as it is
+    assert messages[-2:] == turn(9)
+    assert budget.stats()["summaries"] >= 1
+    assert sum(message_tokens(m) for m in messages) <= 400
+
+
+@pytest.mark.asyncio
+async def test_oldest_turns_are_dropped_while_the_summary_is_pending():
+    summarize = Summarizer(latency=None)
+    budget = ContextBudget(summarize, max_tokens=400)
+
+    context = await run_turns(budget, 10, pause=0.01)
+
+    messages = context.messages
+    assert messages[0] == PERSONA
+    assert messages[-2:] == turn(9)
+    assert budget.stats()["summaries"] == 0
+    assert budget.stats()["dropped_messages"] > 0
+    assert sum(message_tokens(m) for m in messages) <= 400
@@ -0,0 +1,90 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils.fleet import FleetUnavailable, LaunchOutcomeUnknown, WorkerFleet
+
+
+class FakeWorker:
+    """A worker agent's /launch, deduplicating on launch_id like worker_agent.py."""
+
+    def __init__(self, delays=()):
+        self.delays = list(delays)
+        self.requests = []
+        self.bots = {}
+        app = web.Application()
+        app.router.add_post("/launch", self.launch)
+        self.server = TestServer(app)
+
+    async def launch(self, request):
+        job = await request.json()
+        self.requests.append(job)
+        bot = self.bots.setdefault(job["launch_id"], 1000 + len(self.bots))
+        if self.delays:
+            await asyncio.sleep(self.delays.pop(0))
+        return web.json_response({"pid": bot})
+
+    @property
+    def url(self) -> str:
+        return str(self.server.make_url("")).rstrip("/")
+
+
+async def fleet_of(session, *urls) -> WorkerFleet:
+    fleet = WorkerFleet(session, launch_timeout=0.2)
+    for i, url in enumerate(urls):
+        fleet.heartbeat(f"w{i}", url, capacity=10 - i, running=0)
+    return fleet
+
+
+@pytest.mark.asyncio
+async def test_retries_the_same_worker_when_the_answer_is_lost():
+    first, second = FakeWorker(delays=[0.5]), FakeWorker()
+    await first.server.start_server()
+    await second.server.start_server()
+    async with aiohttp.ClientSession() as session:
+        fleet = await fleet_of(session, first.url, second.url)
+        assert await fleet.launch("https://x.daily.co/room", "token") == ("w0", 1000)
+
+    assert len(first.requests) == 2
+    assert len(first.bots) == 1
+    assert second.requests == []
+    assert fleet.count_in_room("https://x.daily.co/room") == 1
+    await first.server.close()
+    await second.server.close()
+
+
+@pytest.mark.asyncio
+async def test_unknown_outcome_does_not_fail_over():
+    first, second = FakeWorker(delays=[0.5, 0.5]), FakeWorker()
+    await first.server.start_server()
+    await second.server.start_server()
+    async with aiohttp.ClientSession() as session:
+        fleet = await fleet_of(session, first.url, second.url)
+        with pytest.raises(LaunchOutcomeUnknown):
+            await fleet.launch("https://x.daily.co/room", "token")
+
+    assert second.requests == []
+    assert fleet.count_in_room("https://x.daily.co/room") == 0
+    await first.server.close()
+    await second.server.close()
+
+
+@pytest.mark.asyncio
+async def test_fails_over_when_the_worker_is_unreachable():
+    second = FakeWorker()
+    await second.server.start_server()
+    async with aiohttp.ClientSession() as session:
+        # Nothing listens on port 9 (discard)
+        fleet = await fleet_of(session, "http://127.0.0.1:9", second.url)
+        assert await fleet.launch("https://x.daily.co/room", "token") == ("w1", 1000)
+        assert [w.worker_id for w in fleet.healthy()] == ["w1"]
+
+        # The other one is full
+        fleet.heartbeat("w1", second.url, capacity=1, running=1)
+        with pytest.raises(FleetUnavailable):
+            await fleet.launch("https://x.daily.co/other", "token")
+    await second.server.close()
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+from utils.metrics import METRICS_DIR, remove_stale_metrics, render_metrics
+
+BOT = """
+from prometheus_client import Counter, Gauge
+Counter("test_sessions", "Sessions").inc(3)
+Gauge("test_running", "Running", multiprocess_mode="livesum").set(1)
+"""
+
+
+def test_dead_process_keeps_its_counters():
+    subprocess.run([sys.executable, "-c", BOT], check=True, env=os.environ.copy())
+
+    remove_stale_metrics()
+
+    metrics, _ = render_metrics()
+    assert b"test_sessions_total 3.0" in metrics
+    assert b"test_running 1.0" not in metrics
+    assert not [n for n in os.listdir(METRICS_DIR) if n.startswith("gauge_live")]
@@ -0,0 +1,51 @@
+import os
+import time
+
+from utils.opener_cache import OpenerCache
+
+
+def test_put_fills_each_slot_once(tmp_path):
+    cache = OpenerCache(str(tmp_path), variants=2)
+    key = OpenerCache.key("prompt", "voice")
+
+    assert cache.put(key, "hi", b"\x00\x01", 24000)
+    assert cache.put(key, "hello", b"\x00\x02", 24000)
+    assert not cache.put(key, "hey", b"\x00\x03", 24000)
+    assert cache.count(key) == 2
+
+
+def test_slot_being_written_counts_as_claimed(tmp_path):
+    cache = OpenerCache(str(tmp_path), variants=2)
+    key = OpenerCache.key("prompt")
+    os.makedirs(tmp_path / key)
+    (tmp_path / key / "0.lock").touch()
+
+    assert cache.count(key) == 1
+    assert cache.get(key) is None
+    assert cache.put(key, "hi", b"\x00", 24000)
+    assert os.path.exists(tmp_path / key / "1.json")
+
+
+def test_stale_lock_is_reclaimed(tmp_path):
+    cache = OpenerCache(str(tmp_path), variants=1, lock_timeout=10)
+    key = OpenerCache.key("prompt")
+    os.makedirs(tmp_path / key)
+    lock = tmp_path / key / "0.lock"
+    lock.touch()
+    old = time.time() - 60
+    os.utime(lock, (old, old))
+
+    assert cache.count(key) == 0
+    assert cache.put(key, "hi", b"\x00", 24000)
+    assert cache.get(key).text == "hi"
+
+
+def test_failed_write_releases_the_slot(tmp_path):
+    cache = OpenerCache(str(tmp_path), variants=1)
+    key = OpenerCache.key("prompt")
+    # A directory where the audio file should go makes the write fail
+    os.makedirs(tmp_path / key / "0.pcm")
+
+    assert not cache.put(key, "hi", b"\x00", 24000)
+    assert not os.path.exists(tmp_path / key / "0.lock")
+    assert cache.count(key) == 0
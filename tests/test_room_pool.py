@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from types import SimpleNamespace
+
+import pytest
+
+from utils.room_pool import RoomPool
+
+
+class FakeDaily:
+    """The DailyRESTHelper calls RoomPool makes, without the network."""
+
+    def __init__(self, exp_offset=None):
+        self.exp_offset = exp_offset
+        self.created = 0
+        self.deleted = []
+
+    async def create_room(self, params):
+        self.created += 1
+        url = f"https://fake.daily.co/room-{self.created}"
+        await asyncio.sleep(0.01)
+        exp = time.time() + self.exp_offset if self.exp_offset is not None else None
+        return SimpleNamespace(url=url, config=SimpleNamespace(exp=exp))
+
+    async def get_token(self, room_url, expiry_time, owner=True):
+        return f"token-{owner}"
+
+    async def delete_room_by_url(self, room_url):
+        self.deleted.append(room_url)
+        return True
+
+
+def pool_of(daily, **kwargs) -> RoomPool:
+    return RoomPool(daily, lambda exp: None, low_watermark=2, high_watermark=4, **kwargs)
+
+
+async def settle(pool: RoomPool):
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if not pool.stats()["creating"]:
+            return
+
+
+@pytest.mark.asyncio
+async def test_refills_to_the_high_watermark_below_the_low_one():
+    daily = FakeDaily(exp_offset=3600)
+    pool = pool_of(daily)
+    await pool.start()
+    await settle(pool)
+    assert pool.stats()["ready"] == 4
+
+    # Still at the low watermark, no refill
+    await pool.acquire()
+    await pool.acquire()
+    await settle(pool)
+    assert pool.stats()["ready"] == 2
+    assert daily.created == 4
+
+    await pool.acquire()
+    await settle(pool)
+    assert pool.stats()["ready"] == 4
+    assert pool.stats()["hits"] == 3
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_rooms_without_expiry_expire_with_their_tokens():
+    daily = FakeDaily(exp_offset=None)
+    pool = pool_of(daily, lifetime=600, min_remaining=60)
+
+    before = time.time()
+    room = await pool.acquire()
+
+    assert before + 600 <= room.expires_at <= time.time() + 600
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_rooms_close_to_expiry_are_evicted():
+    daily = FakeDaily(exp_offset=30)
+    pool = pool_of(daily, lifetime=600, min_remaining=60)
+    await pool.start()
+    await settle(pool)
+
+    room = await pool.acquire()
+
+    # Every pooled room expires too soon, a fresh one is created
+    assert pool.stats()["evicted"] >= 4
+    assert pool.stats()["misses"] == 1
+    assert room.url not in daily.deleted
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_deletes_the_pooled_rooms():
+    daily = FakeDaily(exp_offset=3600)
+    pool = pool_of(daily)
+    await pool.start()
+    await settle(pool)
+    room = await pool.acquire()
+
+    await pool.stop()
+
+    assert pool.stats()["ready"] == 0
+    assert len(daily.deleted) == 3
+    assert room.url not in daily.deleted
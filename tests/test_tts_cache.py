@@ -0,0 +1,51 @@
+from utils.tts_cache import PhraseAudioStore, phrase_key
+
+
+def test_roundtrip_and_normalized_keys(tmp_path):
+    store = PhraseAudioStore(str(tmp_path / "phrases.cache"), max_bytes=4096, max_entries=8)
+    assert store.put(phrase_key("Got it.", "voice"), b"\x01" * 100, 16000)
+    assert store.get(phrase_key("Got  it.", "voice")) == (b"\x01" * 100, 16000)
+    assert store.get(phrase_key("Got it.", "other voice")) is None
+    # Another process storing the same phrase first
+    assert not store.put(phrase_key("Got it.", "voice"), b"\x02" * 100, 16000)
+    store.close()
+
+
+def test_evicts_least_recently_used_when_full(tmp_path):
+    store = PhraseAudioStore(str(tmp_path / "phrases.cache"), max_bytes=1000, max_entries=8)
+    first, second, third, fourth = (phrase_key(f"phrase {i}") for i in range(4))
+    assert store.put(first, b"\x00" * 400, 16000)
+    assert store.put(second, b"\x00" * 400, 16000)
+    # Played since, so the first phrase is the least recently used
+    assert store.get(second) is not None
+    assert store.put(third, b"\x00" * 400, 16000)
+    assert store.get(first) is None
+
+    assert store.get(third) is not None
+    assert store.put(fourth, b"\x00" * 400, 16000)
+    assert store.get(second) is None
+    assert store.get(third) is not None
+
+    stats = store.stats()
+    assert stats["evicted"] == 2
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 800
+    store.close()
+
+
+def test_evicts_when_out_of_slots(tmp_path):
+    store = PhraseAudioStore(str(tmp_path / "phrases.cache"), max_bytes=4096, max_entries=2)
+    for i in range(3):
+        assert store.put(phrase_key(f"phrase {i}"), b"\x00" * 10, 16000)
+    assert store.get(phrase_key("phrase 0")) is None
+    assert store.stats()["entries"] == 2
+
+
+def test_shared_between_processes(tmp_path):
+    path = str(tmp_path / "phrases.cache")
+    writer = PhraseAudioStore(path, max_bytes=4096, max_entries=8)
+    reader = PhraseAudioStore(path, max_bytes=4096, max_entries=8)
+    writer.put(phrase_key("Hello!"), b"\x05" * 10, 24000)
+    assert reader.get(phrase_key("Hello!")) == (b"\x05" * 10, 24000)
+    writer.close()
+    reader.close()
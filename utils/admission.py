@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import time
+
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, status_code: int, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class HostHeadroom:
+    """
+    Reads available memory and load average from /proc. Values are cached for
+    `cache_time` seconds so a burst of requests doesn't turn into a burst of
+    file reads.
+    """
+
+    def __init__(self, min_mem_available_mb: int = 1024, max_load_per_cpu: float = 2.0, cache_time: float = 1.0):
+        self._min_mem_available_kb = min_mem_available_mb * 1024
+        self._max_load = max_load_per_cpu * (os.cpu_count() or 1)
+        self._cache_time = cache_time
+        self._checked_at = 0.0
+        self._mem_available_kb = None
+        self._load = None
+
+    def _read(self):
+        now = time.monotonic()
+        if now - self._checked_at < self._cache_time:
+            return
+        self._checked_at = now
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        self._mem_available_kb = int(line.split()[1])
+                        break
+            with open("/proc/loadavg") as f:
+                self._load = float(f.read().split()[0])
+        except OSError:
+            # Not on Linux, only the bot count limit applies.
+            self._mem_available_kb = None
+            self._load = None
+
+    def check(self) -> str | None:
+        """Returns why the host is out of headroom, or None if it isn't."""
+        self._read()
+        if self._mem_available_kb is not None and self._mem_available_kb < self._min_mem_available_kb:
+            return f"low memory ({self._mem_available_kb // 1024} MB available)"
+        if self._load is not None and self._load > self._max_load:
+            return f"high load ({self._load:.2f})"
+        return None
+
+    def stats(self) -> dict:
+        self._read()
+        return {"mem_available_kb": self._mem_available_kb, "load": self._load}
+
+
+class AdmissionController:
+    """
+    Decides whether a new bot can be launched. At most `max_bots` bots run at
+    once and the host needs enough memory and CPU headroom. Requests over
+    capacity wait in a bounded queue for up to `queue_timeout` seconds; when
+    the queue is full, or the wait times out, they are rejected right away so
+    the client can retry later.
+
+    Every successful `acquire()` must be paired with a `release()` once the
+    bot is gone. Once `close()`d, when the server is shutting down, every
+    request is rejected, the queued ones too.
+    """
+
+    def __init__(
+        self,
+        max_bots: int = 20,
+        max_queue: int = 10,
+        queue_timeout: float = 10.0,
+        retry_after: int = 5,
+        headroom: HostHeadroom | None = None,
+    ):
+        self._max_bots = max_bots
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self._retry_after = retry_after
+        self._headroom = headroom or HostHeadroom()
+
+        self._active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._closed = False
+
+        self._admitted = 0
+        self._queued = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._rejected_headroom = 0
+        self._rejected_closed = 0
+
+    def _has_capacity(self) -> bool:
+        return self._active < self._max_bots
+
+    async def acquire(self):
+        if self._closed:
+            self._rejected_closed += 1
+            raise AdmissionRejected("Server is shutting down", 503, self._retry_after)
+
+        if not self._waiters and self._has_capacity():
+            reason = self._headroom.check()
+            if reason:
+                self._rejected_headroom += 1
+                raise AdmissionRejected(f"Host is out of headroom: {reason}", 503, self._retry_after)
+            self._admit()
+            return
+
+        if len(self._waiters) >= self._max_queue:
+            self._rejected_queue_full += 1
+            raise AdmissionRejected("Too many bots starting, try again later", 429, self._retry_after)
+
+        self._queued += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self._queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected_timeout += 1
+            raise AdmissionRejected("Timed out waiting for a free bot slot", 503, self._retry_after)
+        except asyncio.CancelledError:
+            # Admitted right before the request went away, give the slot back.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def occupy(self):
+        """Counts a bot admitted by someone else (a previous server), released like the others."""
+        self._active += 1
+
+    def close(self):
+        """Stops admitting bots, for good."""
+        self._closed = True
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._rejected_closed += 1
+                waiter.set_exception(AdmissionRejected("Server is shutting down", 503, self._retry_after))
+
+    def release(self):
+        self._active = max(self._active - 1, 0)
+        self._wake_waiters()
+
+    def _admit(self):
+        self._active += 1
+        self._admitted += 1
+
+    def _wake_waiters(self):
+        while not self._closed and self._waiters and self._has_capacity():
+            if self._headroom.check():
+                # Leave them queued, they'll time out if nothing frees up.
+                return
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._admit()
+                waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "closed": self._closed,
+            "max_bots": self._max_bots,
+            "queue_depth": len(self._waiters),
+            "max_queue": self._max_queue,
+            "admitted": self._admitted,
+            "queued": self._queued,
+            "rejected": (
+                self._rejected_queue_full
+                + self._rejected_timeout
+                + self._rejected_headroom
+                + self._rejected_closed
+            ),
+            "rejected_queue_full": self._rejected_queue_full,
+            "rejected_timeout": self._rejected_timeout,
+            "rejected_headroom": self._rejected_headroom,
+            "rejected_closed": self._rejected_closed,
+            **self._headroom.stats(),
+        }
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+READY_LINE = b"READY\n"
+
+
+class BotWorkerPool:
+    """
+    Keeps a number of bot processes started ahead of time. Each worker imports
+    the bot module (pipecat, the VAD model, the sprites) and then blocks on its
+    stdin until the server hands it a room URL and a token. Launching a bot is
+    then just a write to a pipe instead of a cold `python3 -m bot`.
+
+    Workers are started with subprocess.Popen, in a session of their own, so
+    they can outlive the server (see BotRegistry.detach()): asyncio kills the
+    children it started when it is done with them, and a Ctrl-C on the
+    server's terminal would reach them too. With a `log_path` they write
+    their logs there instead of the server's stderr, which may be gone
+    before them.
+    """
+
+    def __init__(
+        self,
+        module: str = "bot",
+        size: int = 2,
+        cwd: str | None = None,
+        ready_timeout: float = 120.0,
+        log_path: str | None = None,
+    ):
+        self._module = module
+        self._size = size
+        self._cwd = cwd
+        self._ready_timeout = ready_timeout
+        self._log_path = log_path
+        if log_path:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+        self._idle: deque = deque()
+        self._warming = 0
+        self._warm_tasks = set()
+        self._refill_event = asyncio.Event()
+        self._refill_task = None
+
+        self._hits = 0
+        self._misses = 0
+        self._failed = 0
+        self._launch_time = 0.0
+
+    async def start(self):
+        self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        if self._refill_task:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+
+        for task in list(self._warm_tasks):
+            task.cancel()
+
+        idle = list(self._idle)
+        self._idle.clear()
+        for proc in idle:
+            if proc.poll() is None:
+                proc.kill()
+        for proc in idle:
+            _discard(proc)
+
+    async def launch(self, room_url: str, token: str, **extra) -> subprocess.Popen:
+        start_time = time.monotonic()
+
+        proc = None
+        while self._idle:
+            candidate = self._idle.popleft()
+            if candidate.poll() is None:
+                proc = candidate
+                break
+            _discard(candidate)
+
+        if proc:
+            self._hits += 1
+        else:
+            # Nothing warm, start a cold worker. It will pick up the job from
+            # stdin as soon as it has finished importing.
+            self._misses += 1
+            proc = self._spawn()
+
+        self._refill_event.set()
+
+        # A line is much smaller than the pipe's buffer, this doesn't block
+        job = {"room_url": room_url, "token": token, **extra}
+        try:
+            proc.stdin.write(json.dumps(job).encode() + b"\n")
+            proc.stdin.close()
+        finally:
+            # Only READY comes out of it, and a cold worker gets EPIPE for it
+            proc.stdout.close()
+
+        self._launch_time += time.monotonic() - start_time
+
+        return proc
+
+    def stats(self) -> dict:
+        launches = self._hits + self._misses
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "warming": self._warming,
+            "hits": self._hits,
+            "misses": self._misses,
+            "failed": self._failed,
+            "hit_rate": self._hits / launches if launches else 0.0,
+            "avg_launch_ms": 1000 * self._launch_time / launches if launches else 0.0,
+        }
+
+    def _spawn(self) -> subprocess.Popen:
+        log = open(self._log_path, "ab") if self._log_path else None
+        try:
+            return subprocess.Popen(
+                [sys.executable, "-m", self._module, "--worker"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=log,
+                cwd=self._cwd,
+                start_new_session=True,
+            )
+        finally:
+            if log:
+                log.close()
+
+    async def _warm_one(self):
+        proc = None
+        try:
+            proc = self._spawn()
+            loop = asyncio.get_running_loop()
+            # Killing the worker on a timeout ends the read
+            line = await asyncio.wait_for(
+                loop.run_in_executor(None, proc.stdout.readline), self._ready_timeout
+            )
+            if line != READY_LINE:
+                raise Exception(f"unexpected worker output: {line!r}")
+            self._idle.append(proc)
+        except asyncio.CancelledError:
+            if proc:
+                if proc.poll() is None:
+                    proc.kill()
+                _discard(proc)
+            raise
+        except Exception as e:
+            self._failed += 1
+            logger.error(f"Unable to warm bot worker: {e}")
+            if proc:
+                if proc.poll() is None:
+                    proc.kill()
+                _discard(proc)
+            # Don't spin if workers keep dying on startup.
+            await asyncio.sleep(1)
+        finally:
+            self._warming -= 1
+            self._refill_event.set()
+
+    async def _refill_loop(self):
+        while True:
+            # Drop workers that died while idle.
+            for proc in [p for p in self._idle if p.poll() is not None]:
+                self._idle.remove(proc)
+                _discard(proc)
+
+            missing = self._size - len(self._idle) - self._warming
+            for _ in range(max(missing, 0)):
+                self._warming += 1
+                task = asyncio.create_task(self._warm_one())
+                self._warm_tasks.add(task)
+                task.add_done_callback(self._warm_tasks.discard)
+
+            await self._refill_event.wait()
+            self._refill_event.clear()
+
+
+def _discard(proc: subprocess.Popen):
+    """Closes the pipes of a worker that is dead or killed, and reaps it."""
+    for pipe in (proc.stdin, proc.stdout):
+        if pipe:
+            try:
+                pipe.close()
+            except OSError:
+                # Data still buffered for a worker that is gone
+                pass
+    proc.wait()
+
+
+async def wait_for_job() -> dict | None:
+    """
+    Worker side of the pool. Tells the server we are ready and waits for a job
+    on stdin. Returns None if the server closed the pipe without a job.
+    """
+    try:
+        sys.stdout.buffer.write(READY_LINE)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The server that started us is gone (restarting), our job may
+        # already be waiting on stdin all the same
+        pass
+    # From now on stdout is not read by anyone, so send it to stderr instead to
+    # avoid blocking on a full pipe.
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    loop = asyncio.get_running_loop()
+    line = await loop.run_in_executor(None, sys.stdin.readline)
+    if not line:
+        return None
+    return json.loads(line)
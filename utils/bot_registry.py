@@ -0,0 +1,323 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import subprocess
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BotRecord:
+    pid: int
+    room_url: str
+    proc: Optional[Union[asyncio.subprocess.Process, subprocess.Popen]]
+    started_at: float
+    ended_at: Optional[float] = None
+    returncode: Optional[int] = None
+    # Started by a previous server, we only know its PID
+    adopted: bool = False
+    exited: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def running(self) -> bool:
+        return self.ended_at is None
+
+    @property
+    def status(self) -> str:
+        return "running" if self.running else "finished"
+
+
+def process_start_ticks(pid: int) -> Optional[int]:
+    """When a process started (field 22 of /proc/<pid>/stat), tells a PID apart from a reused one."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The fields after the command name start with the state, field 3
+    return int(stat[stat.rindex(b")") + 2 :].split()[19])
+
+
+def in_container() -> bool:
+    """
+    Whether we run in a container. Its processes all stop with it, so bots
+    can't be left running for the next server (see BotRegistry.detach()).
+    """
+    return os.getpid() == 1 or os.path.exists("/.dockerenv") or os.path.exists("/run/.containerenv")
+
+
+async def wait_for_exit(pid: int, proc: Optional[subprocess.Popen] = None, poll_interval: float = 1.0):
+    """
+    Waits for a process that asyncio didn't start: a subprocess.Popen child or
+    one that isn't ours at all. With a pidfd (Linux 5.3) the event loop is
+    told when it exits, otherwise it is polled.
+    """
+    try:
+        fd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        fd = None
+
+    if fd is not None:
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        loop.add_reader(fd, lambda: exited.done() or exited.set_result(None))
+        try:
+            await exited
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+        return
+
+    while True:
+        if proc:
+            if proc.poll() is not None:
+                return
+        else:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return
+            except PermissionError:
+                pass
+        await asyncio.sleep(poll_interval)
+
+
+class BotRegistry:
+    """
+    Keeps track of bot processes, indexed by PID and by room URL. Each process
+    gets a task waiting on it (through the asyncio child watcher, or a pidfd
+    for processes asyncio didn't start), so exits are reaped as they happen
+    and the per room counters stay current. Only the last `history_size`
+    finished bots are remembered, for status reporting. `on_exit` is called
+    with the record of every bot that exits.
+
+    With a `state_dir`, every running bot also has a `<pid>.json` file there,
+    so a new server can `adopt()` the bots a previous one left running (see
+    `detach()`). Bots that must outlive the server are started in a session
+    of their own and with subprocess.Popen, asyncio kills the children it
+    started when their transport goes away.
+
+    `drain()` asks all the bots to finish at once and waits for them together.
+    """
+
+    def __init__(
+        self,
+        history_size: int = 1000,
+        on_exit: Optional[Callable[[BotRecord], None]] = None,
+        state_dir: Optional[str] = None,
+    ):
+        self._history_size = history_size
+        self._on_exit = on_exit
+        self._state_dir = state_dir
+        self._running: Dict[int, BotRecord] = {}
+        self._rooms: Dict[str, Set[int]] = {}
+        self._finished: OrderedDict[int, BotRecord] = OrderedDict()
+        self._reapers = set()
+        self._started = 0
+        self._adopted = 0
+        self._drained = 0
+        self._killed = 0
+        self._detached = 0
+
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+    def add(self, proc: Union[asyncio.subprocess.Process, subprocess.Popen], room_url: str) -> BotRecord:
+        record = BotRecord(pid=proc.pid, room_url=room_url, proc=proc, started_at=time.time())
+        self._track(record)
+        self._started += 1
+        self._save_state(record)
+        return record
+
+    def adopt(self) -> List[BotRecord]:
+        """Takes over the bots a previous server left running in `state_dir`."""
+        if not self._state_dir:
+            return []
+
+        adopted = []
+        for name in os.listdir(self._state_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self._state_dir, name)
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+
+            pid = state.get("pid")
+            if not pid or pid in self._running or process_start_ticks(pid) != state.get("start_ticks"):
+                # Gone, or its PID now belongs to another process
+                os.remove(path)
+                continue
+
+            record = BotRecord(
+                pid=pid,
+                room_url=state["room_url"],
+                proc=None,
+                started_at=state["started_at"],
+                adopted=True,
+            )
+            self._track(record)
+            adopted.append(record)
+
+        self._adopted += len(adopted)
+        if adopted:
+            logger.info(f"Adopted {len(adopted)} bot processes left running by the previous server")
+        return adopted
+
+    async def drain(self, timeout: float = 45.0) -> dict:
+        """
+        Asks every bot to end its session (SIGTERM, they finish the current
+        turn first) and waits for all of them together, for up to `timeout`
+        seconds. The ones still running after that are killed.
+        """
+        records = self.running()
+        start = time.monotonic()
+        for record in records:
+            self._signal(record, signal.SIGTERM)
+        await self._wait_exited(records, timeout)
+
+        stragglers = [record for record in records if record.running]
+        for record in stragglers:
+            self._signal(record, signal.SIGKILL)
+        await self._wait_exited(stragglers, 5.0)
+
+        self._drained += len(records) - len(stragglers)
+        self._killed += len(stragglers)
+        result = {
+            "bots": len(records),
+            "killed": len(stragglers),
+            "secs": round(time.monotonic() - start, 2),
+        }
+        logger.info(f"Drained bot processes: {result}")
+        return result
+
+    def detach(self) -> int:
+        """Stops tracking the running bots and leaves them running, for the next server to adopt."""
+        for task in list(self._reapers):
+            task.cancel()
+        count = len(self._running)
+        for record in self._running.values():
+            # Popen doesn't kill its process when it goes away
+            record.proc = None
+        self._running.clear()
+        self._rooms.clear()
+        self._detached += count
+        logger.info(f"Left {count} bot processes running for the next server")
+        return count
+
+    def get(self, pid: int) -> Optional[BotRecord]:
+        return self._running.get(pid) or self._finished.get(pid)
+
+    def count_in_room(self, room_url: str) -> int:
+        return len(self._rooms.get(room_url, ()))
+
+    def running(self) -> List[BotRecord]:
+        return list(self._running.values())
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "rooms": len(self._rooms),
+            "started": self._started,
+            "history": len(self._finished),
+            "adopted": self._adopted,
+            "drained": self._drained,
+            "killed": self._killed,
+            "detached": self._detached,
+        }
+
+    def _track(self, record: BotRecord):
+        # PIDs get reused, forget about any older bot with the same one.
+        self._finished.pop(record.pid, None)
+        self._running[record.pid] = record
+        self._rooms.setdefault(record.room_url, set()).add(record.pid)
+
+        task = asyncio.create_task(self._reap(record))
+        self._reapers.add(task)
+        task.add_done_callback(self._reapers.discard)
+
+    def _signal(self, record: BotRecord, sig: int):
+        if not record.running:
+            return
+        try:
+            os.kill(record.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    async def _wait_exited(self, records: List[BotRecord], timeout: float):
+        waits = [asyncio.create_task(record.exited.wait()) for record in records if record.running]
+        if not waits:
+            return
+        _, pending = await asyncio.wait(waits, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    def _save_state(self, record: BotRecord):
+        if not self._state_dir:
+            return
+        state = {
+            "pid": record.pid,
+            "room_url": record.room_url,
+            "started_at": record.started_at,
+            "start_ticks": process_start_ticks(record.pid),
+        }
+        path = os.path.join(self._state_dir, f"{record.pid}.json")
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.error(f"Unable to save the state of bot process {record.pid}: {e}")
+
+    def _remove_state(self, record: BotRecord):
+        if not self._state_dir:
+            return
+        try:
+            os.remove(os.path.join(self._state_dir, f"{record.pid}.json"))
+        except FileNotFoundError:
+            pass
+
+    async def _reap(self, record: BotRecord):
+        if isinstance(record.proc, asyncio.subprocess.Process):
+            returncode = await record.proc.wait()
+        else:
+            await wait_for_exit(record.pid, record.proc)
+            # Only our own children have an exit status for us
+            returncode = record.proc.wait() if record.proc else None
+        self._finish(record, returncode)
+
+    def _finish(self, record: BotRecord, returncode: Optional[int]):
+        record.ended_at = time.time()
+        record.returncode = returncode
+        # Drop the process (and its pipes) now that it's gone.
+        record.proc = None
+
+        self._running.pop(record.pid, None)
+        pids = self._rooms.get(record.room_url)
+        if pids is not None:
+            pids.discard(record.pid)
+            if not pids:
+                del self._rooms[record.room_url]
+        self._remove_state(record)
+
+        self._finished[record.pid] = record
+        while len(self._finished) > self._history_size:
+            self._finished.popitem(last=False)
+        record.exited.set()
+
+        logger.info(f"Bot process {record.pid} exited with code {returncode}")
+
+        if self._on_exit:
+            self._on_exit(record)
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from utils.metrics import METRICS_DIR
+
+logger = logging.getLogger(__name__)
+
+# Where the bots report their pipeline queue depths, one `<pid>.json` each.
+# Next to the metrics so bots find it the same way, by inheriting it.
+TELEMETRY_DIR = os.path.join(METRICS_DIR, "telemetry")
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def write_report(pid: int, report: dict, directory: str = TELEMETRY_DIR):
+    """Bot side: replaces the report of process `pid`, readers never see half of it."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{pid}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f)
+    os.replace(path + ".tmp", path)
+
+
+def remove_report(pid: int, directory: str = TELEMETRY_DIR):
+    try:
+        os.remove(os.path.join(directory, f"{pid}.json"))
+    except FileNotFoundError:
+        pass
+
+
+@dataclass
+class _Proc:
+    """What we keep between samples of a process."""
+
+    stat_fd: int
+    cpu_ticks: int
+    sampled_at: float
+
+
+class BotTelemetry:
+    """
+    Samples the bot processes of a BotRegistry every `interval` seconds:
+    CPU, RSS and threads from /proc/<pid>/stat, open file descriptors from
+    /proc/<pid>/fd, and the pipeline queue depths each bot reports (see
+    utils/queue_depth.py).
+
+    The cost is kept low and flat. Every process's stat file is opened once
+    and read again with a single pread. The sampling runs on a thread of its
+    own, not on the event loop. At most `max_per_tick` bots are sampled per
+    tick, in turns, so with more bots than that they are sampled less often
+    instead of the server spending more time on it. Each bot is serialized
+    when it is sampled, and the snapshot is put together from those once per
+    tick, however many clients read or stream it.
+
+        telemetry = BotTelemetry(bot_registry)
+        telemetry.start()
+        telemetry.snapshot_json  # for an HTTP response
+        async for data in telemetry.updates(): ...  # a new snapshot every tick
+    """
+
+    def __init__(
+        self,
+        registry,
+        *,
+        interval: float = 1.0,
+        max_per_tick: int = 256,
+        directory: str = TELEMETRY_DIR,
+    ):
+        self._registry = registry
+        self._interval = interval
+        self._max_per_tick = max_per_tick
+        self._directory = directory
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bot-telemetry")
+        self._task: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+        self._procs: Dict[int, _Proc] = {}
+        self._bots: Dict[int, dict] = {}
+        self._bots_json: Dict[int, bytes] = {}
+        self._next = 0
+
+        self.snapshot_json = json.dumps({"t": time.time(), "bots": [], "totals": {}}).encode()
+
+        self._ticks = 0
+        self._samples = 0
+        self._sample_secs = 0.0
+        self._max_tick_secs = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # A tick may still be running on the thread
+        self._executor.shutdown(wait=True)
+        for proc in self._procs.values():
+            os.close(proc.stat_fd)
+        self._procs.clear()
+
+    def get(self, pid: int) -> Optional[dict]:
+        """The latest sample of a bot."""
+        return self._bots.get(pid)
+
+    async def updates(self):
+        """The snapshot now, then every new one. A slow reader skips to the latest."""
+        while True:
+            updated = self._updated
+            yield self.snapshot_json
+            await updated.wait()
+
+    def stats(self) -> dict:
+        return {
+            "bots": len(self._bots),
+            "ticks": self._ticks,
+            "samples": self._samples,
+            "avg_sample_us": round(1e6 * self._sample_secs / self._samples, 1) if self._samples else 0.0,
+            "max_tick_ms": round(1000 * self._max_tick_secs, 2),
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            records = self._registry.running()
+            try:
+                start = time.perf_counter()
+                await loop.run_in_executor(self._executor, self._tick, records)
+                self._max_tick_secs = max(self._max_tick_secs, time.perf_counter() - start)
+            except Exception as e:
+                logger.error(f"Unable to sample bot telemetry: {e}")
+
+            updated, self._updated = self._updated, asyncio.Event()
+            updated.set()
+            await asyncio.sleep(self._interval)
+
+    def _tick(self, records: list):
+        running = {record.pid: record for record in records}
+        for pid in list(self._procs):
+            if pid not in running:
+                os.close(self._procs.pop(pid).stat_fd)
+        for pid in list(self._bots):
+            if pid not in running:
+                del self._bots[pid]
+                del self._bots_json[pid]
+
+        # In turns when there are more bots than we sample per tick
+        pids = sorted(running)
+        if len(pids) > self._max_per_tick:
+            start = self._next % len(pids)
+            pids = (pids[start:] + pids[:start])[: self._max_per_tick]
+            self._next = start + self._max_per_tick
+
+        start = time.perf_counter()
+        for pid in pids:
+            sample = self._sample(pid)
+            if sample:
+                bot = {
+                    "pid": pid,
+                    "room_url": running[pid].room_url,
+                    "age_secs": round(time.time() - running[pid].started_at, 1),
+                    **sample,
+                }
+                self._bots[pid] = bot
+                self._bots_json[pid] = json.dumps(bot).encode()
+        self._samples += len(pids)
+        self._sample_secs += time.perf_counter() - start
+        self._ticks += 1
+
+        bots = list(self._bots.values())
+        totals = {
+            "bots": len(bots),
+            "cpu_percent": round(sum(b["cpu_percent"] for b in bots), 1),
+            "rss_mb": round(sum(b["rss_mb"] for b in bots), 1),
+            "threads": sum(b["threads"] for b in bots),
+            "fds": sum(b["fds"] for b in bots),
+            "queue_depth": sum(b["queue_depth"] or 0 for b in bots),
+        }
+        self.snapshot_json = b"".join(
+            [
+                b'{"t": ',
+                str(round(time.time(), 3)).encode(),
+                b', "totals": ',
+                json.dumps(totals).encode(),
+                b', "bots": [',
+                b", ".join(self._bots_json.values()),
+                b"]}",
+            ]
+        )
+
+    def _sample(self, pid: int) -> Optional[dict]:
+        now = time.monotonic()
+        proc = self._procs.get(pid)
+        try:
+            if not proc:
+                proc = _Proc(os.open(f"/proc/{pid}/stat", os.O_RDONLY), 0, 0.0)
+                self._procs[pid] = proc
+            stat = os.pread(proc.stat_fd, 2048, 0)
+            fds = len(os.listdir(f"/proc/{pid}/fd"))
+        except OSError:
+            # Gone since the registry last heard of it
+            if proc:
+                os.close(self._procs.pop(pid).stat_fd)
+            return None
+
+        # The command name is in parentheses and may have spaces, the
+        # fields after it start with the state (field 3 of proc(5))
+        fields = stat[stat.rindex(b")") + 2 :].split()
+        cpu_ticks = int(fields[11]) + int(fields[12])
+        cpu_percent = None
+        if proc.sampled_at:
+            cpu_percent = round(100 * (cpu_ticks - proc.cpu_ticks) / CLOCK_TICKS / (now - proc.sampled_at), 1)
+        proc.cpu_ticks = cpu_ticks
+        proc.sampled_at = now
+
+        report = self._read_report(pid)
+        sessions = report.get("sessions", {})
+        return {
+            "cpu_percent": cpu_percent or 0.0,
+            "rss_mb": round(int(fields[21]) * PAGE_SIZE / 1024 / 1024, 1),
+            "threads": int(fields[17]),
+            "fds": fds,
+            "queue_depth": sum(s["queue_depth"] for s in sessions.values()) if report else None,
+            "sessions": sessions,
+            "reported_at": report.get("t"),
+        }
+
+    def _read_report(self, pid: int) -> dict:
+        # os.open() skips the text wrappers of open(), half the cost of a sample
+        try:
+            fd = os.open(os.path.join(self._directory, f"{pid}.json"), os.O_RDONLY)
+            try:
+                return json.loads(os.read(fd, 65536))
+            finally:
+                os.close(fd)
+        except (OSError, ValueError):
+            # Not started its pipeline yet, or a bot that doesn't report
+            return {}
+
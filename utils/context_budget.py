@@ -0,0 +1,214 @@
+import asyncio
+
+from typing import Awaitable, Callable, List, Optional
+
+from pipecat.frames.frames import Frame, LLMMessagesFrame
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContextFrame
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+from loguru import logger
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    # Good enough for English when tiktoken isn't installed
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message: dict) -> int:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    # Role and message framing
+    return count_tokens(content) + 4
+
+
+SUMMARY_PREFIX = "Summary of the conversation so far:\n"
+
+Summarizer = Callable[[Optional[str], List[dict]], Awaitable[str]]
+
+
+class ContextBudget(FrameProcessor):
+    """
+    Keeps the LLM context within `max_tokens`. Goes between the user context
+    aggregator and the LLM, and works on the context (or messages list) in
+    place, so the aggregators keep appending to the bounded list.
+
+    The leading system messages (the persona) are always kept. Once the
+    context goes over `summarize_at` of the budget, the turns older than the
+    last `keep_recent_tokens` are summarized in the background with
+    `summarize(previous_summary, messages)`. When the summary is ready those
+    turns are replaced by a single system message right after the persona.
+    The LLM request never waits for it: if the context reaches `max_tokens`
+    before the summary is ready, the oldest turns are dropped (and folded
+    into the next summary).
+    """
+
+    def __init__(
+        self,
+        summarize: Summarizer,
+        *,
+        max_tokens: int = 2000,
+        keep_recent_tokens: Optional[int] = None,
+        summarize_at: float = 0.75,
+    ):
+        super().__init__()
+        self._summarize = summarize
+        self._max_tokens = max_tokens
+        self._keep_recent_tokens = keep_recent_tokens or max_tokens // 2
+        self._summarize_at = summarize_at
+
+        self._messages: Optional[List[dict]] = None
+        self._summary: Optional[str] = None
+        self._summary_message: Optional[dict] = None
+        # Turns dropped by the hard limit before they were summarized
+        self._unsummarized: List[dict] = []
+        # Turns the running summary task is summarizing
+        self._summarizing: List[dict] = []
+        self._summary_task: Optional[asyncio.Task] = None
+
+        self._summaries = 0
+        self._dropped = 0
+        self._prompt_tokens = 0
+
+    def stats(self) -> dict:
+        return {
+            "prompt_tokens": self._prompt_tokens,
+            "summaries": self._summaries,
+            "dropped_messages": self._dropped,
+        }
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, OpenAILLMContextFrame):
+            self._bound(frame.context.messages)
+        elif isinstance(frame, LLMMessagesFrame):
+            self._bound(frame.messages)
+
+        await self.push_frame(frame, direction)
+
+    async def cleanup(self):
+        await super().cleanup()
+        if self._summary_task:
+            self._summary_task.cancel()
+
+    def _split(self, messages: List[dict]) -> int:
+        # Index of the first message after the persona and the summary.
+        start = 0
+        while start < len(messages) and (
+            messages[start].get("role") == "system" or messages[start] is self._summary_message
+        ):
+            start += 1
+        return start
+
+    def _recent_start(self, messages: List[dict], start: int) -> int:
+        # Newest turns that fit in keep_recent_tokens, starting at a user
+        # message so a turn is never cut in half.
+        tokens = 0
+        index = len(messages)
+        while index > start:
+            tokens += message_tokens(messages[index - 1])
+            if tokens > self._keep_recent_tokens:
+                break
+            index -= 1
+        while index < len(messages) - 1 and messages[index].get("role") != "user":
+            index += 1
+        return max(start, min(index, len(messages) - 1))
+
+    def _bound(self, messages: List[dict]):
+        self._messages = messages
+        total = sum(message_tokens(m) for m in messages)
+
+        if total > self._summarize_at * self._max_tokens and not self._summary_task:
+            start = self._split(messages)
+            old = self._unsummarized + messages[start : self._recent_start(messages, start)]
+            if old:
+                self._unsummarized = []
+                self._summarizing = old
+                self._summary_task = self.get_event_loop().create_task(self._run_summary(old))
+
+        if total > self._max_tokens:
+            start = self._split(messages)
+            recent = self._recent_start(messages, start)
+            summarizing = {id(m) for m in self._summarizing}
+            while total > self._max_tokens and start < recent:
+                message = messages.pop(start)
+                recent -= 1
+                total -= message_tokens(message)
+                self._dropped += 1
+                if id(message) not in summarizing:
+                    self._unsummarized.append(message)
+
+        self._prompt_tokens = total
+
+    async def _run_summary(self, old: List[dict]):
+        try:
+            summary = await self._summarize(self._summary, old)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Unable to summarize the conversation: {e}")
+            # Whatever was dropped meanwhile goes into the next attempt.
+            present = {id(m) for m in self._messages}
+            self._unsummarized = [m for m in old if id(m) not in present] + self._unsummarized
+            summary = None
+        finally:
+            self._summary_task = None
+            self._summarizing = []
+
+        if summary:
+            self._apply_summary(summary, old)
+
+    def _apply_summary(self, summary: str, old: List[dict]):
+        messages = self._messages
+        summarized = {id(m) for m in old}
+        messages[:] = [m for m in messages if id(m) not in summarized]
+
+        self._summary = summary
+        self._summaries += 1
+        message = {"role": "system", "content": f"{SUMMARY_PREFIX}{summary}"}
+        if self._summary_message is not None and any(m is self._summary_message for m in messages):
+            index = next(i for i, m in enumerate(messages) if m is self._summary_message)
+            messages[index] = message
+        else:
+            messages.insert(self._split(messages), message)
+        self._summary_message = message
+        logger.debug(f"Summarized {len(old)} messages, context is now {len(messages)} messages")
+
+
+class OpenAISummarizer:
+    """Summarizes old turns with a small OpenAI model."""
+
+    PROMPT = (
+        "Summarize the conversation below for the assistant who is having it. Keep the "
+        "facts, names, numbers, questions asked and commitments made. Write it in a few "
+        "short sentences, no preamble."
+    )
+
+    def __init__(self, *, api_key: str, model: str = "gpt-4o-mini"):
+        from openai import AsyncOpenAI
+
+        self._client = AsyncOpenAI(api_key=api_key)
+        self._model = model
+
+    async def __call__(self, previous_summary: Optional[str], messages: List[dict]) -> str:
+        transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+        if previous_summary:
+            transcript = f"Earlier summary: {previous_summary}\n{transcript}"
+        completion = await self._client.chat.completions.create(
+            model=self._model,
+            messages=[
+                {"role": "system", "content": self.PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+        )
+        return completion.choices[0].message.content.strip()
@@ -0,0 +1,272 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class FleetUnavailable(Exception):
+    pass
+
+
+class LaunchOutcomeUnknown(FleetUnavailable):
+    """The worker may have started the bot, but we never got its answer."""
+
+
+@dataclass
+class WorkerInfo:
+    worker_id: str
+    url: str
+    capacity: int
+    running: int = 0
+    last_heartbeat: float = field(default_factory=time.monotonic)
+    # Launches we sent since the last heartbeat, so placement doesn't keep
+    # picking the same worker until it reports its new load.
+    pending: int = 0
+    failures: int = 0
+
+    @property
+    def load(self) -> float:
+        return (self.running + self.pending) / max(self.capacity, 1)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big")
+
+
+class WorkerFleet:
+    """
+    Worker agents (see worker_agent.py) register themselves through periodic
+    heartbeats reporting their capacity and the number of bots they run.
+    Workers that missed heartbeats for `heartbeat_timeout` seconds, or failed
+    a launch, are left out until their next heartbeat.
+
+    Placement is either "least-loaded" or "hash", a consistent hash of the
+    room URL over the healthy workers. Either way launches fail over to the
+    next candidate if a worker is unreachable or rejects the session.
+
+    A launch only fails over when the worker surely didn't start the bot: it
+    couldn't be reached, or it answered with an error. When the request went
+    out but no answer came back (a timeout, a dropped connection), the same
+    worker is asked once more with the same `launch_id`, the room URL, which
+    the worker deduplicates on. Asking another worker could put a second bot
+    in the room, so if that fails too the launch fails with
+    LaunchOutcomeUnknown.
+    """
+
+    def __init__(
+        self,
+        aiohttp_session: aiohttp.ClientSession,
+        placement: str = "least-loaded",
+        heartbeat_timeout: float = 15.0,
+        launch_timeout: float = 10.0,
+        secret: str | None = None,
+        virtual_nodes: int = 64,
+        history_size: int = 10000,
+    ):
+        if placement not in ("least-loaded", "hash"):
+            raise ValueError(f"Unknown placement: {placement}")
+
+        self._session = aiohttp_session
+        self._placement = placement
+        self._heartbeat_timeout = heartbeat_timeout
+        self._launch_timeout = aiohttp.ClientTimeout(total=launch_timeout)
+        self._secret = secret
+        self._virtual_nodes = virtual_nodes
+        self._history_size = history_size
+
+        self._workers: Dict[str, WorkerInfo] = {}
+        self._suspect: Dict[str, float] = {}
+        self._ring: List[Tuple[int, str]] = []
+        # Bots started per room, by worker id and PID
+        self._rooms: OrderedDict[str, List[Tuple[str, int]]] = OrderedDict()
+
+        self._launched = 0
+        self._failovers = 0
+        self._retried = 0
+        self._unknown = 0
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self._secret}"} if self._secret else {}
+
+    def check_secret(self, authorization: str | None) -> bool:
+        return not self._secret or authorization == f"Bearer {self._secret}"
+
+    def heartbeat(self, worker_id: str, url: str, capacity: int, running: int):
+        url = url.rstrip("/")
+        worker = self._workers.get(worker_id)
+        if not worker or worker.url != url:
+            logger.info(f"Worker {worker_id} registered at {url}")
+            worker = WorkerInfo(worker_id=worker_id, url=url, capacity=capacity)
+            self._workers[worker_id] = worker
+            self._rebuild_ring()
+
+        worker.capacity = capacity
+        worker.running = running
+        worker.pending = 0
+        worker.last_heartbeat = time.monotonic()
+        self._suspect.pop(worker_id, None)
+
+    def healthy(self) -> List[WorkerInfo]:
+        now = time.monotonic()
+        return [
+            w
+            for w in self._workers.values()
+            if now - w.last_heartbeat < self._heartbeat_timeout and w.worker_id not in self._suspect
+        ]
+
+    def candidates(self, room_url: str) -> List[WorkerInfo]:
+        healthy = {w.worker_id: w for w in self.healthy()}
+        if self._placement == "least-loaded":
+            return sorted(healthy.values(), key=lambda w: w.load)
+
+        # Walk the ring clockwise from the room's hash, each worker once.
+        ordered = []
+        if self._ring:
+            start = bisect.bisect(self._ring, (_hash(room_url), ""))
+            for i in range(len(self._ring)):
+                worker_id = self._ring[(start + i) % len(self._ring)][1]
+                worker = healthy.get(worker_id)
+                if worker and worker not in ordered:
+                    ordered.append(worker)
+        return ordered
+
+    async def launch(self, room_url: str, token: str, **extra) -> Tuple[str, int]:
+        """Starts a bot on one of the workers, returns the worker id and the PID."""
+        job = {"room_url": room_url, "token": token, "launch_id": room_url, **extra}
+        for worker in self.candidates(room_url):
+            if worker.running + worker.pending >= worker.capacity:
+                continue
+            try:
+                status, data = await self._post_launch(worker, job)
+            except aiohttp.ClientConnectorError as e:
+                # Never got to the worker, nothing was started
+                self._fail_over(worker, e)
+                continue
+            except Exception as e:
+                logger.warning(f"No answer to the launch on worker {worker.worker_id}, asking again: {e}")
+                self._retried += 1
+                try:
+                    status, data = await self._post_launch(worker, job)
+                except Exception as e:
+                    self._suspect[worker.worker_id] = time.monotonic()
+                    worker.failures += 1
+                    self._unknown += 1
+                    raise LaunchOutcomeUnknown(
+                        f"Worker {worker.worker_id} may have started the bot, but didn't answer: {e}"
+                    )
+
+            if status == 429:
+                # Healthy but full, its next heartbeat will tell us.
+                worker.pending = worker.capacity
+                self._failovers += 1
+                continue
+            if status != 200:
+                self._fail_over(worker, Exception(f"status {status}: {data}"))
+                continue
+
+            worker.pending += 1
+            self._launched += 1
+            self._rooms.setdefault(room_url, []).append((worker.worker_id, data["pid"]))
+            while len(self._rooms) > self._history_size:
+                self._rooms.popitem(last=False)
+            return (worker.worker_id, data["pid"])
+
+        raise FleetUnavailable("No worker available to start the bot")
+
+    def count_in_room(self, room_url: str) -> int:
+        """Bots this server started in a room, rooms aren't reused so they aren't forgotten when they exit."""
+        return len(self._rooms.get(room_url, ()))
+
+    async def _post_launch(self, worker: WorkerInfo, job: dict) -> Tuple[int, object]:
+        async with self._session.post(
+            f"{worker.url}/launch",
+            json=job,
+            headers=self._headers(),
+            timeout=self._launch_timeout,
+        ) as r:
+            if r.status != 200:
+                return (r.status, await r.text())
+            return (r.status, await r.json())
+
+    def _fail_over(self, worker: WorkerInfo, e: Exception):
+        logger.warning(f"Launch on worker {worker.worker_id} failed, trying next: {e}")
+        worker.failures += 1
+        self._suspect[worker.worker_id] = time.monotonic()
+        self._failovers += 1
+
+    async def status(self, worker_id: str, pid: int) -> Optional[dict]:
+        worker = self._workers.get(worker_id)
+        if not worker:
+            return None
+        async with self._session.get(
+            f"{worker.url}/status/{pid}", headers=self._headers(), timeout=self._launch_timeout
+        ) as r:
+            if r.status == 404:
+                return None
+            if r.status != 200:
+                raise Exception(f"Worker {worker_id} status failed with {r.status}")
+            return await r.json()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        healthy = {w.worker_id for w in self.healthy()}
+        return {
+            "placement": self._placement,
+            "launched": self._launched,
+            "failovers": self._failovers,
+            "retried": self._retried,
+            "unknown_outcome": self._unknown,
+            "workers": [
+                {
+                    "worker_id": w.worker_id,
+                    "url": w.url,
+                    "healthy": w.worker_id in healthy,
+                    "capacity": w.capacity,
+                    "running": w.running,
+                    "pending": w.pending,
+                    "failures": w.failures,
+                    "last_heartbeat_age": now - w.last_heartbeat,
+                }
+                for w in self._workers.values()
+            ],
+        }
+
+    def _rebuild_ring(self):
+        self._ring = sorted(
+            (_hash(f"{worker_id}#{i}"), worker_id)
+            for worker_id in self._workers
+            for i in range(self._virtual_nodes)
+        )
+
+
+async def send_heartbeats(
+    aiohttp_session: aiohttp.ClientSession,
+    server_url: str,
+    get_state,
+    interval: float = 5.0,
+    secret: str | None = None,
+):
+    """Worker side: reports `get_state()` to the server every `interval` seconds."""
+    headers = {"Authorization": f"Bearer {secret}"} if secret else {}
+    while True:
+        try:
+            async with aiohttp_session.post(
+                f"{server_url.rstrip('/')}/workers/heartbeat",
+                json=get_state(),
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=interval),
+            ) as r:
+                if r.status != 200:
+                    logger.warning(f"Heartbeat rejected with status {r.status}")
+        except Exception as e:
+            logger.warning(f"Unable to send heartbeat: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,105 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from pipecat.frames.frames import OutputImageRawFrame
+
+
+def order_by_motion(sprites: List[OutputImageRawFrame]) -> List[OutputImageRawFrame]:
+    """
+    The distinct sprites, the first one (the bot at rest) first and the
+    others by how much they differ from it, so a higher index means more
+    movement. Every 97th byte is enough to rank them.
+    """
+    unique = list({id(sprite.image): sprite for sprite in sprites}.values())
+    rest = np.frombuffer(unique[0].image, dtype=np.uint8)[::97].astype(np.int16)
+
+    def motion(sprite: OutputImageRawFrame) -> float:
+        pixels = np.frombuffer(sprite.image, dtype=np.uint8)[::97].astype(np.int16)
+        return float(np.abs(pixels - rest).mean())
+
+    return [unique[0]] + sorted(unique[1:], key=motion)
+
+
+class LipSync:
+    """
+    Picks the sprite to show for each slice of the bot's speech from how
+    loud it is. Every chunk of TTS audio is cut into `1 / fps` windows and
+    the RMS of each is taken (in dBFS), then smoothed with a peak follower
+    that falls by `release_db_per_sec`, so the mouth closes between syllables
+    without flickering. Levels between `floor_db` and `ceiling_db` are
+    spread over `sprites`, which go from the bot at rest to the most
+    movement (see `order_by_motion()`).
+
+    The envelope carries over from one chunk to the next; call `reset()`
+    when the bot stops talking.
+    """
+
+    def __init__(
+        self,
+        sprites: List[OutputImageRawFrame],
+        *,
+        fps: float = 15.0,
+        floor_db: float = -45.0,
+        ceiling_db: float = -12.0,
+        release_db_per_sec: float = 60.0,
+    ):
+        self.sprites = sprites
+        self._window_secs = 1 / fps
+        self._floor_db = floor_db
+        self._ceiling_db = ceiling_db
+        self._release_db = release_db_per_sec * self._window_secs
+        self.reset()
+
+    def reset(self):
+        self._envelope_db = self._floor_db
+        self._index = 0
+        self._pending = np.empty(0, dtype=np.float32)
+
+    def envelope(self, audio: bytes, sample_rate: int, num_channels: int = 1) -> Tuple[np.ndarray, float]:
+        """
+        The smoothed level in dBFS of every window completed by a chunk of
+        16-bit audio, and when the first one started, in seconds from the
+        start of the chunk (windows span chunks, so it can be negative).
+        The samples of an unfinished window are kept for the next chunk.
+        """
+        samples = np.frombuffer(audio, dtype=np.int16).astype(np.float32)
+        if num_channels > 1:
+            samples = samples[: len(samples) // num_channels * num_channels]
+            samples = samples.reshape(-1, num_channels).mean(axis=1)
+        first_start = -len(self._pending) / sample_rate
+        samples = np.concatenate((self._pending, samples))
+
+        window = max(int(sample_rate * self._window_secs), 1)
+        count = len(samples) // window
+        self._pending = samples[count * window :]
+        if not count:
+            return np.empty(0, dtype=np.float32), first_start
+
+        windows = samples[: count * window].reshape(count, window)
+        rms = np.sqrt(np.einsum("ij,ij->i", windows, windows) / window)
+        levels = 20 * np.log10(np.maximum(rms, 1.0) / 32768)
+
+        # envelope[i] = max(levels[i], envelope[i - 1] - release). Adding a
+        # ramp of `release` per window turns that into a running maximum.
+        ramp = self._release_db * np.arange(1, count + 1)
+        envelope = np.maximum.accumulate(np.maximum(levels + ramp, self._envelope_db)) - ramp
+        self._envelope_db = float(envelope[-1])
+        return envelope, first_start
+
+    def frames(self, audio: bytes, sample_rate: int, num_channels: int = 1) -> List[Tuple[float, int]]:
+        """
+        When (in seconds from the start of the chunk, negative if it's
+        already due) the sprite has to change, and to which index in
+        `sprites`. Windows that keep the previous sprite are left out.
+        """
+        envelope, first_start = self.envelope(audio, sample_rate, num_channels)
+        if not len(envelope):
+            return []
+
+        level = np.clip((envelope - self._floor_db) / (self._ceiling_db - self._floor_db), 0.0, 1.0)
+        indices = np.rint(level * (len(self.sprites) - 1)).astype(np.int64)
+        changed = np.flatnonzero(indices != np.append(self._index, indices[:-1]))
+        self._index = int(indices[-1])
+        window_secs = max(int(sample_rate * self._window_secs), 1) / sample_rate
+        return [(first_start + float(i * window_secs), int(indices[i])) for i in changed]
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from prometheus_client import Histogram
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a callback scheduled at a fixed interval",
+    ["process"],
+    buckets=LAG_BUCKETS,
+)
+
+
+class LoopLagMonitor:
+    """
+    Measures how long the event loop takes to get back to a task that asked
+    to wake up every `interval` seconds. Anything that blocks the loop
+    (synchronous HTTP calls, CPU bound work, slow callbacks) shows up as lag,
+    and every request being served at that moment is delayed by as much.
+    """
+
+    def __init__(self, process: str, interval: float = 0.05):
+        self._interval = interval
+        self._histogram = EVENT_LOOP_LAG_SECONDS.labels(process)
+        self._task = None
+
+        self._samples = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "samples": self._samples,
+            "avg_lag_ms": 1000 * self._total / self._samples if self._samples else 0.0,
+            "max_lag_ms": 1000 * self._max,
+        }
+
+    async def _run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self._interval)
+            lag = max(time.monotonic() - start - self._interval, 0.0)
+            self._histogram.observe(lag)
+            self._samples += 1
+            self._total += lag
+            self._max = max(self._max, lag)
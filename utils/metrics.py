@@ -0,0 +1,42 @@
+import glob
+import os
+import re
+import tempfile
+
+# Every process (the server, the worker agents and the bots they start)
+# writes its metrics to files in this directory, and the /metrics endpoints
+# add them all up. The entry points set it before prometheus_client is
+# imported, bots inherit it from the process that starts them.
+METRICS_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "pipecat_chatbot_metrics")
+)
+os.makedirs(METRICS_DIR, exist_ok=True)
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest  # noqa: E402
+from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead  # noqa: E402
+
+
+def remove_stale_metrics():
+    """
+    Drops the live gauges of processes that are no longer running. Their
+    counters and histograms are kept, so totals never go backwards.
+    """
+    pids = set()
+    for path in glob.glob(os.path.join(METRICS_DIR, "gauge_live*.db")):
+        match = re.search(r"_(\d+)\.db$", path)
+        if match:
+            pids.add(int(match.group(1)))
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            mark_process_dead(pid, METRICS_DIR)
+        except PermissionError:
+            pass
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """The metrics of every process on this host, in Prometheus text format."""
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, path=METRICS_DIR)
+    return (generate_latest(registry), CONTENT_TYPE_LATEST)
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from pipecat.frames.frames import Frame, TTSAudioRawFrame, TTSStartedFrame, TTSStoppedFrame
+
+from loguru import logger
+
+
+@dataclass
+class Opener:
+    text: str
+    audio: bytes
+    sample_rate: int
+
+    def frames(self) -> List[Frame]:
+        # The same frames a TTS service would push, so the rest of the
+        # pipeline (the talking animation, the output transport) can't tell
+        # the difference.
+        return [
+            TTSStartedFrame(),
+            TTSAudioRawFrame(audio=self.audio, sample_rate=self.sample_rate, num_channels=1),
+            TTSStoppedFrame(),
+        ]
+
+
+class OpenerCache:
+    """
+    On-disk cache of the bot's opening line, text and PCM audio, so a session
+    can greet the participant as soon as they join instead of waiting for the
+    LLM and the TTS.
+
+    Entries are keyed on everything that changes what the opener sounds like
+    (prompt, voice, TTS parameters) and each key holds up to `variants`
+    different openers. The least recently played one is picked every time,
+    so consecutive sessions rotate through them. Files live under
+    `<cache_dir>/<key>/` so any number of bot processes can share the cache.
+    A slot whose `.lock` is older than `lock_timeout` without its `.json` was
+    left by a process that died while writing it, and is free again.
+    """
+
+    def __init__(self, cache_dir: str, variants: int = 3, lock_timeout: float = 60.0):
+        self._cache_dir = cache_dir
+        self._variants = variants
+        self._lock_timeout = lock_timeout
+        self._filling = set()
+        self._tasks = set()
+
+    @staticmethod
+    def key(*parts) -> str:
+        data = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self._cache_dir, key)
+
+    def _variant_paths(self, key: str) -> List[str]:
+        entry_dir = self._entry_dir(key)
+        try:
+            names = os.listdir(entry_dir)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(entry_dir, n) for n in names if n.endswith(".json")]
+
+    def _claimed(self, base: str) -> bool:
+        if os.path.exists(f"{base}.json"):
+            return True
+        try:
+            return time.time() - os.path.getmtime(f"{base}.lock") < self._lock_timeout
+        except FileNotFoundError:
+            return False
+
+    def count(self, key: str) -> int:
+        """Variants cached or being written by some process right now."""
+        entry_dir = self._entry_dir(key)
+        return sum(self._claimed(os.path.join(entry_dir, str(i))) for i in range(self._variants))
+
+    def get(self, key: str) -> Optional[Opener]:
+        paths = self._variant_paths(key)
+        if not paths:
+            return None
+
+        try:
+            path = min(paths, key=os.path.getmtime)
+            with open(path) as f:
+                meta = json.load(f)
+            with open(path[: -len(".json")] + ".pcm", "rb") as f:
+                audio = f.read()
+            # Mark it as just played so the next session gets another one.
+            os.utime(path)
+        except OSError as e:
+            logger.warning(f"Unable to read cached opener: {e}")
+            return None
+
+        return Opener(text=meta["text"], audio=audio, sample_rate=meta["sample_rate"])
+
+    def put(self, key: str, text: str, audio: bytes, sample_rate: int) -> bool:
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        # Claim a free variant slot. Other processes may be filling the same
+        # key, the lock file makes sure we don't write to the same slot.
+        for index in range(self._variants):
+            base = os.path.join(entry_dir, str(index))
+            if self._claimed(base):
+                continue
+            # Whoever left this lock behind is gone
+            try:
+                os.remove(f"{base}.lock")
+            except FileNotFoundError:
+                pass
+            try:
+                fd = os.open(f"{base}.lock", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            os.close(fd)
+            try:
+                with open(f"{base}.pcm", "wb") as f:
+                    f.write(audio)
+                with open(f"{base}.json.tmp", "w") as f:
+                    json.dump({"text": text, "sample_rate": sample_rate}, f)
+                # The JSON file is what makes the variant visible, write it last.
+                os.replace(f"{base}.json.tmp", f"{base}.json")
+            except OSError as e:
+                logger.warning(f"Unable to cache opener: {e}")
+                os.remove(f"{base}.lock")
+                return False
+            return True
+        return False
+
+    def fill_in_background(
+        self, key: str, generate: Callable[[], Awaitable[Tuple[str, bytes, int]]]
+    ):
+        """Generates one more variant for `key` if it doesn't have enough yet."""
+        if key in self._filling or self.count(key) >= self._variants:
+            return
+
+        async def fill():
+            try:
+                text, audio, sample_rate = await generate()
+                if text and audio:
+                    self.put(key, text, audio, sample_rate)
+                    logger.debug(f"Cached new opener: [{text}]")
+            except Exception as e:
+                logger.warning(f"Unable to generate opener: {e}")
+            finally:
+                self._filling.discard(key)
+
+        self._filling.add(key)
+        task = asyncio.create_task(fill())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+async def generate_cartesia_opener(
+    messages: List[dict],
+    *,
+    openai_api_key: str,
+    llm_model: str,
+    cartesia_api_key: str,
+    voice_id: str,
+    tts_model: str = "sonic-english",
+    sample_rate: int = 24000,
+    language: str = "en",
+    speed: str | float = "",
+    emotion: List[str] | None = None,
+) -> Tuple[str, bytes, int]:
+    """Asks the LLM for an opening line and synthesizes it with Cartesia."""
+    from cartesia import AsyncCartesia
+    from openai import AsyncOpenAI
+
+    llm = AsyncOpenAI(api_key=openai_api_key)
+    try:
+        completion = await llm.chat.completions.create(model=llm_model, messages=messages)
+        text = completion.choices[0].message.content.strip()
+    finally:
+        await llm.close()
+
+    voice_controls = {}
+    if speed:
+        voice_controls["speed"] = speed
+    if emotion:
+        voice_controls["emotion"] = emotion
+
+    tts = AsyncCartesia(api_key=cartesia_api_key)
+    try:
+        output = await tts.tts.sse(
+            model_id=tts_model,
+            transcript=text,
+            voice_id=voice_id,
+            output_format={"container": "raw", "encoding": "pcm_s16le", "sample_rate": sample_rate},
+            language=language,
+            stream=False,
+            _experimental_voice_controls=voice_controls or None,
+        )
+    finally:
+        await tts.close()
+
+    return (text, output["audio"], sample_rate)
@@ -0,0 +1,177 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import string
+import unicodedata
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PERSONAS_DIR = os.path.join(root_dir, "personas")
+
+# What a persona's session prompt can refer to, e.g. "Today is {weekday}."
+SESSION_VARIABLES = ("date", "weekday", "time")
+
+PERSONA_FIELDS = {"name", "description", "prompt", "session_prompt", "voice_id"}
+NAME_PATTERN = re.compile(r"^[a-z0-9_-]+$")
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    The same prompt always gives the same bytes, however the file was
+    edited: NFC, Unix line endings, no trailing spaces.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def session_variables(now: Optional[datetime] = None) -> Dict[str, str]:
+    now = now or datetime.now()
+    return {
+        "date": now.strftime("%B %d, %Y"),
+        "weekday": now.strftime("%A"),
+        "time": now.strftime("%H:%M"),
+    }
+
+
+@dataclass(frozen=True)
+class Persona:
+    """
+    Who the bot is in a session. The messages it starts with are laid out
+    for the LLM providers' prompt caching, which only reuses the part of a
+    prompt that is byte for byte the same as a previous one, from the start:
+    the persona's `prompt` comes first and never changes between sessions,
+    what does (`session_prompt`) goes in a message of its own after it.
+    """
+
+    name: str
+    prompt: str
+    description: str = ""
+    session_prompt: str = ""
+    voice_id: Optional[str] = None
+
+    def prefix(self) -> List[dict]:
+        """The messages every session of this persona starts with."""
+        return [{"role": "system", "content": self.prompt}]
+
+    def messages(self, now: Optional[datetime] = None) -> List[dict]:
+        """A new list of messages for a session, to be appended to."""
+        messages = self.prefix()
+        if self.session_prompt:
+            content = self.session_prompt.format(**session_variables(now))
+            messages.append({"role": "system", "content": content})
+        return messages
+
+    @property
+    def prefix_hash(self) -> str:
+        """Same hash, same cached prefix. Handy to compare workers."""
+        data = json.dumps(self.prefix(), ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def load_persona(path: str) -> Persona:
+    """Reads and validates a persona file, raises with what is wrong with it."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        raise Exception(f"Persona {path} can't be read: {e}")
+    if not isinstance(data, dict):
+        raise Exception(f"Persona {path} must be a JSON object")
+
+    unknown = set(data) - PERSONA_FIELDS
+    if unknown:
+        raise Exception(f"Persona {path} has unknown fields: {', '.join(sorted(unknown))}")
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    if data.get("name", name) != name:
+        raise Exception(f"Persona {path} is named {data['name']!r}, the file name says {name!r}")
+    if not NAME_PATTERN.match(name):
+        raise Exception(f"Persona name {name!r} can only have lowercase letters, digits, - and _")
+
+    for field in ("prompt", "description", "session_prompt"):
+        if not isinstance(data.get(field, ""), str):
+            raise Exception(f"Persona {path}: {field} must be a string")
+    if data.get("voice_id") is not None and not isinstance(data["voice_id"], str):
+        raise Exception(f"Persona {path}: voice_id must be a string")
+
+    prompt = normalize_prompt(data.get("prompt", ""))
+    if not prompt:
+        raise Exception(f"Persona {path} has no prompt")
+    # Anything that changes between sessions would change the prefix
+    placeholders = re.findall(r"\{(\w+)\}", prompt)
+    if placeholders:
+        raise Exception(
+            f"Persona {path}: the prompt is the same for every session, "
+            f"put {{{placeholders[0]}}} in session_prompt instead"
+        )
+
+    session_prompt = normalize_prompt(data.get("session_prompt", ""))
+    try:
+        fields = [f for _, f, _, _ in string.Formatter().parse(session_prompt) if f is not None]
+    except ValueError as e:
+        raise Exception(f"Persona {path}: bad session_prompt: {e}")
+    for field in fields:
+        if field not in SESSION_VARIABLES:
+            raise Exception(
+                f"Persona {path}: unknown session variable {{{field}}}, "
+                f"expected one of {', '.join(SESSION_VARIABLES)}"
+            )
+
+    return Persona(
+        name=name,
+        prompt=prompt,
+        description=data.get("description", ""),
+        session_prompt=session_prompt,
+        voice_id=data.get("voice_id"),
+    )
+
+
+class PersonaRegistry:
+    """
+    Every persona in `personas_dir` (one JSON file each), loaded and
+    validated once when the process starts, so a broken file stops the
+    server or the worker instead of the session that uses it.
+
+        personas = PersonaRegistry(default="bakery")
+        persona = personas.get(request_persona)  # None for the default
+        context = OpenAILLMContext(persona.messages())
+    """
+
+    def __init__(self, personas_dir: str = DEFAULT_PERSONAS_DIR, default: Optional[str] = None):
+        self._personas: Dict[str, Persona] = {}
+        for path in sorted(glob.glob(os.path.join(personas_dir, "*.json"))):
+            persona = load_persona(path)
+            self._personas[persona.name] = persona
+        if not self._personas:
+            raise Exception(f"No personas in {personas_dir}")
+
+        if default is not None and default not in self._personas:
+            raise Exception(f"Default persona {default!r} not found in {personas_dir}")
+        self.default = default
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._personas
+
+    def __len__(self) -> int:
+        return len(self._personas)
+
+    def names(self) -> List[str]:
+        return list(self._personas)
+
+    def get(self, name: Optional[str] = None) -> Persona:
+        name = name or self.default
+        if name not in self._personas:
+            raise KeyError(f"Unknown persona: {name}")
+        return self._personas[name]
+
+    def stats(self) -> dict:
+        return {
+            name: {"description": persona.description, "prefix_hash": persona.prefix_hash}
+            for name, persona in self._personas.items()
+        }
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+
+from typing import Dict, Optional
+
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.processors.frame_processor import FrameProcessor
+
+from utils.bot_telemetry import TELEMETRY_DIR, remove_report, write_report
+
+from loguru import logger
+
+
+def processor_queue_depth(processor: FrameProcessor) -> int:
+    """
+    Frames waiting in the queues of a processor: its input and push queues,
+    and those of its own (the output transport's audio and camera queues).
+    Interruptions replace the queues, so they are looked up every time.
+    """
+    return sum(value.qsize() for value in vars(processor).values() if isinstance(value, asyncio.Queue))
+
+
+def pipeline_queue_depth(pipeline: Pipeline) -> tuple:
+    """Frames waiting in the whole pipeline, and the processor with the most."""
+    total = 0
+    deepest, deepest_depth = None, 0
+    for processor in pipeline._processors:
+        if isinstance(processor, Pipeline):
+            depth, name, depth_there = pipeline_queue_depth(processor)
+            if depth_there > deepest_depth:
+                deepest, deepest_depth = name, depth_there
+        else:
+            depth = processor_queue_depth(processor)
+            if depth > deepest_depth:
+                deepest, deepest_depth = processor.name, depth
+        total += depth
+    return total, deepest, deepest_depth
+
+
+class QueueDepthReporter:
+    """
+    Reports how many frames are waiting in the pipelines of this process to
+    the server, which shows them next to the process's CPU and memory (see
+    utils/bot_telemetry.py). Every `interval` seconds the queues of every
+    watched pipeline are added up and written to `<directory>/<pid>.json`.
+
+        queue_reporter.watch(room_url, pipeline)
+        try:
+            await runner.run(task)
+        finally:
+            queue_reporter.unwatch(room_url)
+
+    A pipeline that keeps falling behind (a slow TTS, a blocked event loop)
+    shows up as a growing queue long before the audio gets choppy.
+    """
+
+    def __init__(self, directory: str = TELEMETRY_DIR, interval: float = 1.0):
+        self._directory = directory
+        self._interval = interval
+        self._pipelines: Dict[str, Pipeline] = {}
+        self._max_depths: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, session: str, pipeline: Pipeline):
+        self._pipelines[session] = pipeline
+        self._max_depths[session] = 0
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    def unwatch(self, session: str):
+        self._pipelines.pop(session, None)
+        self._max_depths.pop(session, None)
+        if not self._pipelines and self._task:
+            self._task.cancel()
+            self._task = None
+            remove_report(os.getpid(), self._directory)
+
+    def report(self) -> dict:
+        sessions = {}
+        for session, pipeline in self._pipelines.items():
+            depth, deepest, deepest_depth = pipeline_queue_depth(pipeline)
+            self._max_depths[session] = max(self._max_depths[session], depth)
+            sessions[session] = {
+                "queue_depth": depth,
+                "max_queue_depth": self._max_depths[session],
+                "deepest": deepest if deepest_depth else None,
+            }
+        return {"t": round(time.time(), 3), "sessions": sessions}
+
+    async def _run(self):
+        while True:
+            try:
+                write_report(os.getpid(), self.report(), self._directory)
+            except Exception as e:
+                logger.error(f"Unable to report queue depths: {e}")
+            await asyncio.sleep(self._interval)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+from pipecat.transports.services.helpers.daily_rest import DailyRESTHelper, DailyRoomParams
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PooledRoom:
+    url: str
+    bot_token: str
+    user_token: str
+    expires_at: float
+
+    @property
+    def user_url(self) -> str:
+        return f"{self.url}?t={self.user_token}"
+
+
+class RoomPool:
+    """
+    Keeps a stock of Daily rooms created ahead of time, each with a bot token
+    and a user token already minted, so starting a session doesn't have to
+    wait for the Daily REST API.
+
+    The pool is refilled up to `high_watermark` whenever it drops below
+    `low_watermark`, with at most `max_concurrency` rooms being created at
+    once. Rooms whose room or token expiry is closer than `min_remaining`
+    seconds are evicted, so a session always gets at least that long.
+    Evicted rooms, and the rooms still in the pool when it is stopped, are
+    deleted from Daily.
+    """
+
+    def __init__(
+        self,
+        helper: DailyRESTHelper,
+        room_params: Callable[[float], DailyRoomParams],
+        low_watermark: int = 2,
+        high_watermark: int = 5,
+        lifetime: float = 60 * 60,
+        min_remaining: float = 15 * 60,
+        max_concurrency: int = 2,
+        sweep_interval: float = 30,
+    ):
+        self._helper = helper
+        self._room_params = room_params
+        self._low_watermark = low_watermark
+        self._high_watermark = max(high_watermark, low_watermark)
+        self._lifetime = lifetime
+        self._min_remaining = min(min_remaining, lifetime)
+        self._sweep_interval = sweep_interval
+
+        self._rooms: deque[PooledRoom] = deque()
+        self._creating = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._refill_event = asyncio.Event()
+        self._refill_task = None
+        self._stopping = False
+        self._create_tasks = set()
+        self._delete_tasks = set()
+
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+        self._failed = 0
+        self._released = 0
+
+    async def start(self):
+        self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self, timeout: float = 10):
+        # Not cancelled: wait_for() swallows the cancellation when the event
+        # is set at the same time, and the loop would go on
+        self._stopping = True
+        self._refill_event.set()
+        if self._refill_task:
+            await self._refill_task
+            self._refill_task = None
+
+        for task in list(self._create_tasks):
+            task.cancel()
+
+        # Nobody will hand these out anymore
+        while self._rooms:
+            self._delete(self._rooms.popleft())
+        if self._delete_tasks:
+            _, pending = await asyncio.wait(self._delete_tasks, timeout=timeout)
+            if pending:
+                logger.warning(f"{len(pending)} pooled rooms not deleted before shutdown")
+
+    async def acquire(self) -> PooledRoom:
+        self._evict_expiring()
+
+        if self._rooms:
+            self._hits += 1
+            room = self._rooms.popleft()
+        else:
+            self._misses += 1
+            room = await self._create_room()
+
+        self._refill_event.set()
+        return room
+
+    def release(self, room: PooledRoom):
+        """Gives back a room no bot was started in, it is handed out again."""
+        if room.expires_at < time.time() + self._min_remaining:
+            self._evict(room)
+            return
+        self._released += 1
+        # Oldest first, for eviction
+        index = next((i for i, r in enumerate(self._rooms) if r.expires_at > room.expires_at), len(self._rooms))
+        self._rooms.insert(index, room)
+
+    def stats(self) -> dict:
+        acquired = self._hits + self._misses
+        return {
+            "ready": len(self._rooms),
+            "creating": self._creating,
+            "low_watermark": self._low_watermark,
+            "high_watermark": self._high_watermark,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evicted": self._evicted,
+            "released": self._released,
+            "failed": self._failed,
+            "hit_rate": self._hits / acquired if acquired else 0.0,
+        }
+
+    async def _create_room(self) -> PooledRoom:
+        now = time.time()
+        room = await self._helper.create_room(self._room_params(now + self._lifetime))
+        if not room.url:
+            raise Exception("Failed to get room URL from Daily.co API")
+
+        bot_token, user_token = await asyncio.gather(
+            self._helper.get_token(room.url, self._lifetime, owner=True),
+            self._helper.get_token(room.url, self._lifetime, owner=False),
+        )
+        if not bot_token or not user_token:
+            raise Exception(f"Failed to get tokens for room: {room.url}")
+
+        # Tokens were minted after the room, so the room expiry comes first
+        # unless the API gave us something else, or no expiry at all.
+        expires_at = now + self._lifetime
+        if room.config.exp is not None:
+            expires_at = min(room.config.exp, expires_at)
+        return PooledRoom(room.url, bot_token, user_token, expires_at)
+
+    async def _create_pooled_room(self):
+        try:
+            async with self._semaphore:
+                room = await self._create_room()
+            self._rooms.append(room)
+        except Exception as e:
+            self._failed += 1
+            logger.error(f"Unable to pre-create room: {e}")
+            # Back off a bit so an API outage doesn't turn into a busy loop.
+            await asyncio.sleep(1)
+        finally:
+            self._creating -= 1
+            self._refill_event.set()
+
+    def _evict_expiring(self):
+        deadline = time.time() + self._min_remaining
+        while self._rooms and self._rooms[0].expires_at < deadline:
+            self._evict(self._rooms.popleft())
+
+    def _evict(self, room: PooledRoom):
+        self._evicted += 1
+        logger.info(f"Evicting pooled room close to expiry: {room.url}")
+        self._delete(room)
+
+    def _delete(self, room: PooledRoom):
+        task = asyncio.create_task(self._delete_room(room))
+        self._delete_tasks.add(task)
+        task.add_done_callback(self._delete_tasks.discard)
+
+    async def _delete_room(self, room: PooledRoom):
+        try:
+            await self._helper.delete_room_by_url(room.url)
+        except Exception as e:
+            logger.warning(f"Unable to delete pooled room {room.url}: {e}")
+
+    async def _refill_loop(self):
+        while not self._stopping:
+            # Rooms are appended in creation order, so the oldest (the first
+            # to expire) are always at the front.
+            self._evict_expiring()
+
+            available = len(self._rooms) + self._creating
+            if available < self._low_watermark:
+                for _ in range(self._high_watermark - available):
+                    self._creating += 1
+                    task = asyncio.create_task(self._create_pooled_room())
+                    self._create_tasks.add(task)
+                    task.add_done_callback(self._create_tasks.discard)
+
+            try:
+                await asyncio.wait_for(self._refill_event.wait(), self._sweep_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_event.clear()
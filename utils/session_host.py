@@ -0,0 +1,128 @@
+import asyncio
+import itertools
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+from pipecat.pipeline.runner import PipelineRunner
+
+from loguru import logger
+
+from utils.shared_vad import SharedSileroVAD
+
+
+@dataclass
+class HostedSession:
+    session_id: int
+    room_url: str
+    runner: PipelineRunner
+    started_at: float = field(default_factory=time.time)
+    ended_at: Optional[float] = None
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def status(self) -> str:
+        return "running" if self.ended_at is None else "finished"
+
+
+class SessionHost:
+    """
+    Runs many bot sessions on this process' event loop, each one with its own
+    PipelineTask (and so its own transport, LLM context and services). What is
+    immutable is shared: the bot module (and its sprites) is imported once and
+    all sessions use the same Silero ONNX model, each with its own state.
+
+    `run_bot` is the bot module's entry point, called as
+    `run_bot(room_url, token, vad_analyzer=..., runner=...)`. With
+    `batch_vad` the sessions' VAD chunks are run as batched inferences.
+    """
+
+    def __init__(
+        self,
+        run_bot: Callable[..., Awaitable],
+        max_sessions: int = 10,
+        history_size: int = 1000,
+        on_session_end: Optional[Callable[[HostedSession], None]] = None,
+        batch_vad: bool = False,
+    ):
+        self._run_bot = run_bot
+        self._max_sessions = max_sessions
+        self._history_size = history_size
+        self._on_session_end = on_session_end
+        self._vad = SharedSileroVAD(batched=batch_vad)
+
+        self._ids = itertools.count(1)
+        self._running: Dict[int, HostedSession] = {}
+        self._finished: OrderedDict[int, HostedSession] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+    def has_capacity(self) -> bool:
+        return len(self._running) < self._max_sessions
+
+    def start(self, room_url: str, token: str, **kwargs) -> HostedSession:
+        if not self.has_capacity():
+            raise Exception(f"Already hosting {self._max_sessions} sessions")
+
+        session = HostedSession(
+            session_id=next(self._ids),
+            room_url=room_url,
+            # Signals are handled by whoever owns the process, not per session.
+            runner=PipelineRunner(handle_sigint=False),
+        )
+        self._running[session.session_id] = session
+        session.task = asyncio.create_task(self._run(session, token, **kwargs))
+        return session
+
+    def get(self, session_id: int) -> Optional[HostedSession]:
+        return self._running.get(session_id) or self._finished.get(session_id)
+
+    async def stop(self, session_id: int):
+        session = self._running.get(session_id)
+        if session:
+            # Cancels this session's pipeline only, leaving the room cleanly.
+            await session.runner.cancel()
+
+    async def stop_all(self):
+        await asyncio.gather(*[self.stop(s) for s in list(self._running)])
+        tasks = [s.task for s in self._running.values() if s.task]
+        if tasks:
+            await asyncio.wait(tasks, timeout=5)
+        for task in tasks:
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "max_sessions": self._max_sessions,
+            "history": len(self._finished),
+            "vad": self._vad.stats(),
+        }
+
+    async def _run(self, session: HostedSession, token: str, **kwargs):
+        try:
+            await self._run_bot(
+                session.room_url,
+                token,
+                vad_analyzer=self._vad.create_analyzer(),
+                runner=session.runner,
+                **kwargs,
+            )
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # One broken session must not take the others down.
+            logger.exception(f"Session {session.session_id} failed: {e}")
+            session.error = str(e)
+        finally:
+            session.ended_at = time.time()
+            self._running.pop(session.session_id, None)
+            self._finished[session.session_id] = session
+            while len(self._finished) > self._history_size:
+                self._finished.popitem(last=False)
+            if self._on_session_end:
+                self._on_session_end(session)
@@ -0,0 +1,260 @@
+import asyncio
+import base64
+import json
+import resource
+import signal
+import time
+
+from typing import Optional
+
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    BotStoppedSpeakingFrame,
+    EndFrame,
+    Frame,
+    TranscriptionFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+from loguru import logger
+
+from prometheus_client import Counter, Histogram
+
+SESSIONS_ENDED = Counter("bot_sessions_ended_total", "Bot sessions, by why they ended", ["reason"])
+SESSION_SECONDS = Histogram(
+    "bot_session_seconds",
+    "How long bot sessions lasted, by why they ended",
+    ["reason"],
+    buckets=(10, 30, 60, 120, 300, 600, 900, 1800, 3600),
+)
+RECLAIMED_SECONDS = Counter(
+    "bot_reclaimed_seconds_total",
+    "Bot time given back by ending sessions before their meeting token expired",
+    ["reason"],
+)
+RECLAIMED_RSS_BYTES = Counter(
+    "bot_reclaimed_rss_bytes_total",
+    "Resident memory of the bot processes that exited at the end of their session",
+    ["reason"],
+)
+
+
+def token_expiry(token: Optional[str]) -> Optional[float]:
+    """The `exp` claim of a Daily meeting token (a JWT), if it has one."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except Exception:
+        return None
+
+
+def process_rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def record_exit(reason: str):
+    """For bot processes that exit with their session: their memory is given back."""
+    RECLAIMED_RSS_BYTES.labels(reason).inc(process_rss_bytes())
+
+
+class SessionLifetime:
+    """
+    Ends a bot session, in order (an EndFrame, so whatever the bot is saying
+    is played out and every processor stops), when:
+
+    - the participant leaves, or the bot is no longer in the call
+    - nobody has spoken for `idle_secs`, counting from the start of the
+      session, so a participant that never joins doesn't keep the bot either
+    - the session has lasted `max_duration_secs`
+
+    A bot in a process of its own can also `end_on_signals()`: SIGTERM (the
+    server draining its bots) or Ctrl-C end the session once the current turn
+    is over, so nobody is cut off mid-sentence.
+
+    If the pipeline hasn't finished `end_timeout` seconds after the EndFrame
+    it is cancelled. Zero disables a limit. Why each session ended, how long
+    it lasted and how long it would still have held on to its room (until
+    the meeting token expires) are exported to /metrics.
+
+        lifetime = SessionLifetime(idle_secs=120, max_duration_secs=1800)
+        pipeline = Pipeline([transport.input(), lifetime.probe(), ...])
+        task = PipelineTask(pipeline)
+        lifetime.start(task)
+        await runner.run(task)
+        await lifetime.stop()
+    """
+
+    def __init__(
+        self,
+        *,
+        idle_secs: float = 0.0,
+        max_duration_secs: float = 0.0,
+        end_timeout: float = 10.0,
+        expires_at: Optional[float] = None,
+    ):
+        self._task: Optional[PipelineTask] = None
+        self._idle_secs = idle_secs
+        self._max_duration_secs = max_duration_secs
+        self._end_timeout = end_timeout
+        self._expires_at = expires_at
+
+        self._started_at = time.monotonic()
+        self._last_activity = self._started_at
+        self._user_speaking = False
+        self._bot_speaking = False
+        # The user has said something the bot hasn't started answering yet
+        self._awaiting_answer = False
+        self._watchdog: Optional[asyncio.Task] = None
+        self._end_task: Optional[asyncio.Task] = None
+        self._signal_task: Optional[asyncio.Task] = None
+        self._signals = ()
+
+        self.reason: Optional[str] = None
+        self._ended_at: Optional[float] = None
+        self._reclaimed_secs = 0.0
+
+    def probe(self) -> "SessionActivityProbe":
+        return SessionActivityProbe(self)
+
+    def start(self, task: PipelineTask):
+        self._task = task
+        self._started_at = time.monotonic()
+        self._last_activity = self._started_at
+        self._watchdog = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """Call once the pipeline is done. Records the session if nothing ended it."""
+        loop = asyncio.get_running_loop()
+        for sig in self._signals:
+            loop.remove_signal_handler(sig)
+        self._signals = ()
+        for task in (self._watchdog, self._end_task, self._signal_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._watchdog = None
+        self._end_task = None
+        self._signal_task = None
+        if not self.reason:
+            self._record("finished")
+
+    async def end(self, reason: str):
+        """Ends the session, the first reason given is the one recorded."""
+        if self.reason or not self._task:
+            return
+        self._record(reason)
+        logger.info(f"Ending session ({reason}) after {self._ended_at - self._started_at:.0f}s")
+        await self._task.queue_frame(EndFrame())
+        self._end_task = asyncio.create_task(self._cancel_if_stuck())
+
+    async def end_after_turn(self, reason: str, max_wait_secs: float):
+        """
+        Ends the session once nobody is speaking and the bot has answered
+        what the user last said, or after `max_wait_secs` in any case.
+        """
+        deadline = time.monotonic() + max_wait_secs
+        while not self.reason and time.monotonic() < deadline:
+            if not (self._user_speaking or self._bot_speaking or self._awaiting_answer):
+                break
+            await asyncio.sleep(0.1)
+        await self.end(reason)
+
+    def end_on_signals(self, max_wait_secs: float, reason: str = "drain"):
+        """
+        Instead of the runner cancelling the pipeline on SIGINT and SIGTERM
+        (use PipelineRunner(handle_sigint=False)), the first one ends the
+        session after the current turn, a second one right away.
+        """
+        loop = asyncio.get_running_loop()
+        self._signals = (signal.SIGINT, signal.SIGTERM)
+        for sig in self._signals:
+            loop.add_signal_handler(sig, self._on_signal, reason, max_wait_secs)
+
+    def stats(self) -> dict:
+        now = self._ended_at or time.monotonic()
+        return {
+            "reason": self.reason,
+            "duration_secs": round(now - self._started_at, 1),
+            "idle_secs": round(now - self._last_activity, 1),
+            "reclaimed_secs": round(self._reclaimed_secs),
+        }
+
+    def on_frame(self, frame: Frame):
+        if isinstance(frame, UserStartedSpeakingFrame):
+            self._user_speaking = True
+        elif isinstance(frame, UserStoppedSpeakingFrame):
+            self._user_speaking = False
+            self._awaiting_answer = True
+        elif isinstance(frame, BotStartedSpeakingFrame):
+            self._bot_speaking = True
+            self._awaiting_answer = False
+        elif isinstance(frame, BotStoppedSpeakingFrame):
+            self._bot_speaking = False
+        elif not isinstance(frame, TranscriptionFrame):
+            return
+        self._last_activity = time.monotonic()
+
+    def _record(self, reason: str):
+        self.reason = reason
+        self._ended_at = time.monotonic()
+        if self._expires_at:
+            self._reclaimed_secs = max(self._expires_at - time.time(), 0.0)
+        SESSIONS_ENDED.labels(reason).inc()
+        SESSION_SECONDS.labels(reason).observe(self._ended_at - self._started_at)
+        RECLAIMED_SECONDS.labels(reason).inc(self._reclaimed_secs)
+
+    async def _watch(self):
+        while True:
+            now = time.monotonic()
+            deadlines = []
+            if self._max_duration_secs:
+                deadlines.append(("max_duration", self._started_at + self._max_duration_secs))
+            if self._idle_secs:
+                if self._user_speaking or self._bot_speaking:
+                    self._last_activity = now
+                deadlines.append(("idle", self._last_activity + self._idle_secs))
+            if not deadlines:
+                return
+
+            reason, deadline = min(deadlines, key=lambda d: d[1])
+            if deadline <= now:
+                await self.end(reason)
+                return
+            # Check at least every second, the idle deadline moves while someone speaks
+            await asyncio.sleep(min(deadline - now, 1.0))
+
+    def _on_signal(self, reason: str, max_wait_secs: float):
+        if self._signal_task and not self._signal_task.done():
+            logger.warning("Asked again to end the session, not waiting for the turn")
+            self._signal_task.cancel()
+            self._signal_task = asyncio.create_task(self.end(reason))
+        elif not self._signal_task:
+            logger.info(f"Ending the session after the current turn (at most {max_wait_secs:.0f}s)")
+            self._signal_task = asyncio.create_task(self.end_after_turn(reason, max_wait_secs))
+
+    async def _cancel_if_stuck(self):
+        await asyncio.sleep(self._end_timeout)
+        if not self._task.has_finished():
+            logger.warning(f"Session didn't end {self._end_timeout}s after EndFrame, cancelling")
+            await self._task.cancel()
+
+
+class SessionActivityProbe(FrameProcessor):
+    """Goes right after the input transport, sees both user and bot speaking frames."""
+
+    def __init__(self, lifetime: SessionLifetime):
+        super().__init__()
+        self._lifetime = lifetime
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        self._lifetime.on_frame(frame)
+        await self.push_frame(frame, direction)
@@ -0,0 +1,345 @@
+import asyncio
+import glob
+import gzip
+import json
+import os
+import time
+import uuid
+import zlib
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    BotStoppedSpeakingFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    StartInterruptionFrame,
+    TextFrame,
+    TranscriptionFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+from loguru import logger
+
+from prometheus_client import Counter
+
+EVENTS = Counter(
+    "bot_session_log_events_total",
+    "Session events, written to the session log or dropped because its ring was full",
+    ["outcome"],
+)
+
+# The frames that are recorded, and as what. Everything else is only a
+# dictionary lookup away from being passed on.
+FRAME_EVENTS = {
+    UserStartedSpeakingFrame: "user_started_speaking",
+    UserStoppedSpeakingFrame: "user_stopped_speaking",
+    TranscriptionFrame: "transcript",
+    LLMFullResponseStartFrame: "llm_response_started",
+    LLMFullResponseEndFrame: "llm_response",
+    TTSStartedFrame: "tts_started",
+    TTSStoppedFrame: "tts_stopped",
+    BotStartedSpeakingFrame: "bot_started_speaking",
+    BotStoppedSpeakingFrame: "bot_stopped_speaking",
+    StartInterruptionFrame: "interruption",
+}
+
+OPEN_SUFFIX = ".open"
+
+
+class SessionRecorder:
+    """
+    Records what happens in one session: transcripts, the LLM's responses,
+    TTS and speaking boundaries and interruptions. Events are appended to a
+    ring (a bounded deque, appending never blocks or takes a lock) and
+    written out by the SessionLog in the background. If the writer falls
+    behind, the oldest events are dropped and counted.
+
+    It has to see the frames after the input transport, the LLM and the TTS
+    service. The bots pass `observe` to the turn metrics' probes, which are
+    there already, rather than adding processors (every frame waits in the
+    queues of each one):
+
+        turn_metrics.probe(recorder.observe)
+
+    `probe()` gives a processor of its own instead. A frame is recorded
+    once, by the first probe that sees it.
+    """
+
+    def __init__(self, log: "SessionLog", session_id: str, ring_size: int):
+        self.session_id = session_id
+        self._log = log
+        self._ring: deque = deque(maxlen=ring_size)
+        self._seen: deque = deque(maxlen=16)
+        self._text_probe: Optional[FrameProcessor] = None
+        self._response: List[str] = []
+        self.closed = False
+
+        self.events = 0
+        self.dropped = 0
+
+    def probe(self) -> "SessionEventProbe":
+        return SessionEventProbe(self)
+
+    def record(self, event: str, **fields):
+        if len(self._ring) == self._ring.maxlen:
+            self.dropped += 1
+            EVENTS.labels("dropped").inc()
+        self._ring.append((time.time(), event, fields))
+        self.events += 1
+
+    def observe(self, frame: Frame, probe: FrameProcessor):
+        event = FRAME_EVENTS.get(type(frame))
+        if event is None:
+            if probe is self._text_probe and type(frame) is TextFrame:
+                self._response.append(frame.text)
+            return
+        # Frames go through every probe
+        if frame.id in self._seen:
+            return
+        self._seen.append(frame.id)
+
+        if event == "transcript":
+            self.record(event, text=frame.text, user_id=frame.user_id)
+        elif event == "llm_response_started":
+            # The LLM's text is collected by the probe right after it
+            self._text_probe = probe
+            self._response = []
+            self.record(event)
+        elif event == "llm_response":
+            self._text_probe = None
+            self.record(event, text="".join(self._response))
+        elif event == "interruption":
+            if self._text_probe:
+                self._text_probe = None
+                self.record("llm_response", text="".join(self._response), interrupted=True)
+            self.record(event)
+        else:
+            self.record(event)
+
+    def drain(self) -> list:
+        """The events recorded since the last call, oldest first."""
+        events = []
+        for _ in range(len(self._ring)):
+            events.append(self._ring.popleft())
+        return events
+
+    async def close(self, **fields):
+        """Records the end of the session and waits for its events to be written."""
+        self.record("session_ended", **fields)
+        self.closed = True
+        await self._log.flush()
+
+    def stats(self) -> dict:
+        return {"session_id": self.session_id, "events": self.events, "dropped": self.dropped}
+
+
+class SessionEventProbe(FrameProcessor):
+    def __init__(self, recorder: SessionRecorder):
+        super().__init__()
+        self._recorder = recorder
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        self._recorder.observe(frame, self)
+
+        await self.push_frame(frame, direction)
+
+
+class SessionLog:
+    """
+    Writes the events of every session of this process to gzipped JSONL
+    segments in `directory`, one event per line:
+
+        {"t": 1730710800.12, "session": "3f2a...", "event": "transcript", "text": "..."}
+
+    Every `flush_secs` the rings of all the recorders are drained and the
+    batch is serialized, compressed and written on a thread of its own, so
+    the event loop (and the audio) never waits for it. A segment is named
+    `*.jsonl.gz.open` while it's written, and renamed to `*.jsonl.gz` once
+    it reaches `max_segment_bytes` (compressed) or `max_segment_secs`. Every
+    batch is flushed, so an open segment can be read too.
+
+        session_log = SessionLog("logs/sessions")
+        recorder = session_log.recorder(room_url=room_url)
+        pipeline = Pipeline([transport.input(), turn_metrics.probe(recorder.observe), ...])
+        ...
+        await recorder.close(reason="participant_left")
+        await session_log.stop()  # when the process exits
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        max_segment_bytes: int = 16 * 1024 * 1024,
+        max_segment_secs: float = 600.0,
+        flush_secs: float = 1.0,
+        ring_size: int = 4096,
+    ):
+        self._directory = directory
+        self._max_segment_bytes = max_segment_bytes
+        self._max_segment_secs = max_segment_secs
+        self._flush_secs = flush_secs
+        self._ring_size = ring_size
+
+        self._recorders: Dict[str, SessionRecorder] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-log")
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+        # Only touched by the writer thread
+        self._file = None
+        self._gzip: Optional[gzip.GzipFile] = None
+        self._path: Optional[str] = None
+        self._opened_at = 0.0
+        self._segments = 0
+
+        self._written = 0
+        self._batches = 0
+        self._write_secs = 0.0
+
+    def recorder(self, session_id: Optional[str] = None, **fields) -> SessionRecorder:
+        """A recorder for a new session, `fields` are recorded with its start."""
+        if not self._flush_task:
+            self._lock = asyncio.Lock()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        session_id = session_id or uuid.uuid4().hex[:12]
+        recorder = SessionRecorder(self, session_id, self._ring_size)
+        self._recorders[session_id] = recorder
+        recorder.record("session_started", **fields)
+        return recorder
+
+    async def flush(self):
+        """Writes everything recorded so far."""
+        if not self._lock:
+            return
+        async with self._lock:
+            batch = []
+            for session_id, recorder in list(self._recorders.items()):
+                batch.extend((session_id, event) for event in recorder.drain())
+                if recorder.closed:
+                    del self._recorders[session_id]
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(self._executor, self._write, batch)
+            except Exception as e:
+                # Losing the log must not take the session down
+                logger.error(f"Unable to write the session log: {e}")
+
+    async def stop(self):
+        """Writes what's left and closes the segment. Recording can start again after."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_segment)
+        self._lock = None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._recorders),
+            "segments": self._segments,
+            "written": self._written,
+            "batches": self._batches,
+            "avg_batch_write_ms": round(1000 * self._write_secs / self._batches, 2) if self._batches else 0.0,
+        }
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self._flush_secs)
+            await self.flush()
+
+    def _write(self, batch: list):
+        start = time.perf_counter()
+        if self._gzip and time.time() - self._opened_at >= self._max_segment_secs:
+            self._close_segment()
+        if not batch:
+            return
+
+        lines = []
+        for session_id, (t, event, fields) in batch:
+            lines.append(
+                json.dumps({"t": round(t, 3), "session": session_id, "event": event, **fields}, ensure_ascii=False)
+            )
+        if not self._gzip:
+            self._open_segment()
+        self._gzip.write(("\n".join(lines) + "\n").encode())
+        # Readable up to here even if the process dies
+        self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+        self._written += len(batch)
+        self._batches += 1
+        EVENTS.labels("written").inc(len(batch))
+        if self._file.tell() >= self._max_segment_bytes:
+            self._close_segment()
+        self._write_secs += time.perf_counter() - start
+
+    def _open_segment(self):
+        os.makedirs(self._directory, exist_ok=True)
+        self._segments += 1
+        name = f"events-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._segments:04d}.jsonl.gz"
+        self._path = os.path.join(self._directory, name)
+        self._file = open(self._path + OPEN_SUFFIX, "wb")
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode="wb", mtime=0)
+        self._opened_at = time.time()
+
+    def _close_segment(self):
+        if not self._gzip:
+            return
+        self._gzip.close()
+        self._file.close()
+        os.replace(self._path + OPEN_SUFFIX, self._path)
+        self._gzip = None
+        self._file = None
+
+
+def segment_paths(paths: List[str]) -> List[str]:
+    """The segments in `paths`, directories are searched for them."""
+    segments = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, "*.jsonl.gz")) + glob.glob(
+                os.path.join(path, "*.jsonl.gz" + OPEN_SUFFIX)
+            )
+            segments.extend(sorted(found))
+        else:
+            segments.append(path)
+    return segments
+
+
+def read_events(paths: List[str]) -> Iterator[dict]:
+    """Every event in the given segments (or directories of them), in file order."""
+    for path in segment_paths(paths):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except EOFError:
+            # A segment that is still open, or whose process died
+            pass
+
+
+def read_sessions(paths: List[str]) -> Dict[str, List[dict]]:
+    """The events of each session, oldest first."""
+    sessions: Dict[str, List[dict]] = {}
+    for event in read_events(paths):
+        sessions.setdefault(event["session"], []).append(event)
+    for events in sessions.values():
+        events.sort(key=lambda e: e["t"])
+    return sessions
@@ -0,0 +1,189 @@
+import onnxruntime
+import queue
+import threading
+import time
+
+from concurrent.futures import Future
+from importlib import resources as impresources
+
+import numpy as np
+
+from pipecat.audio.vad.silero import SileroOnnxModel, SileroVADAnalyzer
+from pipecat.audio.vad.vad_analyzer import VADAnalyzer, VADParams
+
+from loguru import logger
+
+
+def load_silero_session() -> onnxruntime.InferenceSession:
+    model_file_path = str(impresources.files("pipecat.audio.vad.data").joinpath("silero_vad.onnx"))
+
+    opts = onnxruntime.SessionOptions()
+    opts.inter_op_num_threads = 1
+    opts.intra_op_num_threads = 1
+
+    logger.debug("Loading shared Silero VAD model...")
+    return onnxruntime.InferenceSession(
+        model_file_path, providers=["CPUExecutionProvider"], sess_options=opts
+    )
+
+
+class SharedSileroOnnxModel(SileroOnnxModel):
+    """
+    A Silero model using an already loaded ONNX session. Only the recurrent
+    state and the audio context are per instance.
+    """
+
+    def __init__(self, session: onnxruntime.InferenceSession):
+        self.session = session
+        self.reset_states()
+        self.sample_rates = [8000, 16000]
+
+
+class SharedSileroVAD:
+    """
+    Holds one Silero ONNX session for the whole process and hands out VAD
+    analyzers that use it, so every session doesn't load its own copy of the
+    model. With `batched` the analyzers' chunks are also run together through
+    a VADBatcher instead of one inference per chunk per session.
+    """
+
+    def __init__(self, batched: bool = False, max_batch: int = 64, max_wait: float = 0.002):
+        self._session = load_silero_session()
+        self._batcher = VADBatcher(self._session, max_batch, max_wait) if batched else None
+
+    def create_analyzer(
+        self, *, sample_rate: int = 16000, params: VADParams = VADParams()
+    ) -> "SharedSileroVADAnalyzer":
+        if self._batcher:
+            model = BatchedSileroOnnxModel(self._batcher)
+        else:
+            model = SharedSileroOnnxModel(self._session)
+        return SharedSileroVADAnalyzer(model, sample_rate=sample_rate, params=params)
+
+    def stats(self) -> dict:
+        return self._batcher.stats() if self._batcher else {}
+
+
+class SharedSileroVADAnalyzer(SileroVADAnalyzer):
+    def __init__(
+        self,
+        model: SileroOnnxModel,
+        *,
+        sample_rate: int = 16000,
+        params: VADParams = VADParams(),
+    ):
+        # Skip SileroVADAnalyzer's constructor, it would load the model again.
+        VADAnalyzer.__init__(self, sample_rate=sample_rate, num_channels=1, params=params)
+
+        if sample_rate != 16000 and sample_rate != 8000:
+            raise ValueError("Silero VAD sample rate needs to be 16000 or 8000")
+
+        self._model = model
+        self._last_reset_time = 0
+
+
+class VADBatcher:
+    """
+    Runs Silero inference for many sessions as batched ONNX calls. Sessions
+    call `infer()` from the transports' executor threads and block until their
+    chunk has been processed. A background thread takes the first pending
+    chunk, waits up to `max_wait` seconds for others to arrive (up to
+    `max_batch`), and runs them all at once. The recurrent state and audio
+    context stay on each session's model, they are just stacked for the call.
+    """
+
+    def __init__(self, session: onnxruntime.InferenceSession, max_batch: int = 64, max_wait: float = 0.002):
+        self._session = session
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue = queue.SimpleQueue()
+
+        self._batches = 0
+        self._chunks = 0
+
+        self._thread = threading.Thread(target=self._run, name="vad-batcher", daemon=True)
+        self._thread.start()
+
+    def infer(self, model: "BatchedSileroOnnxModel", x: np.ndarray, sr: int) -> np.ndarray:
+        future = Future()
+        self._queue.put((model, x, sr, future))
+        return future.result()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self._batches,
+            "chunks": self._chunks,
+            "avg_batch": self._chunks / self._batches if self._batches else 0.0,
+        }
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._max_wait
+        while len(batch) < self._max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            by_rate = {}
+            for item in batch:
+                by_rate.setdefault(item[2], []).append(item)
+            for sr, items in by_rate.items():
+                try:
+                    self._infer_batch(items, sr)
+                except Exception as e:
+                    for _, _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def _infer_batch(self, items: list, sr: int):
+        context_size = 64 if sr == 16000 else 32
+
+        inputs = []
+        for model, x, _, _ in items:
+            if model._last_sr and model._last_sr != sr:
+                model.reset_states()
+            if np.shape(model._context)[1] != context_size:
+                model._context = np.zeros((1, context_size), dtype="float32")
+            inputs.append(np.concatenate((model._context, x), axis=1))
+
+        x = np.concatenate(inputs, axis=0)
+        state = np.concatenate([model._state for model, _, _, _ in items], axis=1)
+
+        out, state = self._session.run(
+            None, {"input": x, "state": state, "sr": np.array(sr, dtype="int64")}
+        )
+
+        self._batches += 1
+        self._chunks += len(items)
+
+        for i, (model, _, _, future) in enumerate(items):
+            model._state = state[:, i : i + 1, :]
+            model._context = x[i : i + 1, -context_size:]
+            model._last_sr = sr
+            model._last_batch_size = 1
+            future.set_result(out[i : i + 1])
+
+
+class BatchedSileroOnnxModel(SharedSileroOnnxModel):
+    """A Silero model whose inference goes through a VADBatcher."""
+
+    def __init__(self, batcher: VADBatcher):
+        self._batcher = batcher
+        self.reset_states()
+        self.sample_rates = [8000, 16000]
+
+    def __call__(self, x, sr: int):
+        x, sr = self._validate_input(x, sr)
+        num_samples = 512 if sr == 16000 else 256
+        if np.shape(x) != (1, num_samples):
+            raise ValueError(f"Expected one chunk of {num_samples} samples, got {np.shape(x)}")
+        return self._batcher.infer(self, x.astype(np.float32, copy=False), sr)
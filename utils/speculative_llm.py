@@ -0,0 +1,327 @@
+import asyncio
+import re
+import time
+
+from typing import List, Optional
+
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    Frame,
+    InterimTranscriptionFrame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMMessagesFrame,
+    TextFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext, OpenAILLMContextFrame
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.openai import OpenAILLMService
+
+from utils.context_budget import count_tokens, message_tokens
+
+from loguru import logger
+
+from prometheus_client import Counter
+
+SPECULATIONS = Counter(
+    "bot_speculative_requests_total",
+    "LLM requests started on interim transcripts, by whether the answer was used",
+    ["persona", "outcome"],
+)
+WASTED_TOKENS = Counter(
+    "bot_speculative_wasted_tokens_total",
+    "Tokens of speculative LLM requests whose answer was thrown away",
+    ["persona", "kind"],
+)
+SAVED_SECONDS = Counter(
+    "bot_speculative_saved_seconds_total",
+    "Time to first token saved by speculative LLM requests",
+    ["persona"],
+)
+
+def normalize_transcript(text: str) -> str:
+    """Transcripts that only differ in case and punctuation are the same."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.casefold()).split())
+
+
+class Speculation:
+    def __init__(self, context: OpenAILLMContext, text: str):
+        self.context = context
+        self.text = text
+        self.started = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.prompt_tokens = sum(message_tokens(m) for m in context.messages)
+        self.completion_tokens = 0
+        # Text chunks as they stream in, None once the response is complete
+        self.chunks: asyncio.Queue = asyncio.Queue()
+        self.usable = True
+        self.task: Optional[asyncio.Task] = None
+
+
+class SpeculativeLLM:
+    """
+    Starts the LLM request for a turn before the final transcription is in.
+    When an interim transcription hasn't changed for `stable_secs`, or the
+    VAD says the user stopped speaking, the context plus that transcription
+    is sent to the LLM in the background and the response is buffered, not
+    spoken. When the user context aggregator sends the real context, the
+    buffered response is played as if the LLM had just produced it if the
+    context matches (same messages, same transcription give or take case and
+    punctuation), and cancelled otherwise, in which case the request goes to
+    the LLM as usual.
+
+    Speculating costs tokens (the prompt of every request thrown away) to
+    save time to first token; both are counted per persona. At most
+    `max_per_turn` requests are started for a turn.
+
+        speculative = SpeculativeLLM(llm, context)
+        pipeline = Pipeline([transport.input(), speculative.observer(),
+                             context_aggregator.user(), speculative.gate(), llm, ...])
+    """
+
+    def __init__(
+        self,
+        llm: OpenAILLMService,
+        context: OpenAILLMContext,
+        *,
+        persona: str = "default",
+        stable_secs: float = 0.3,
+        min_words: int = 2,
+        max_per_turn: int = 2,
+    ):
+        self._llm = llm
+        self._context = context
+        self._persona = persona
+        self._stable_secs = stable_secs
+        self._min_words = min_words
+        self._max_per_turn = max_per_turn
+
+        self._interim: Optional[str] = None
+        self._stable_task: Optional[asyncio.Task] = None
+        self._speculation: Optional[Speculation] = None
+        self._turn_speculations = 0
+
+        self._started = 0
+        self._committed = 0
+        self._discarded = 0
+        self._wasted_tokens = 0
+        self._saved = 0.0
+
+    def observer(self) -> "SpeculationObserver":
+        return SpeculationObserver(self)
+
+    def gate(self) -> "SpeculationGate":
+        return SpeculationGate(self)
+
+    def stats(self) -> dict:
+        return {
+            "started": self._started,
+            "committed": self._committed,
+            "discarded": self._discarded,
+            "wasted_tokens": self._wasted_tokens,
+            "saved_ms": round(1000 * self._saved),
+        }
+
+    def cancel(self):
+        if self._stable_task:
+            self._stable_task.cancel()
+            self._stable_task = None
+        if self._speculation:
+            self._discard(self._speculation)
+            self._speculation = None
+
+    def on_interim(self, text: str):
+        self._interim = text
+        if self._stable_task:
+            self._stable_task.cancel()
+        self._stable_task = asyncio.create_task(self._speculate_when_stable(text))
+
+    def on_user_stopped(self):
+        if self._stable_task:
+            self._stable_task.cancel()
+            self._stable_task = None
+        if self._interim:
+            self._speculate(self._interim)
+
+    def on_bot_started(self):
+        # Whatever is still buffered was for a turn that has been answered
+        self.cancel()
+        self._interim = None
+        self._turn_speculations = 0
+
+    async def _speculate_when_stable(self, text: str):
+        await asyncio.sleep(self._stable_secs)
+        self._stable_task = None
+        self._speculate(text)
+
+    def _speculate(self, text: str):
+        normalized = normalize_transcript(text)
+        if len(normalized.split()) < self._min_words:
+            return
+        if self._speculation and self._speculation.text == normalized:
+            return
+        if self._turn_speculations >= self._max_per_turn:
+            return
+
+        if self._speculation:
+            self._discard(self._speculation)
+
+        context = OpenAILLMContext(
+            messages=[*self._context.messages, {"role": "user", "content": text}],
+            tools=self._context.tools,
+            tool_choice=self._context.tool_choice,
+        )
+        speculation = Speculation(context, normalized)
+        speculation.task = asyncio.create_task(self._run(speculation))
+        self._speculation = speculation
+        self._turn_speculations += 1
+        self._started += 1
+        logger.debug(f"Speculating on [{text}]")
+
+    async def _run(self, speculation: Speculation):
+        stream = None
+        try:
+            stream = await self._llm.get_chat_completions(
+                speculation.context, speculation.context.get_messages()
+            )
+            async for chunk in stream:
+                if chunk.usage:
+                    speculation.completion_tokens = chunk.usage.completion_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.tool_calls:
+                    # Function calls are left to the LLM service
+                    speculation.usable = False
+                    break
+                if delta.content:
+                    if speculation.first_token_at is None:
+                        speculation.first_token_at = time.monotonic()
+                    speculation.completion_tokens += count_tokens(delta.content)
+                    speculation.chunks.put_nowait(delta.content)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Speculative LLM request failed: {e}")
+            speculation.usable = False
+        finally:
+            speculation.chunks.put_nowait(None)
+            close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+            if close:
+                await close()
+
+    def _discard(self, speculation: Speculation):
+        if speculation.task and not speculation.task.done():
+            speculation.task.cancel()
+        self._discarded += 1
+        self._wasted_tokens += speculation.prompt_tokens + speculation.completion_tokens
+        SPECULATIONS.labels(self._persona, "discarded").inc()
+        WASTED_TOKENS.labels(self._persona, "prompt").inc(speculation.prompt_tokens)
+        WASTED_TOKENS.labels(self._persona, "completion").inc(speculation.completion_tokens)
+
+    def _matches(self, speculation: Speculation, messages: List[dict]) -> bool:
+        speculated = speculation.context.messages
+        return (
+            len(messages) == len(speculated)
+            and messages[:-1] == speculated[:-1]
+            and messages[-1].get("role") == "user"
+            and normalize_transcript(messages[-1].get("content") or "") == speculation.text
+        )
+
+    async def commit(self, processor: FrameProcessor, messages: List[dict]) -> bool:
+        """
+        Plays the buffered response for `messages` through `processor`.
+        Returns False, having cancelled any speculation, if there is none
+        that matches.
+        """
+        if self._stable_task:
+            self._stable_task.cancel()
+            self._stable_task = None
+        speculation = self._speculation
+        self._speculation = None
+        self._interim = None
+        self._turn_speculations = 0
+
+        if not speculation:
+            return False
+        if not speculation.usable or not self._matches(speculation, messages):
+            self._discard(speculation)
+            return False
+
+        # The request we would have made now had a head start, and the wait
+        # for the first token can't have been shortened by more than it took
+        now = time.monotonic()
+        saved = now - speculation.started
+        if speculation.first_token_at is not None:
+            saved = min(saved, speculation.first_token_at - speculation.started)
+        self._committed += 1
+        self._saved += saved
+        SPECULATIONS.labels(self._persona, "committed").inc()
+        SAVED_SECONDS.labels(self._persona).inc(saved)
+        logger.debug(f"Using speculative response, {1000 * saved:.0f} ms ahead")
+
+        await processor.push_frame(LLMFullResponseStartFrame())
+        try:
+            while True:
+                text = await speculation.chunks.get()
+                if text is None:
+                    break
+                await processor.push_frame(TextFrame(text))
+        finally:
+            # Interrupted while it was still streaming
+            if speculation.task and not speculation.task.done():
+                speculation.task.cancel()
+        await processor.push_frame(LLMFullResponseEndFrame())
+        return True
+
+
+class SpeculationObserver(FrameProcessor):
+    """Goes before the user context aggregator, watches the transcriptions."""
+
+    def __init__(self, speculative: SpeculativeLLM):
+        super().__init__()
+        self._speculative = speculative
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, InterimTranscriptionFrame):
+            self._speculative.on_interim(frame.text)
+        elif isinstance(frame, UserStoppedSpeakingFrame):
+            self._speculative.on_user_stopped()
+        elif isinstance(frame, BotStartedSpeakingFrame):
+            self._speculative.on_bot_started()
+
+        await self.push_frame(frame, direction)
+
+    async def cleanup(self):
+        await super().cleanup()
+        self._speculative.cancel()
+
+
+class SpeculationGate(FrameProcessor):
+    """Goes right before the LLM, answers from the speculation when it can."""
+
+    def __init__(self, speculative: SpeculativeLLM):
+        super().__init__()
+        self._speculative = speculative
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        messages = None
+        if isinstance(frame, OpenAILLMContextFrame):
+            messages = frame.context.messages
+        elif isinstance(frame, LLMMessagesFrame):
+            messages = frame.messages
+
+        if messages is not None and direction == FrameDirection.DOWNSTREAM:
+            if await self._speculative.commit(self, messages):
+                return
+
+        await self.push_frame(frame, direction)
+
+    async def cleanup(self):
+        await super().cleanup()
+        self._speculative.cancel()
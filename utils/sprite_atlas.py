@@ -0,0 +1,164 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from pipecat.frames.frames import OutputImageRawFrame
+
+ATLAS_MAGIC = b"SPRATLAS"
+ATLAS_VERSION = 1
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ASSETS_DIR = os.path.join(root_dir, "assets")
+DEFAULT_ATLAS_PATH = os.path.join(DEFAULT_ASSETS_DIR, "sprites.atlas")
+
+# The atlas header is padded to a page, so every sprite starts page aligned.
+PAGE_SIZE = mmap.PAGESIZE
+
+
+def sprite_paths(assets_dir: str = DEFAULT_ASSETS_DIR, count: int = 25) -> List[str]:
+    return [os.path.join(assets_dir, f"robot0{i}.png") for i in range(1, count + 1)]
+
+
+def atlas_path_for(size: Optional[Tuple[int, int]], atlas_path: str = DEFAULT_ATLAS_PATH) -> str:
+    """Scaled sprites get their own atlas next to the full size one."""
+    if size is None:
+        return atlas_path
+    root, ext = os.path.splitext(atlas_path)
+    return f"{root}.{size[0]}x{size[1]}{ext}"
+
+
+def build_atlas(
+    paths: List[str], atlas_path: str = DEFAULT_ATLAS_PATH, size: Optional[Tuple[int, int]] = None
+):
+    """
+    Decodes the given sprites once and packs their raw pixels one after the
+    other into a single file:
+
+        magic | version | header length | JSON header | padding | frames...
+
+    All sprites must have the same size and mode. With `size` they are
+    scaled to it first, so the camera output never has to resize them.
+    """
+    source_size = None
+    mode = None
+    frames = []
+    for path in paths:
+        with Image.open(path) as img:
+            if source_size is None:
+                source_size, mode = img.size, img.mode
+            elif img.size != source_size or img.mode != mode:
+                raise Exception(
+                    f"Sprite {path} is {img.size} {img.mode}, expected {source_size} {mode}"
+                )
+            if size is not None and img.size != size:
+                img = img.resize(size, Image.LANCZOS)
+            frames.append(img.tobytes())
+    size = size or source_size
+
+    frame_size = len(frames[0])
+    header = json.dumps(
+        {
+            "width": size[0],
+            "height": size[1],
+            "mode": mode,
+            "count": len(frames),
+            "frame_size": frame_size,
+            "names": [os.path.basename(p) for p in paths],
+        }
+    ).encode()
+
+    prefix = ATLAS_MAGIC + struct.pack("<II", ATLAS_VERSION, len(header)) + header
+    data_offset = -(-len(prefix) // PAGE_SIZE) * PAGE_SIZE
+
+    # Write to a temporary file and rename, so bots starting while we build
+    # never map a half written atlas.
+    tmp_path = f"{atlas_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(prefix)
+        f.write(b"\0" * (data_offset - len(prefix)))
+        for frame in frames:
+            f.write(frame)
+    os.replace(tmp_path, atlas_path)
+
+
+def atlas_is_stale(paths: List[str], atlas_path: str = DEFAULT_ATLAS_PATH) -> bool:
+    if not os.path.exists(atlas_path):
+        return True
+    atlas_mtime = os.path.getmtime(atlas_path)
+    return any(os.path.getmtime(p) > atlas_mtime for p in paths)
+
+
+def load_atlas(atlas_path: str = DEFAULT_ATLAS_PATH) -> List[OutputImageRawFrame]:
+    """
+    Maps the atlas read-only and returns one OutputImageRawFrame per sprite.
+    The frame images are memoryviews into the mapping, so no pixels are copied
+    and every process mapping the same atlas shares the same physical pages.
+    """
+    with open(atlas_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic = mm[: len(ATLAS_MAGIC)]
+    if magic != ATLAS_MAGIC:
+        raise Exception(f"{atlas_path} is not a sprite atlas")
+
+    version, header_len = struct.unpack_from("<II", mm, len(ATLAS_MAGIC))
+    if version != ATLAS_VERSION:
+        raise Exception(f"Unsupported sprite atlas version {version}")
+
+    header_start = len(ATLAS_MAGIC) + 8
+    header = json.loads(mm[header_start : header_start + header_len])
+    data_offset = -(-(header_start + header_len) // PAGE_SIZE) * PAGE_SIZE
+
+    size = (header["width"], header["height"])
+    frame_size = header["frame_size"]
+    view = memoryview(mm)
+
+    sprites = []
+    for i in range(header["count"]):
+        start = data_offset + i * frame_size
+        sprites.append(
+            OutputImageRawFrame(
+                image=view[start : start + frame_size], size=size, format=header["mode"]
+            )
+        )
+    return sprites
+
+
+def load_sprites(
+    assets_dir: str = DEFAULT_ASSETS_DIR,
+    atlas_path: str = DEFAULT_ATLAS_PATH,
+    size: Optional[Tuple[int, int]] = None,
+) -> List[OutputImageRawFrame]:
+    paths = sprite_paths(assets_dir)
+    if size is not None:
+        # Only the header is read
+        with Image.open(paths[0]) as img:
+            if img.size == tuple(size):
+                size = None
+    atlas_path = atlas_path_for(size, atlas_path)
+    if atlas_is_stale(paths, atlas_path):
+        build_atlas(paths, atlas_path, size)
+    return load_atlas(atlas_path)
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the sprite atlas")
+    parser.add_argument("atlas_path", nargs="?", help="Output file (default: assets/sprites.atlas)")
+    parser.add_argument("--size", type=parse_size, help="Scale the sprites, e.g. 512x288")
+    args = parser.parse_args()
+
+    atlas_path = args.atlas_path or atlas_path_for(args.size)
+    build_atlas(sprite_paths(), atlas_path, args.size)
+    print(f"Sprite atlas written to {atlas_path}")
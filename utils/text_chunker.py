@@ -0,0 +1,193 @@
+import asyncio
+import re
+
+from typing import Optional
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    StartInterruptionFrame,
+    TextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import TTSService
+from pipecat.utils.string import match_endofsentence
+
+from prometheus_client import Counter
+
+FIRST_CHUNKS = Counter(
+    "bot_tts_first_chunks_total",
+    "First chunk of text of each response sent to the TTS, by what flushed it",
+    ["reason"],
+)
+
+# A comma, semicolon, colon or dash, once the next token shows it isn't
+# inside a number ("1,000") or a word
+CLAUSE_END = re.compile(r"[,;:–—](?=\s)")
+
+
+def stream_text_to(tts: TTSService):
+    """
+    Makes `tts` synthesize every text frame as it comes instead of waiting
+    for whole sentences. pipecat 0.0.50's Cartesia and ElevenLabs services
+    pass `aggregate_sentences=True` to TTSService themselves, so it can't be
+    given to their constructors. requirements.txt pins that version.
+    """
+    tts._aggregate_sentences = False
+
+
+class TTSTextChunker(FrameProcessor):
+    """
+    Decides where the LLM's text is cut before it goes to the TTS service,
+    instead of the service waiting for whole sentences. Goes right before
+    a TTS service that doesn't aggregate sentences itself:
+
+        stream_text_to(tts)
+        pipeline = Pipeline([..., llm, TTSTextChunker(), tts, ...])
+
+    The first chunk of every response is sent as soon as possible, so the
+    bot starts talking before a long first sentence is complete: at the
+    first clause or sentence end after `first_min_words` words, after
+    `first_max_words` words, or `first_max_secs` after the first token,
+    whichever comes first. The rest of the response goes in whole
+    sentences, merged up to `min_chars` at least, which sounds better than
+    short fragments and is read while the first chunk plays.
+    """
+
+    def __init__(
+        self,
+        *,
+        first_min_words: int = 3,
+        first_max_words: int = 12,
+        first_max_secs: float = 0.4,
+        min_chars: int = 60,
+    ):
+        super().__init__()
+        self._first_min_words = first_min_words
+        self._first_max_words = first_max_words
+        self._first_max_secs = first_max_secs
+        self._min_chars = min_chars
+
+        self._text = ""
+        self._in_response = False
+        self._first = True
+        self._timed_out = False
+        self._timer: Optional[asyncio.Task] = None
+
+        self._responses = 0
+        self._chunks = 0
+        self._first_chunk_words = 0
+        self._first_reasons = {}
+
+    def stats(self) -> dict:
+        return {
+            "responses": self._responses,
+            "chunks": self._chunks,
+            "avg_first_chunk_words": (
+                round(self._first_chunk_words / self._responses, 1) if self._responses else 0.0
+            ),
+            "first_chunks": dict(self._first_reasons),
+        }
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, LLMFullResponseStartFrame):
+            self._reset()
+            self._in_response = True
+            await self.push_frame(frame, direction)
+        elif isinstance(frame, TextFrame) and self._in_response:
+            await self._add_text(frame.text)
+        elif isinstance(frame, (LLMFullResponseEndFrame, EndFrame)):
+            await self._flush(len(self._text), "end")
+            self._reset()
+            await self.push_frame(frame, direction)
+        elif isinstance(frame, StartInterruptionFrame):
+            self._reset()
+            await self.push_frame(frame, direction)
+        else:
+            await self.push_frame(frame, direction)
+
+    async def cleanup(self):
+        await super().cleanup()
+        self._cancel_timer()
+
+    def _reset(self):
+        self._cancel_timer()
+        self._text = ""
+        self._in_response = False
+        self._first = True
+        self._timed_out = False
+
+    def _cancel_timer(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _add_text(self, text: str):
+        if self._first and not self._text and not self._timer and self._first_max_secs:
+            self._timer = self.get_event_loop().create_task(self._first_chunk_timer())
+        self._text += text
+
+        cut = self._find_cut()
+        while cut:
+            await self._flush(*cut)
+            cut = self._find_cut()
+
+    def _find_cut(self) -> Optional[tuple]:
+        """Where to cut the text we have, and why, if it's time to."""
+        if not self._first:
+            for end in self._sentence_ends():
+                if len(self._text[:end].strip()) >= self._min_chars:
+                    return end, "sentence"
+            return None
+
+        for end in self._sentence_ends():
+            return end, "sentence"
+        for match in CLAUSE_END.finditer(self._text):
+            if len(self._text[: match.end()].split()) >= self._first_min_words:
+                return match.end(), "clause"
+
+        # Only whole words, the last one may still be growing
+        last_space = max(self._text.rfind(" "), self._text.rfind("\n"))
+        words = len(self._text[:last_space].split()) if last_space > 0 else 0
+        if words >= self._first_max_words:
+            return last_space, "words"
+        if self._timed_out and words:
+            return last_space, "time"
+        return None
+
+    def _sentence_ends(self):
+        start = 0
+        while True:
+            end = match_endofsentence(self._text[start:])
+            # The end of the text matches too, it's only an end if more follows
+            if not end or start + end >= len(self._text.rstrip()):
+                return
+            start += end
+            yield start
+
+    async def _flush(self, end: int, reason: str):
+        text, self._text = self._text[:end], self._text[end:]
+        if not text.strip():
+            return
+
+        if self._first:
+            self._first = False
+            self._cancel_timer()
+            self._responses += 1
+            self._first_chunk_words += len(text.split())
+            self._first_reasons[reason] = self._first_reasons.get(reason, 0) + 1
+            FIRST_CHUNKS.labels(reason).inc()
+        self._chunks += 1
+        await self.push_frame(TextFrame(text))
+
+    async def _first_chunk_timer(self):
+        await asyncio.sleep(self._first_max_secs)
+        self._timer = None
+        self._timed_out = True
+        cut = self._find_cut()
+        if cut:
+            await self._flush(*cut)
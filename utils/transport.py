@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+from typing import List, Optional
+
+from pipecat.frames.frames import OutputImageRawFrame
+from pipecat.transports.services.daily import DailyOutputTransport, DailyParams, DailyTransport
+
+from loguru import logger
+
+from prometheus_client import Counter
+
+CAMERA_FRAMES = Counter(
+    "bot_camera_frames_total",
+    "Video frames handed to the camera encoder, or skipped because the image didn't change",
+    ["outcome"],
+)
+CAMERA_PIXELS = Counter(
+    "bot_camera_pixels_total",
+    "Pixels handed to the camera encoder, what its CPU time grows with",
+)
+
+
+class BotParams(DailyParams):
+    # Only draw a camera frame when the image changes, and repeat the last
+    # one camera_out_idle_framerate times a second otherwise
+    camera_out_adaptive: bool = False
+    camera_out_idle_framerate: float = 1.0
+
+
+class AdaptiveCameraMixin:
+    """
+    Camera output for the output transports that, with
+    `camera_out_adaptive`, skips frames showing the same image as the one
+    before (the static sprite while the bot listens, the repeated sprites
+    of a mirrored animation) and only repeats it at
+    `camera_out_idle_framerate`, so receivers keep getting video. Every
+    frame sent costs an encode and bandwidth, whatever it shows.
+
+    Images are compared by identity: the sprites come from the atlas once
+    and are reused, so the same sprite is the same buffer. Only immutable
+    buffers count as unchanged, one that can be drawn into in place is
+    always sent.
+
+    It overrides BaseOutputTransport's camera task and the methods around
+    it, which aren't public. requirements.txt pins the pipecat version
+    (0.0.50) they come from.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._camera_animated = False
+        self._camera_changed = asyncio.Event()
+
+    async def _set_camera_image(self, image: OutputImageRawFrame):
+        await super()._set_camera_image(image)
+        self._camera_animated = False
+        self._camera_changed.set()
+
+    async def _set_camera_images(self, images: List[OutputImageRawFrame]):
+        await super()._set_camera_images(images)
+        self._camera_animated = len({id(image.image) for image in images}) > 1
+        self._camera_changed.set()
+
+    async def _draw_image(self, frame: OutputImageRawFrame):
+        await super()._draw_image(frame)
+        CAMERA_FRAMES.labels("sent").inc()
+        CAMERA_PIXELS.inc(self._params.camera_out_width * self._params.camera_out_height)
+
+    async def _stop_output_tasks(self):
+        # Don't wait for the next repeat to notice we are stopping
+        self._running_out_tasks = False
+        self._camera_changed.set()
+        await super()._stop_output_tasks()
+
+    async def _camera_out_task_handler(self):
+        if not getattr(self._params, "camera_out_adaptive", False) or self._params.camera_out_is_live:
+            await super()._camera_out_task_handler()
+            return
+
+        frame_duration = 1 / self._params.camera_out_framerate
+        idle_interval = 1 / self._params.camera_out_idle_framerate
+        last: Optional[OutputImageRawFrame] = None
+        last_drawn = 0.0
+        while self._running_out_tasks:
+            try:
+                self._camera_changed.clear()
+                image = next(self._camera_images) if self._camera_images else None
+                if image is not None:
+                    changed = last is None or not _same_image(image.image, last.image)
+                    if changed or time.monotonic() - last_drawn >= idle_interval:
+                        await self._draw_image(image)
+                        last, last_drawn = image, time.monotonic()
+                    else:
+                        CAMERA_FRAMES.labels("skipped").inc()
+
+                if self._camera_animated:
+                    await asyncio.sleep(frame_duration)
+                else:
+                    # Nothing to draw until the image changes or it's time to
+                    # repeat it
+                    timeout = None
+                    if last is not None:
+                        timeout = max(idle_interval - (time.monotonic() - last_drawn), 0)
+                    # Not wait_for(), which can swallow a cancellation that
+                    # comes as the event is set
+                    waiter = asyncio.ensure_future(self._camera_changed.wait())
+                    try:
+                        await asyncio.wait({waiter}, timeout=timeout)
+                    finally:
+                        waiter.cancel()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.exception(f"{self} error writing to camera: {e}")
+
+
+def _same_image(a, b) -> bool:
+    if a is not b:
+        return False
+    return isinstance(a, bytes) or (isinstance(a, memoryview) and a.readonly)
+
+
+class BotOutputTransport(AdaptiveCameraMixin, DailyOutputTransport):
+    async def write_frame_to_camera(self, frame: OutputImageRawFrame):
+        # Sprites coming from the atlas are memoryviews into a shared mapping.
+        # The Daily camera only takes bytes, so copy the one frame being sent
+        # right now instead of keeping a private copy of every sprite around.
+        if not isinstance(frame.image, bytes):
+            frame = OutputImageRawFrame(image=bytes(frame.image), size=frame.size, format=frame.format)
+        await super().write_frame_to_camera(frame)
+
+
+class BotDailyTransport(DailyTransport):
+    """
+    DailyTransport whose output accepts any buffer as image data, not just
+    bytes, and can send video only when the image changes (see BotParams).
+    """
+
+    def output(self) -> BotOutputTransport:
+        if not self._output:
+            self._output = BotOutputTransport(self._client, self._params, name=self._output_name)
+        return self._output
@@ -0,0 +1,437 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+import unicodedata
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+from pipecat.frames.frames import (
+    DataFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    StartInterruptionFrame,
+    TextFrame,
+    TTSAudioRawFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import TTSService
+from pipecat.utils.string import match_endofsentence
+
+from loguru import logger
+
+MAGIC = b"TTSCACHE"
+VERSION = 1
+
+# magic, version, slots, data offset, data size
+HEADER = struct.Struct("<8sIIQQ")
+
+SLOT_DTYPE = np.dtype(
+    [
+        ("k0", "<u8"),
+        ("k1", "<u8"),
+        ("offset", "<u8"),
+        ("length", "<u4"),
+        ("sample_rate", "<u4"),
+        ("used", "<u8"),
+    ]
+)
+
+PhraseKey = Tuple[int, int]
+
+
+def normalize_phrase(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    text = text.replace("’", "'").replace("“", '"').replace("”", '"')
+    return " ".join(text.split())
+
+
+def phrase_key(text: str, *parts) -> PhraseKey:
+    data = json.dumps([normalize_phrase(text), parts], sort_keys=True, default=str)
+    return struct.unpack("<QQ", hashlib.blake2b(data.encode(), digest_size=16).digest())
+
+
+class PhraseAudioStore:
+    """
+    Size bounded on-disk store of synthesized phrases, shared by every bot
+    process on the host.
+
+    The file is memory-mapped and holds a fixed table of `max_entries` slots
+    (key, offset, length, sample rate, last use) followed by `max_bytes` of
+    PCM. Lookups and inserts take a shared or exclusive `flock` on the file
+    for the few microseconds they touch it. When an insert doesn't fit, the
+    least recently used phrases are evicted until there is a large enough
+    gap.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 4096):
+        self._path = path
+        self._slots = max_entries
+        self._data_offset = _page_align(mmap.PAGESIZE + max_entries * SLOT_DTYPE.itemsize)
+        self._data_size = max_bytes
+
+        self._hits = 0
+        self._misses = 0
+        self._stored = 0
+        self._evicted = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fd = self._open()
+        self._mm = mmap.mmap(self._fd, self._data_offset + self._data_size)
+        self._table = np.ndarray(
+            (self._slots,), dtype=SLOT_DTYPE, buffer=self._mm, offset=mmap.PAGESIZE
+        )
+
+    def _header(self) -> bytes:
+        return HEADER.pack(MAGIC, VERSION, self._slots, self._data_offset, self._data_size)
+
+    def _open(self) -> int:
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        size = os.fstat(fd).st_size
+        header = os.pread(fd, HEADER.size, 0)
+        if size and (size != self._data_offset + self._data_size or header != self._header()):
+            # Different layout (or garbage). Other processes may still have
+            # the old file mapped, so replace it instead of truncating it
+            # under them.
+            logger.warning(f"Recreating TTS cache {self._path}")
+            tmp_path = f"{self._path}.{os.getpid()}.tmp"
+            tmp_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            self._initialize(tmp_fd)
+            os.replace(tmp_path, self._path)
+            os.close(fd)
+            return tmp_fd
+        if not size:
+            self._initialize(fd)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return fd
+
+    def _initialize(self, fd: int):
+        # Sparse file, the table is all zeros (empty slots).
+        os.ftruncate(fd, self._data_offset + self._data_size)
+        os.pwrite(fd, self._header(), 0)
+
+    @contextmanager
+    def _locked(self, operation: int):
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _find(self, key: PhraseKey) -> Optional[int]:
+        t = self._table
+        index = np.flatnonzero((t["k0"] == key[0]) & (t["k1"] == key[1]) & (t["length"] > 0))
+        return int(index[0]) if index.size else None
+
+    def get(self, key: PhraseKey) -> Optional[Tuple[bytes, int]]:
+        with self._locked(fcntl.LOCK_SH):
+            i = self._find(key)
+            if i is None:
+                self._misses += 1
+                return None
+            slot = self._table[i]
+            start = self._data_offset + int(slot["offset"])
+            audio = self._mm[start : start + int(slot["length"])]
+            sample_rate = int(slot["sample_rate"])
+            # Racing with another reader on this is harmless.
+            self._table["used"][i] = time.time_ns()
+        self._hits += 1
+        return (audio, sample_rate)
+
+    def put(self, key: PhraseKey, audio: bytes, sample_rate: int) -> bool:
+        size = len(audio)
+        if not size or size > self._data_size:
+            return False
+
+        with self._locked(fcntl.LOCK_EX):
+            if self._find(key) is not None:
+                # Another process stored it first.
+                return False
+
+            t = self._table
+            free = np.flatnonzero(t["length"] == 0)
+            if free.size:
+                i = int(free[0])
+            else:
+                i = self._evict_lru()
+            offset = self._allocate(size)
+
+            start = self._data_offset + offset
+            self._mm[start : start + size] = audio
+            t[i] = (key[0], key[1], offset, size, sample_rate, time.time_ns())
+
+        self._stored += 1
+        return True
+
+    def _evict_lru(self) -> int:
+        t = self._table
+        live = np.flatnonzero(t["length"] > 0)
+        i = int(live[np.argmin(t["used"][live])])
+        t["length"][i] = 0
+        self._evicted += 1
+        return i
+
+    def _allocate(self, size: int) -> int:
+        # First fit between the live phrases, evicting the least recently
+        # used ones until something fits.
+        t = self._table
+        while True:
+            live = np.flatnonzero(t["length"] > 0)
+            starts = t["offset"][live].astype(np.int64)
+            order = np.argsort(starts)
+            starts = starts[order]
+            ends = starts + t["length"][live][order]
+            gap_starts = np.concatenate(([0], ends))
+            gap_ends = np.concatenate((starts, [self._data_size]))
+            fits = np.flatnonzero(gap_ends - gap_starts >= size)
+            if fits.size:
+                return int(gap_starts[fits[0]])
+            self._evict_lru()
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        lengths = self._table["length"]
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "stored": self._stored,
+            "evicted": self._evicted,
+            "entries": int(np.count_nonzero(lengths)),
+            "bytes": int(lengths.sum()),
+            "capacity_bytes": self._data_size,
+        }
+
+    def close(self):
+        del self._table
+        self._mm.close()
+        os.close(self._fd)
+
+
+def _page_align(n: int) -> int:
+    return (n + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+
+
+@dataclass
+class CachedSpeechFrame(DataFrame):
+    """A cached phrase travelling past the TTS service, it doesn't touch it."""
+
+    text: str
+    audio: bytes
+    sample_rate: int
+
+
+@dataclass
+class CachedResponseEndFrame(DataFrame):
+    """End of an LLM response that was entirely played from the cache."""
+
+    pass
+
+
+class TTSCache:
+    """
+    Phrase level cache around a TTS service. Like the context aggregators it
+    is a pair of processors, one before and one after the TTS service:
+
+        pipeline = Pipeline([..., llm, tts_cache.input(), tts, tts_cache.output(), ...])
+
+    The input splits each LLM response into sentences. As long as the
+    sentences are cached they are sent past the TTS service and the output
+    turns them into TTS audio frames, so they play without a TTS request.
+    From the first sentence that isn't cached on, the rest of the response
+    goes to the TTS service as usual (so the audio stays in order). When a
+    response that goes to the TTS service is a single short phrase, its audio
+    is recorded by the output and stored for next time.
+
+    Keys include the TTS service's model, voice and settings, so changing
+    any of them doesn't play stale audio.
+    """
+
+    def __init__(self, store: PhraseAudioStore, tts: TTSService, max_chars: int = 120):
+        self._store = store
+        self._tts = tts
+        self._max_chars = max_chars
+        self._recording: Optional[PhraseKey] = None
+
+        self._input = TTSCacheInput(self)
+        self._output = TTSCacheOutput(self)
+
+    def input(self) -> "TTSCacheInput":
+        return self._input
+
+    def output(self) -> "TTSCacheOutput":
+        return self._output
+
+    def stats(self) -> dict:
+        return self._store.stats()
+
+    def key(self, text: str) -> PhraseKey:
+        tts = self._tts
+        return phrase_key(
+            text,
+            tts.model_name,
+            getattr(tts, "_voice_id", ""),
+            getattr(tts, "_settings", {}),
+            tts.sample_rate,
+        )
+
+    def cacheable(self, text: str) -> bool:
+        return 0 < len(text.strip()) <= self._max_chars
+
+    def lookup(self, text: str) -> Optional[Tuple[bytes, int]]:
+        if not self.cacheable(text):
+            return None
+        return self._store.get(self.key(text))
+
+    def start_recording(self, text: str):
+        self._recording = self.key(text) if self.cacheable(text) else None
+
+    def cancel_recording(self):
+        self._recording = None
+
+    def finish_recording(self, audio: bytes, sample_rate: int):
+        key = self._recording
+        self._recording = None
+        if key and audio:
+            self._store.put(key, audio, sample_rate)
+
+
+class TTSCacheInput(FrameProcessor):
+    def __init__(self, cache: TTSCache):
+        super().__init__()
+        self._cache = cache
+        self._reset()
+
+    def _reset(self):
+        self._in_response = False
+        self._passthrough = False
+        self._sentence = ""
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, LLMFullResponseStartFrame):
+            self._reset()
+            self._in_response = True
+            await self.push_frame(frame, direction)
+        elif isinstance(frame, TextFrame) and self._in_response:
+            if self._passthrough:
+                await self._push_text(frame.text)
+            else:
+                self._sentence += frame.text
+                eos_end_marker = match_endofsentence(self._sentence)
+                while eos_end_marker and not self._passthrough:
+                    text = self._sentence[:eos_end_marker]
+                    self._sentence = self._sentence[eos_end_marker:]
+                    await self._handle_sentence(text)
+                    eos_end_marker = match_endofsentence(self._sentence)
+                if not self._passthrough and not self._cache.cacheable(self._sentence) and self._sentence.strip():
+                    # Too long to be a cached phrase, no need to wait for its end
+                    self._passthrough = True
+                if self._passthrough and self._sentence:
+                    await self._push_text(self._sentence)
+                    self._sentence = ""
+        elif isinstance(frame, LLMFullResponseEndFrame) and self._in_response:
+            if self._sentence.strip():
+                await self._handle_sentence(self._sentence)
+            if self._passthrough:
+                await self.push_frame(frame, direction)
+            else:
+                # The TTS service never saw this response, so it wouldn't
+                # end it either.
+                await self.push_frame(CachedResponseEndFrame())
+            self._reset()
+        elif isinstance(frame, StartInterruptionFrame):
+            self._reset()
+            self._cache.cancel_recording()
+            await self.push_frame(frame, direction)
+        else:
+            await self.push_frame(frame, direction)
+
+    async def _handle_sentence(self, text: str):
+        if not text.strip():
+            return
+        if self._passthrough:
+            await self._push_text(text)
+            return
+
+        cached = self._cache.lookup(text)
+        if cached:
+            audio, sample_rate = cached
+            logger.debug(f"Playing cached TTS: [{text}]")
+            await self.push_frame(CachedSpeechFrame(text=text, audio=audio, sample_rate=sample_rate))
+            return
+
+        # First sentence the cache doesn't have, the TTS service takes over.
+        self._passthrough = True
+        self._cache.start_recording(text)
+        await self.push_frame(TextFrame(text))
+
+    async def _push_text(self, text: str):
+        # More than one phrase in the same TTS audio, it can't be recorded.
+        if text.strip():
+            self._cache.cancel_recording()
+        await self.push_frame(TextFrame(text))
+
+
+class TTSCacheOutput(FrameProcessor):
+    # Nobody says a 15 second phrase twice
+    MAX_RECORDING_SECS = 15
+
+    def __init__(self, cache: TTSCache):
+        super().__init__()
+        self._cache = cache
+        self._audio: Optional[bytearray] = None
+        self._sample_rate = 0
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, CachedSpeechFrame):
+            await self.push_frame(TTSStartedFrame())
+            await self.push_frame(
+                TTSAudioRawFrame(audio=frame.audio, sample_rate=frame.sample_rate, num_channels=1)
+            )
+            await self.push_frame(TTSStoppedFrame())
+            # Like a TTS service, text goes after the audio so the context
+            # aggregator only records it if we weren't interrupted.
+            await self.push_frame(TextFrame(frame.text))
+        elif isinstance(frame, CachedResponseEndFrame):
+            await self.push_frame(LLMFullResponseEndFrame())
+        elif isinstance(frame, TTSStartedFrame):
+            self._audio = bytearray()
+            await self.push_frame(frame, direction)
+        elif isinstance(frame, TTSAudioRawFrame):
+            self._record(frame)
+            await self.push_frame(frame, direction)
+        elif isinstance(frame, TTSStoppedFrame):
+            if self._audio is not None:
+                self._cache.finish_recording(bytes(self._audio), self._sample_rate)
+            self._audio = None
+            await self.push_frame(frame, direction)
+        elif isinstance(frame, StartInterruptionFrame):
+            self._audio = None
+            self._cache.cancel_recording()
+            await self.push_frame(frame, direction)
+        else:
+            await self.push_frame(frame, direction)
+
+    def _record(self, frame: TTSAudioRawFrame):
+        if self._audio is None:
+            return
+        self._sample_rate = frame.sample_rate
+        self._audio += frame.audio
+        if len(self._audio) > self.MAX_RECORDING_SECS * frame.sample_rate * 2:
+            self._audio = None
+            self._cache.cancel_recording()
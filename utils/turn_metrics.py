@@ -0,0 +1,152 @@
+import time
+
+from typing import Callable, Dict, Optional
+
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    BotStoppedSpeakingFrame,
+    Frame,
+    TextFrame,
+    TranscriptionFrame,
+    TTSAudioRawFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+from prometheus_client import Counter, Histogram
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+TURN_STAGE_SECONDS = Histogram(
+    "bot_turn_stage_seconds",
+    "Time from the user stopping speaking (VAD) to each stage of the bot's answer",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+INTERRUPTION_SECONDS = Histogram(
+    "bot_interruption_reaction_seconds",
+    "Time from the user starting to speak over the bot to the bot going quiet",
+    buckets=LATENCY_BUCKETS,
+)
+TURNS = Counter("bot_turns_total", "User turns, by whether the bot answered them", ["outcome"])
+
+
+class TurnLatencyTracker:
+    """
+    Times each turn, from the VAD deciding the user stopped speaking to the
+    final transcription, the first LLM token, the first TTS audio and the
+    bot starting to speak, and how long the bot takes to go quiet when the
+    user talks over it.
+
+    No single place in the pipeline sees all of those frames, so the
+    tracker hands out probes to put at several points, typically right
+    after the input transport, after the LLM and after the TTS service:
+
+        turn_metrics = TurnLatencyTracker()
+        pipeline = Pipeline([transport.input(), turn_metrics.probe(), ..., llm,
+                             turn_metrics.probe(), tts, turn_metrics.probe(), ...])
+
+    Each stage is recorded the first time any probe sees it.
+    """
+
+    def __init__(self):
+        self._user_speaking = False
+        self._bot_speaking = False
+        self._turn_start: Optional[float] = None
+        self._marks: Dict[str, float] = {}
+        self._transcribed = False
+        self._barge_in_at: Optional[float] = None
+
+        self._turns = 0
+        self._interruptions = 0
+        self._last_turn: Dict[str, float] = {}
+
+    def probe(self, *observers: Callable[[Frame, FrameProcessor], None]) -> "TurnLatencyProbe":
+        """
+        A probe for the pipeline. It also shows every frame to `observers`
+        (with the probe that saw it), which costs them far less than
+        processors of their own, whose queues every frame goes through.
+        """
+        return TurnLatencyProbe(self, observers)
+
+    def stats(self) -> dict:
+        return {
+            "turns": self._turns,
+            "interruptions": self._interruptions,
+            "last_turn_ms": {k: round(v * 1000) for k, v in self._last_turn.items()},
+        }
+
+    def observe(self, frame: Frame):
+        now = time.monotonic()
+
+        if isinstance(frame, UserStartedSpeakingFrame):
+            if self._user_speaking:
+                return
+            self._user_speaking = True
+            self._transcribed = False
+            if self._turn_start is not None:
+                # Talking again before the bot answered
+                TURNS.labels("abandoned").inc()
+                self._turn_start = None
+            if self._bot_speaking:
+                self._barge_in_at = now
+        elif isinstance(frame, UserStoppedSpeakingFrame):
+            if not self._user_speaking:
+                return
+            self._user_speaking = False
+            self._turn_start = now
+            self._marks = {}
+            if self._transcribed:
+                # The transcription was there before the VAD was done
+                self._mark("transcription", now)
+        elif isinstance(frame, TranscriptionFrame):
+            self._transcribed = True
+            self._mark("transcription", now)
+        elif type(frame) is TextFrame:
+            # Text after the TTS audio is the TTS service's, not the LLM's
+            if "tts_first_byte" not in self._marks:
+                self._mark("llm_first_token", now)
+        elif isinstance(frame, TTSAudioRawFrame):
+            self._mark("tts_first_byte", now)
+        elif isinstance(frame, BotStartedSpeakingFrame):
+            if self._bot_speaking:
+                return
+            self._bot_speaking = True
+            if self._turn_start is not None:
+                self._mark("audio_out", now)
+                TURNS.labels("answered").inc()
+                self._turns += 1
+                self._last_turn = self._marks
+                self._turn_start = None
+        elif isinstance(frame, BotStoppedSpeakingFrame):
+            if not self._bot_speaking:
+                return
+            self._bot_speaking = False
+            if self._barge_in_at is not None:
+                INTERRUPTION_SECONDS.observe(now - self._barge_in_at)
+                self._interruptions += 1
+                self._barge_in_at = None
+
+    def _mark(self, stage: str, now: float):
+        if self._turn_start is None or stage in self._marks:
+            return
+        elapsed = now - self._turn_start
+        self._marks[stage] = elapsed
+        TURN_STAGE_SECONDS.labels(stage).observe(elapsed)
+
+
+class TurnLatencyProbe(FrameProcessor):
+    def __init__(self, tracker: TurnLatencyTracker, observers=()):
+        super().__init__()
+        self._tracker = tracker
+        self._observers = observers
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        self._tracker.observe(frame)
+        for observer in self._observers:
+            observer(frame, self)
+
+        await self.push_frame(frame, direction)
@@ -0,0 +1,141 @@
+import asyncio
+import time
+import weakref
+
+from typing import Optional
+
+from pipecat.services.openai import OpenAILLMService
+
+from loguru import logger
+
+from prometheus_client import Counter, Histogram
+
+CONNECT_SECONDS = Histogram(
+    "bot_connect_seconds",
+    "Time spent opening connections to the AI services. Without warm-up the first turn pays it",
+    ["service", "kind"],
+    buckets=(0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0),
+)
+CONNECTION_CHECKS = Counter(
+    "bot_connection_checks_total",
+    "Warm-up and keep-alive checks of the AI service connections",
+    ["service", "outcome"],
+)
+
+# One OpenAI client (and so one pool of HTTP connections) per event loop, for
+# every conversation a process hosts
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+class PooledOpenAILLMService(OpenAILLMService):
+    """
+    An OpenAILLMService that shares its HTTP client with every other one in
+    the process using the same key and URL, so connections opened (and kept
+    warm) for one conversation are reused by the next.
+    """
+
+    def create_client(self, api_key=None, base_url=None, **kwargs):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return super().create_client(api_key=api_key, base_url=base_url, **kwargs)
+        clients = _shared_clients.setdefault(loop, {})
+        key = (api_key, str(base_url))
+        if key not in clients:
+            clients[key] = super().create_client(api_key=api_key, base_url=base_url, **kwargs)
+        # What ServiceWarmer keeps warm
+        self.shared_client = clients[key]
+        return clients[key]
+
+
+class ServiceWarmer:
+    """
+    Opens the LLM's HTTP connection while the bot is still joining the room,
+    so the first turn (usually the opener) doesn't pay for the TCP and TLS
+    handshakes, and keeps it warm for the rest of the call.
+
+    The connection is opened with two cheap requests (retrieving the model,
+    which also checks the API key): the difference between the first and
+    the second one is the handshake. Every `keepalive_secs` the request is
+    repeated so the pooled connection isn't closed for being idle. Only a
+    PooledOpenAILLMService's client is warmed. The TTS services connect
+    their websocket themselves when the pipeline starts.
+    """
+
+    def __init__(
+        self,
+        llm: OpenAILLMService,
+        *,
+        warm_up: bool = True,
+        keepalive_secs: float = 30.0,
+    ):
+        self._llm = llm
+        self._warm_up = warm_up
+        self._keepalive_secs = keepalive_secs
+        self._task: Optional[asyncio.Task] = None
+
+        self._llm_handshake: Optional[float] = None
+        self._llm_request: Optional[float] = None
+        self._keepalives = 0
+        self._failures = 0
+
+    def start(self):
+        if self._warm_up:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        def ms(value: Optional[float]):
+            return round(1000 * value) if value is not None else None
+
+        return {
+            "llm_handshake_ms": ms(self._llm_handshake),
+            "llm_request_ms": ms(self._llm_request),
+            "keepalives": self._keepalives,
+            "failures": self._failures,
+        }
+
+    async def _run(self):
+        await self._warm_llm()
+        while True:
+            await asyncio.sleep(self._keepalive_secs)
+            await self._keepalive()
+
+    async def _request_llm(self) -> Optional[float]:
+        client = getattr(self._llm, "shared_client", None)
+        if client is None:
+            return None
+        start = time.monotonic()
+        try:
+            await client.models.retrieve(self._llm.model_name)
+        except Exception as e:
+            logger.warning(f"LLM connection check failed: {e}")
+            CONNECTION_CHECKS.labels("llm", "failed").inc()
+            self._failures += 1
+            return None
+        CONNECTION_CHECKS.labels("llm", "ok").inc()
+        return time.monotonic() - start
+
+    async def _warm_llm(self):
+        cold = await self._request_llm()
+        if cold is None:
+            return
+        warm = await self._request_llm()
+        if warm is None:
+            return
+        self._llm_request = warm
+        self._llm_handshake = max(cold - warm, 0.0)
+        CONNECT_SECONDS.labels("llm", "handshake").observe(self._llm_handshake)
+        logger.debug(f"LLM connection warm, handshake took {1000 * self._llm_handshake:.0f} ms")
+
+    async def _keepalive(self):
+        if await self._request_llm() is not None:
+            self._keepalives += 1
@@ -0,0 +1,282 @@
+import aiohttp
+import asyncio
+import os
+import tempfile
+import argparse
+import importlib
+import logging
+import socket
+from collections import OrderedDict
+from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+
+# All the processes on the host write their metrics to files in this
+# directory, see utils/metrics.py. prometheus_client reads it when it is
+# first imported, so it is set before anything else is.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "pipecat_chatbot_metrics")
+)
+
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, Response
+
+from utils.admission import AdmissionController, AdmissionRejected, HostHeadroom
+from utils.bot_pool import BotWorkerPool
+from utils.bot_registry import BotRegistry, in_container
+from utils.fleet import send_heartbeats
+from utils.loop_monitor import LoopLagMonitor
+from utils.metrics import METRICS_DIR, remove_stale_metrics, render_metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Server this agent registers with, and how to reach this agent from there
+SERVER_URL = os.getenv("FLEET_SERVER_URL", "http://localhost:7860")
+WORKER_ID = os.getenv("WORKER_ID", socket.gethostname())
+WORKER_URL = os.getenv("WORKER_URL")
+# Required, anyone who can reach /launch could start bots otherwise (see
+# server.py), unless FLEET_INSECURE=1
+FLEET_SECRET = os.getenv("FLEET_SECRET")
+FLEET_INSECURE = os.getenv("FLEET_INSECURE", "0") == "1"
+HEARTBEAT_INTERVAL = float(os.getenv("FLEET_HEARTBEAT_INTERVAL", "5"))
+
+BOT_POOL_SIZE = int(os.getenv("BOT_POOL_SIZE", "2"))
+BOT_MODULE = os.getenv("BOT_MODULE", "bot")
+MAX_BOTS = int(os.getenv("MAX_BOTS", "20"))
+MIN_MEM_AVAILABLE_MB = int(os.getenv("MIN_MEM_AVAILABLE_MB", "1024"))
+MAX_LOAD_PER_CPU = float(os.getenv("MAX_LOAD_PER_CPU", "2.0"))
+BOT_HISTORY_SIZE = int(os.getenv("BOT_HISTORY_SIZE", "1000"))
+# On shutdown, "drain" the bot processes or "detach" from them, see server.py
+BOT_SHUTDOWN = os.getenv("BOT_SHUTDOWN", "drain")
+BOT_DRAIN_TIMEOUT = float(os.getenv("BOT_DRAIN_TIMEOUT", "45"))
+BOT_STATE_DIR = os.getenv("BOT_STATE_DIR", os.path.join(METRICS_DIR, "bots", "worker_agent"))
+BOT_LOG_FILE = os.getenv("BOT_LOG_FILE", os.path.join(os.path.dirname(__file__), "logs", "bots.log"))
+if BOT_SHUTDOWN == "detach" and in_container():
+    logger.warning("BOT_SHUTDOWN=detach doesn't work in a container, the bots stop with it. Draining them instead")
+    BOT_SHUTDOWN = "drain"
+# Host up to MAX_BOTS sessions inside this process, sharing the bot module
+# and the VAD model, instead of one process per session
+BOT_HOST_MODE = os.getenv("BOT_HOST_MODE", "0") == "1"
+# In host mode, run the VAD of all sessions as batched inferences
+VAD_BATCHING = os.getenv("VAD_BATCHING", "0") == "1"
+
+# Launches are placed by the server, so we don't queue here, we just say no
+admission = AdmissionController(
+    max_bots=MAX_BOTS,
+    max_queue=0,
+    headroom=HostHeadroom(
+        min_mem_available_mb=MIN_MEM_AVAILABLE_MB,
+        max_load_per_cpu=MAX_LOAD_PER_CPU,
+    ),
+)
+
+bot_registry = BotRegistry(
+    history_size=BOT_HISTORY_SIZE,
+    on_exit=lambda record: admission.release(),
+    state_dir=BOT_STATE_DIR,
+)
+
+bot_pool = BotWorkerPool(
+    module=BOT_MODULE,
+    size=BOT_POOL_SIZE,
+    cwd=os.path.dirname(os.path.abspath(__file__)),
+    log_path=BOT_LOG_FILE if BOT_SHUTDOWN == "detach" else None,
+)
+
+session_hosts = {}
+
+# Launches by the id the server gives them (the room URL), so a launch the
+# server asks for again, after it didn't get our answer, gets the same bot
+launches: OrderedDict = OrderedDict()
+
+# In host mode the bots share this event loop, so lag here is lag in the calls
+loop_monitor = LoopLagMonitor("worker_agent")
+
+def worker_state() -> dict:
+    running = len(session_hosts["bots"]) if BOT_HOST_MODE else len(bot_registry)
+    return {
+        "worker_id": WORKER_ID,
+        "url": WORKER_URL,
+        "capacity": MAX_BOTS,
+        "running": running,
+    }
+
+async def cleanup():
+    admission.close()
+    await loop_monitor.stop()
+    if BOT_HOST_MODE:
+        await session_hosts["bots"].stop_all()
+        # The hosted sessions share their module's session log
+        session_log = getattr(importlib.import_module(BOT_MODULE), "session_log", None)
+        if session_log:
+            await session_log.stop()
+    await bot_pool.stop()
+    if BOT_SHUTDOWN == "detach":
+        bot_registry.detach()
+    else:
+        await bot_registry.drain(BOT_DRAIN_TIMEOUT)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Set by `python worker_agent.py`, but not when uvicorn runs the app
+    if not WORKER_URL:
+        raise ValueError("WORKER_URL environment variable is not set, the server couldn't reach this worker")
+    if not FLEET_SECRET and not FLEET_INSECURE:
+        raise ValueError("FLEET_SECRET environment variable is not set, anyone could launch bots on this worker")
+    remove_stale_metrics()
+    for _ in bot_registry.adopt():
+        admission.occupy()
+    loop_monitor.start()
+    async with aiohttp.ClientSession() as aiohttp_session:
+        if BOT_HOST_MODE:
+            # Only import pipecat and the bot when we host sessions ourselves
+            from utils.session_host import SessionHost
+
+            bot_module = importlib.import_module(BOT_MODULE)
+            session_hosts["bots"] = SessionHost(
+                bot_module.run_bot,
+                max_sessions=MAX_BOTS,
+                history_size=BOT_HISTORY_SIZE,
+                on_session_end=lambda session: admission.release(),
+                batch_vad=VAD_BATCHING,
+            )
+        else:
+            await bot_pool.start()
+        heartbeat_task = asyncio.create_task(
+            send_heartbeats(
+                aiohttp_session,
+                SERVER_URL,
+                worker_state,
+                interval=HEARTBEAT_INTERVAL,
+                secret=FLEET_SECRET,
+            )
+        )
+        yield
+        heartbeat_task.cancel()
+        await cleanup()
+
+app = FastAPI(lifespan=lifespan)
+
+def check_secret(request: Request):
+    if FLEET_SECRET and request.headers.get("Authorization") != f"Bearer {FLEET_SECRET}":
+        raise HTTPException(status_code=401, detail="Invalid fleet secret")
+
+@app.post("/launch")
+async def launch(request: Request):
+    check_secret(request)
+    data = await request.json()
+    room_url = data.pop("room_url")
+    token = data.pop("token")
+
+    launch_id = data.pop("launch_id", None)
+    if launch_id in launches:
+        logger.info(f"Launch {launch_id} asked for again")
+        bot_id = await asyncio.shield(launches[launch_id])
+        return JSONResponse({"worker_id": WORKER_ID, "pid": bot_id})
+
+    task = asyncio.create_task(start_bot(room_url, token, **data))
+    if launch_id:
+        launches[launch_id] = task
+        task.add_done_callback(lambda task: forget_failed_launch(launch_id, task))
+        while len(launches) > BOT_HISTORY_SIZE:
+            launches.popitem(last=False)
+    # Finishes even if the server stops waiting
+    bot_id = await asyncio.shield(task)
+    return JSONResponse({"worker_id": WORKER_ID, "pid": bot_id})
+
+def forget_failed_launch(launch_id: str, task: asyncio.Task):
+    # Nothing was started, it can be asked for again
+    if task.cancelled() or task.exception():
+        if launches.get(launch_id) is task:
+            del launches[launch_id]
+
+async def start_bot(room_url: str, token: str, **data) -> int:
+    try:
+        await admission.acquire()
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    try:
+        if BOT_HOST_MODE:
+            session = session_hosts["bots"].start(room_url, token, **data)
+            bot_id = session.session_id
+            logger.info(f"Bot session started with id: {bot_id}")
+        else:
+            proc = await bot_pool.launch(room_url, token, **data)
+            bot_registry.add(proc, room_url)
+            bot_id = proc.pid
+            logger.info(f"Bot process started with PID: {bot_id}")
+    except Exception as e:
+        admission.release()
+        logger.error(f"Failed to start bot: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start bot: {str(e)}")
+
+    return bot_id
+
+@app.get("/status/{pid}")
+def get_status(pid: int, request: Request):
+    check_secret(request)
+    # In host mode bots are identified by their session id instead of a PID
+    if BOT_HOST_MODE:
+        record = session_hosts["bots"].get(pid)
+    else:
+        record = bot_registry.get(pid)
+    if not record:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Bot with process id: {pid} not found"
+        )
+
+    return JSONResponse({"bot_id": f"{WORKER_ID}:{pid}", "status": record.status})
+
+@app.get("/stats")
+def get_stats():
+    return JSONResponse(
+        {
+            **worker_state(),
+            "admission": admission.stats(),
+            "bots": bot_registry.stats(),
+            "loop": loop_monitor.stats(),
+            "pool": bot_pool.stats(),
+            "sessions": session_hosts["bots"].stats() if BOT_HOST_MODE else None,
+        }
+    )
+
+@app.get("/metrics")
+def get_metrics():
+    # Turn latency histograms of the bots running on this worker
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Bot worker agent")
+    parser.add_argument("--host", type=str, default=os.getenv("HOST", "0.0.0.0"), help="Host address")
+    parser.add_argument("--port", type=int, default=int(os.getenv("WORKER_PORT", "7861")), help="Port number")
+    parser.add_argument("--worker-id", type=str, help="Worker id (defaults to the hostname)")
+    parser.add_argument("--server-url", type=str, help="URL of the server to register with")
+
+    config = parser.parse_args()
+
+    # Settings are read at import time by uvicorn, so pass them as env vars
+    if config.worker_id:
+        os.environ["WORKER_ID"] = config.worker_id
+    if config.server_url:
+        os.environ["FLEET_SERVER_URL"] = config.server_url
+    if not os.getenv("WORKER_URL"):
+        os.environ["WORKER_URL"] = f"http://{socket.gethostname()}:{config.port}"
+
+    uvicorn.run(
+        "worker_agent:app",
+        host=config.host,
+        port=config.port,
+    )